@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'stock_grain_ranking'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import SyntheticMarket
+from cache_manager import CacheManager
+from data_resilient import DataResilient
+from price_store import PriceStore
+from scan_pipeline import StagedPipeline
+from result_sink import ResultSink
+import stockPre
+from data import DataCache
+from indicators import IndicatorsCalculator
+from signals import SignalGenerator
+from backtest import BacktestStrategy
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stage_baseline.json')
+
+# 内存峰值差值小于此值（MB）时不视为回退，避免小样本上的分配抖动误报
+MEMORY_FLOOR_MB = 1.0
+
+# 阶段名 → 依赖的前置阶段（前置阶段失败时跳过）
+STAGES = {
+    'cache_save': None,
+    'cache_load': 'cache_save',
+    'pre_indicators': None,
+    'pre_signals': 'pre_indicators',
+    'pre_backtest': 'pre_signals',
+    'grain_indicators': None,
+    'grain_signals': 'grain_indicators',
+    'grain_backtest': 'grain_signals',
+    'macro_score': None,
+    'end_to_end': 'cache_save',
+}
+
+
+"""各阶段的执行体：输入为合成行情，返回 (处理条数, 供后续阶段使用的输出)"""
+class Stages:
+    def __init__(self, market: SyntheticMarket, frames: list, cache_dir: str, compute_workers: int):
+        self.market = market
+        self.frames = frames
+        self.cache_dir = cache_dir
+        self.compute_workers = compute_workers
+        self.outputs = {}
+
+    def cache_save(self, frames):
+        for symbol, df in frames:
+            CacheManager.save_stock_cache(symbol, self.market.start_date, self.market.end_date, df)
+        return len(frames), None
+
+    def cache_load(self, frames):
+        for symbol, _ in frames:
+            CacheManager.load_stock_cache(symbol, self.market.start_date, self.market.end_date)
+        return len(frames), None
+
+    def pre_indicators(self, frames):
+        return len(frames), [(symbol, stockPre.calculate_indicators(df.copy())) for symbol, df in frames]
+
+    def pre_signals(self, frames):
+        inputs = self._inputs('pre_indicators', frames)
+        return len(inputs), [(df, stockPre.generate_signals(df)) for _, df in inputs]
+
+    def pre_backtest(self, frames):
+        inputs = self._inputs('pre_signals', frames)
+        for df, signals in inputs:
+            stockPre.backtest_strategy(df.copy(), signals)
+        return len(inputs), None
+
+    def grain_indicators(self, frames):
+        return len(frames), [(symbol, IndicatorsCalculator.calculate_indicators(df.copy())) for symbol, df in frames]
+
+    def grain_signals(self, frames):
+        inputs = self._inputs('grain_indicators', frames)
+        return len(inputs), [(df, SignalGenerator.generate_signals(df)) for _, df in inputs]
+
+    def grain_backtest(self, frames):
+        inputs = self._inputs('grain_signals', frames)
+        for df, signals in inputs:
+            BacktestStrategy.backtest(df.copy(), signals)
+        return len(inputs), None
+
+    def macro_score(self, frames):
+        """get_macro_score 只依赖日期，按交易日逐个调用一次计单次耗时（grain 信号生成中每只股票每行调用一次）"""
+        for date in self.market.dates:
+            SignalGenerator.get_macro_score(date)
+        return len(self.market.dates), None
+
+    def end_to_end(self, frames):
+        """离线读缓存 → 指标/信号/回测 → 前N名排序，与 stockPre.py 主流程一致"""
+        symbols = [symbol for symbol, _ in frames]
+        pipeline = StagedPipeline(
+            fetch_fn=lambda symbol: DataResilient.fetch_stock_data(symbol, self.market.start_date, self.market.end_date),
+            compute_fn=stockPre.evaluate_symbol,
+            compute_workers=self.compute_workers if len(frames) == len(self.frames) else 0,
+        )
+        with ResultSink(None, key='return', top_k=50) as sink:
+            for symbol, result, error in pipeline.run(symbols):
+                if error is not None:
+                    raise error
+                if result['signal'] == 1:
+                    sink.add(result)
+        return len(symbols), None
+
+    def _inputs(self, stage, frames):
+        """前置阶段的输出；内存测量时只取与样本对应的部分"""
+        outputs = self.outputs[stage]
+        return outputs if len(frames) == len(self.frames) else outputs[:len(frames)]
+
+
+def run_size(size, args, cache_root):
+    market = SyntheticMarket(symbols=size, years=args.years, seed=args.seed)
+    start = time.perf_counter()
+    frames = list(market.frames())
+    generate_s = time.perf_counter() - start
+    bars = sum(len(df) for _, df in frames)
+    print(f"\n=== {size} 只股票 × {args.years:g} 年（{bars} 根K线，生成 {generate_s:.1f}秒）===")
+
+    cache_dir = Path(cache_root) / str(size)
+    CacheManager.STOCK_CACHE_DIR = cache_dir / 'stock'
+    CacheManager.MACRO_CACHE_DIR = cache_dir / 'macro'
+    # 离线读取优先走原始行情库：同样指向临时目录，合成代码与真实代码重名时不读到本机真实行情
+    PriceStore.RAW_DIR = cache_dir / 'raw'
+    PriceStore.FACTOR_DIR = cache_dir / 'factors'
+    CacheManager.initialize()
+    DataCache.macro_data = market.macro_data()
+
+    stages = Stages(market, frames, str(cache_dir), args.compute_workers)
+    sample = frames[:args.memory_sample]
+    report = {'symbols': size, 'bars': bars, 'stages': {}}
+    for name, depends in STAGES.items():
+        if name not in args.stages:
+            continue
+        if depends and report['stages'].get(depends, {}).get('error'):
+            report['stages'][name] = {'error': f'跳过：{depends} 未完成'}
+            print(f"  {name:<18} 跳过（{depends} 未完成）")
+            continue
+        fn = getattr(stages, name)
+        try:
+            start = time.perf_counter()
+            items, output = fn(frames)
+            seconds = time.perf_counter() - start
+            if output is not None:
+                stages.outputs[name] = output
+
+            # 内存峰值在样本上单独测量，避免 tracemalloc 拖慢计时
+            tracemalloc.start()
+            fn(sample)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            report['stages'][name] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"  {name:<18} 出错: {type(e).__name__}: {e}")
+            continue
+
+        result = {
+            'items': items,
+            'seconds': round(seconds, 4),
+            'per_item_ms': round(seconds / items * 1000, 4) if items else 0.0,
+            'throughput': round(items / seconds, 1) if seconds else 0.0,
+            'peak_mb': round(peak_mb, 2),
+            'peak_sample': len(sample),
+        }
+        report['stages'][name] = result
+        print(f"  {name:<18} {seconds:>8.2f}秒  {result['per_item_ms']:>9.3f}ms/条  "
+              f"{result['throughput']:>10.1f}条/秒  峰值{peak_mb:>7.1f}MB（{len(sample)}只样本）")
+
+    report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def compare(results, baseline, tolerance):
+    """逐 规模 × 阶段 比较单条耗时与内存峰值，超出基线 (1+tolerance) 倍即视为回退"""
+    regressions = []
+    for size, report in results['sizes'].items():
+        base_stages = baseline.get('sizes', {}).get(size, {}).get('stages', {})
+        for stage, result in report['stages'].items():
+            base = base_stages.get(stage)
+            if not base or 'error' in base:
+                continue
+            if 'error' in result:
+                regressions.append(f"{size}只/{stage}: 运行出错（基线可运行）")
+                continue
+            for key, label, floor in (('per_item_ms', '单条耗时', 0.0), ('peak_mb', '内存峰值', MEMORY_FLOOR_MB)):
+                if base.get(key) and result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > floor:
+                    regressions.append(f"{size}只/{stage}: {label} {result[key]} > 基线 {base[key]}"
+                                       f"（+{result[key] / base[key] - 1:.0%}）")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='分阶段性能基准（合成行情，不联网）')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[300, 1000, 5000], help='股票数量')
+    parser.add_argument('--years', type=float, default=1.0, help='每只股票的行情年数')
+    parser.add_argument('--seed', type=int, default=0, help='合成行情随机种子')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES), help='测试的阶段')
+    parser.add_argument('--compute-workers', type=int, default=None, help='端到端扫描的计算进程数（默认CPU核数）')
+    parser.add_argument('--memory-sample', type=int, default=100, help='测量内存峰值的样本股票数')
+    parser.add_argument('--output', help='本次结果JSON文件')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线JSON文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的回退幅度（0.25 即 25%%）')
+    parser.add_argument('--update-baseline', '--save-baseline', action='store_true', help='用本次结果覆盖基线（首次运行须指定）')
+    args = parser.parse_args()
+
+    DataResilient.set_offline()
+    results = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()},
+        'params': {'years': args.years, 'seed': args.seed},
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as cache_root:
+        for size in args.sizes:
+            results['sizes'][str(size)] = run_size(size, args, cache_root)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已更新: {args.baseline}")
+        sys.exit(0)
+
+    # 没有基线时无法判断回退，按失败退出，避免回归检查被静默跳过
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线 {args.baseline}，请先用 --update-baseline 生成")
+        sys.exit(2)
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('machine', {}).get('cpu_count') != os.cpu_count():
+        print(f"\n注意：基线生成于 {baseline.get('machine', {}).get('cpu_count')} 核机器，本机 {os.cpu_count()} 核")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n性能回退（容差 {args.tolerance:.0%}）：")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print(f"\n与基线相比无回退（容差 {args.tolerance:.0%}）")
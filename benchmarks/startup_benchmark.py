@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在全新解释器中执行：导入入口模块 → 离线读取单只股票缓存 → 计算信号，分段计时
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {module_dir!r})
+import {module}
+t1 = time.perf_counter()
+from data_resilient import DataResilient
+DataResilient.set_offline()
+df = DataResilient.fetch_stock_data('000001', '20250101', '20251231')
+t2 = time.perf_counter()
+error = None
+try:
+    {analyze}
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+t3 = time.perf_counter()
+print(json.dumps({{'import': t1 - t0, 'fetch': t2 - t1, 'analyze': t3 - t2,
+                  'akshare_imported': 'akshare' in sys.modules, 'error': error}}))
+"""
+
+TARGETS = {
+    'stockPre': (ROOT, 'stockPre', "stockPre.analyze_symbol('000001.SZ', df)"),
+    'stock_grain_ranking': (os.path.join(ROOT, 'stock_grain_ranking'), 'main', "main.MainExecutor.analyze('000001', df)"),
+}
+
+
+def write_synthetic_cache(cache_dir):
+    """写入一份单只股票的缓存（离线模式读取，不联网）"""
+    dates = pd.bdate_range('2025-01-01', '2025-12-31')
+    rng = np.random.default_rng(0)
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    df = pd.DataFrame({
+        'open': close * (1 + rng.normal(0, 0.005, len(dates))),
+        'close': close,
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'volume': rng.integers(1e5, 1e6, len(dates)).astype(float),
+    }, index=pd.DatetimeIndex(dates, name='date'))
+    stock_dir = os.path.join(cache_dir, 'cache', 'stock')
+    os.makedirs(stock_dir, exist_ok=True)
+    os.makedirs(os.path.join(cache_dir, 'cache', 'macro'), exist_ok=True)
+    with open(os.path.join(stock_dir, '000001_20250101_20251231.pkl'), 'wb') as f:
+        pickle.dump(df, f)
+
+
+def run_probe(target, workdir):
+    module_dir, module, analyze = TARGETS[target]
+    code = PROBE.format(root=ROOT, module_dir=module_dir, module=module, analyze=analyze)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code], cwd=workdir, capture_output=True, text=True)
+    total = time.perf_counter() - start
+    if proc.returncode != 0:
+        return {'total': total, 'error': proc.stderr.strip().splitlines()[-1] if proc.stderr else 'unknown'}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='冷启动耗时基准：全新进程中离线查询单只股票')
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS), help='测试的入口')
+    parser.add_argument('--repeat', type=int, default=5, help='每个入口重复次数（取中位数）')
+    parser.add_argument('--max-seconds', type=float, default=1.0, help='冷启动总耗时上限，超出则返回非零退出码')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+
+    failed = False
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        write_synthetic_cache(workdir)
+        for target in args.targets:
+            runs = [run_probe(target, workdir) for _ in range(args.repeat)]
+            errors = [r['error'] for r in runs if r.get('error')]
+            summary = {
+                key: statistics.median(r[key] for r in runs if key in r)
+                for key in ('total', 'import', 'fetch', 'analyze') if any(key in r for r in runs)
+            }
+            summary['akshare_imported'] = any(r.get('akshare_imported') for r in runs)
+            summary['error'] = errors[0] if errors else None
+            report[target] = summary
+
+            status = "OK"
+            if summary['error']:
+                status = "运行出错"
+            elif summary['akshare_imported']:
+                status = "缓存命中时导入了akshare"
+            elif summary['total'] > args.max_seconds:
+                status = "超出上限"
+            failed = failed or status != "OK"
+            print(f"{target:<22} 总耗时 {summary['total']:.3f}s  "
+                  f"导入 {summary.get('import', float('nan')):.3f}s  "
+                  f"读缓存 {summary.get('fetch', float('nan')):.3f}s  "
+                  f"计算 {summary.get('analyze', float('nan')):.3f}s  [{status}]")
+            if summary['error']:
+                print(f"  错误: {summary['error']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# A股涨跌停幅度：主板10%，创业板/科创板20%
+LIMIT_PCT = {'main': 0.10, 'growth': 0.20}
+
+
+"""确定性的合成行情：同样的 seed / 股票数 / 年数 每次生成完全相同的数据，不依赖网络"""
+class SyntheticMarket:
+    def __init__(self, symbols: int = 300, years: float = 1.0, seed: int = 0, end: str = '2025-12-31',
+                 suspension_rate: float = 0.002, limit_rate: float = 0.01):
+        """
+        suspension_rate: 每个交易日开始停牌的概率（停牌持续1~20个交易日，期间没有K线）
+        limit_rate: 每个交易日出现涨跌停的概率（收盘价等于最高/最低价，涨跌幅封顶）
+        """
+        self.count = symbols
+        self.seed = seed
+        self.suspension_rate = suspension_rate
+        self.limit_rate = limit_rate
+        end = pd.Timestamp(end)
+        self.dates = pd.bdate_range(end - pd.DateOffset(days=int(365 * years)), end, name='date')
+        self.start_date = self.dates[0].strftime('%Y%m%d')
+        self.end_date = self.dates[-1].strftime('%Y%m%d')
+
+    def symbols(self) -> list:
+        """沪市/深市主板与创业板/科创板代码交替分配（不带后缀）"""
+        prefixes = ['600', '000', '300', '688', '601', '002']
+        return [f"{prefixes[i % len(prefixes)]}{i // len(prefixes):03d}" for i in range(self.count)]
+
+    def bars(self, index: int, symbol: str = None) -> pd.DataFrame:
+        """第index只股票的日线（列与 DataResilient.fetch_stock_data 一致）"""
+        symbol = symbol or self.symbols()[index]
+        rng = np.random.default_rng([self.seed, index])
+        n = len(self.dates)
+        limit = LIMIT_PCT['growth' if symbol.startswith(('300', '688')) else 'main']
+
+        returns = rng.normal(0.0003, 0.02 + 0.01 * rng.random(), n)
+        limit_days = rng.random(n) < self.limit_rate
+        returns[limit_days] = np.where(rng.random(limit_days.sum()) < 0.5, limit, -limit)
+        returns = np.clip(returns, -limit, limit)
+        close = np.round(rng.uniform(5, 80) * np.cumprod(1 + returns), 2)
+
+        prev_close = np.concatenate([[close[0]], close[:-1]])
+        open_ = np.round(prev_close * (1 + rng.normal(0, 0.005, n)), 2)
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n)))
+        # 涨停收在最高价，跌停收在最低价
+        high = np.where(limit_days & (returns > 0), close, np.round(high, 2))
+        low = np.where(limit_days & (returns < 0), close, np.round(low, 2))
+        volume = np.round(rng.lognormal(13, 0.5, n) * (1 + 2 * limit_days))
+
+        df = pd.DataFrame({'open': open_, 'close': close, 'high': high, 'low': low, 'volume': volume},
+                          index=self.dates)
+
+        # 停牌：随机区间内没有K线
+        keep = np.ones(n, dtype=bool)
+        for start in np.flatnonzero(rng.random(n) < self.suspension_rate):
+            keep[start:start + rng.integers(1, 21)] = False
+        return df[keep]
+
+    def frames(self):
+        """逐只产出 (symbol, DataFrame)，不在内存中同时保留全部股票"""
+        for index, symbol in enumerate(self.symbols()):
+            yield symbol, self.bars(index, symbol)
+
+    def macro_data(self) -> dict:
+        """与 DataCache.macro_data 结构一致的 CPI/GDP/PMI/汇率 数据"""
+        rng = np.random.default_rng([self.seed, 1 << 30])  # 与个股序号不冲突
+        months = pd.date_range(self.dates[0] - pd.DateOffset(months=6), self.dates[-1], freq='MS')
+        cpi = pd.DataFrame({
+            '统计时间': months.strftime('%Y年%m月'),
+            '全国数值': np.round(rng.uniform(1.5, 3.5, len(months)), 1),
+        })
+        cpi['日期'] = months
+        pmi = pd.DataFrame({
+            '月份': months.strftime('%Y年%m月'),
+            '制造业-指数': np.round(rng.uniform(48, 52, len(months)), 1),
+        })
+        quarters = sorted({(d.year, (d.month - 1) // 3 + 1) for d in months}, reverse=True)
+        gdp = pd.DataFrame({
+            '季度': [f'{year}年第{q}季度' for year, q in quarters],
+            '国内生产总值-绝对值': rng.uniform(30e4, 40e4, len(quarters)),
+            '国内生产总值-同比增长': rng.uniform(4.5, 6.5, len(quarters)),
+        })
+        fx = pd.DataFrame({'货币对': ['USD/CNY', 'EUR/CNY'], '买报价': [7.1, 7.8], '卖报价': [7.2, 7.9]})
+        return {'cpi': cpi, 'gdp': gdp, 'pmi': pmi, 'fx': fx}
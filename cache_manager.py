@@ -1,8 +1,10 @@
 import pickle
 import os
+import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional, Any
+from telemetry import Telemetry
 
 class CacheManager:
     CACHE_DIR = Path("cache")
@@ -29,9 +31,11 @@ class CacheManager:
         return cls.MACRO_CACHE_DIR / f"{data_type}.pkl"
     
     @classmethod
-    def is_cache_valid(cls, cache_path: Path) -> bool:
+    def is_cache_valid(cls, cache_path: Path, ignore_expiry: bool = False) -> bool:
         if not cache_path.exists():
             return False
+        if ignore_expiry:
+            return True
         
         cache_time = datetime.fromtimestamp(cache_path.stat().st_mtime)
         expire_time = timedelta(hours=cls.CACHE_EXPIRE_HOURS)
@@ -39,15 +43,40 @@ class CacheManager:
         return datetime.now() - cache_time < expire_time
     
     @classmethod
-    def load_stock_cache(cls, symbol: str, start_date: str, end_date: str) -> Optional[Any]:
+    def load_stock_cache(cls, symbol: str, start_date: str, end_date: str, ignore_expiry: bool = False) -> Optional[Any]:
         cache_path = cls.get_stock_cache_path(symbol, start_date, end_date)
         
-        if not cls.is_cache_valid(cache_path):
+        if not cls.is_cache_valid(cache_path, ignore_expiry):
+            Telemetry.count('cache_misses', kind='stock')
             return None
         
+        return cls.load_file(cache_path, 'stock', "加载缓存失败")
+    
+    @classmethod
+    def find_latest_stock_cache(cls, symbol: str, start_date: str, end_date: str) -> Optional[Path]:
+        """离线模式：查找覆盖起始日期、结束日期不晚于end_date的最新一份缓存（忽略过期时间）"""
+        best_path, best_end = None, ''
+        for cache_path in cls.STOCK_CACHE_DIR.glob(f"{symbol}_*_*.pkl"):
+            parts = cache_path.stem.split('_')
+            if len(parts) != 3:
+                continue
+            cached_start, cached_end = parts[1], parts[2]
+            if cached_start <= start_date and best_end < cached_end <= end_date:
+                best_path, best_end = cache_path, cached_end
+        return best_path
+    
+    @classmethod
+    def load_latest_stock_cache(cls, symbol: str, start_date: str, end_date: str) -> Optional[Any]:
+        """读取最近一份可用缓存并截取到请求区间"""
+        cache_path = cls.find_latest_stock_cache(symbol, start_date, end_date)
+        if cache_path is None:
+            return None
+        
+        data = cls.load_file(cache_path, 'stock', "加载缓存失败")
+        if data is None:
+            return None
         try:
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
+            return data.loc[datetime.strptime(start_date, '%Y%m%d'):datetime.strptime(end_date, '%Y%m%d')]
         except Exception as e:
             print(f"加载缓存失败 {cache_path}: {str(e)}")
             return None
@@ -55,36 +84,59 @@ class CacheManager:
     @classmethod
     def save_stock_cache(cls, symbol: str, start_date: str, end_date: str, data: Any):
         cache_path = cls.get_stock_cache_path(symbol, start_date, end_date)
-        
-        try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(data, f)
-        except Exception as e:
-            print(f"保存缓存失败 {cache_path}: {str(e)}")
+        cls.save_file(cache_path, data, 'stock', "保存缓存失败")
     
     @classmethod
-    def load_macro_cache(cls, data_type: str) -> Optional[Any]:
+    def load_macro_cache(cls, data_type: str, ignore_expiry: bool = False) -> Optional[Any]:
         cache_path = cls.get_macro_cache_path(data_type)
         
-        if not cls.is_cache_valid(cache_path):
+        if not cls.is_cache_valid(cache_path, ignore_expiry):
+            Telemetry.count('cache_misses', kind='macro')
             return None
         
-        try:
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"加载宏观数据缓存失败 {cache_path}: {str(e)}")
-            return None
+        return cls.load_file(cache_path, 'macro', "加载宏观数据缓存失败")
     
     @classmethod
     def save_macro_cache(cls, data_type: str, data: Any):
         cache_path = cls.get_macro_cache_path(data_type)
-        
+        cls.save_file(cache_path, data, 'macro', "保存宏观数据缓存失败")
+
+    @classmethod
+    def load_file(cls, cache_path: Path, kind: str, error_message: str) -> Optional[Any]:
+        """读取缓存文件并记录命中次数、字节数与反序列化耗时"""
+        try:
+            with Telemetry.timer('cache_load'):
+                with open(cache_path, 'rb') as f:
+                    data = pickle.load(f)
+                    size = f.tell()
+            Telemetry.count('cache_hits', kind=kind)
+            Telemetry.count('cache_read_bytes', size, kind=kind)
+            return data
+        except Exception as e:
+            Telemetry.count('cache_errors', kind=kind)
+            print(f"{error_message} {cache_path}: {str(e)}")
+            return None
+
+    @classmethod
+    def save_file(cls, cache_path: Path, data: Any, kind: str, error_message: str):
+        """
+        先写临时文件再原子替换，并发读取时不会读到写了一半的文件。
+        临时文件名由 mkstemp 在目标目录中唯一生成，同一进程内多个线程同时写同一文件也互不覆盖
+        """
+        tmp_path = None
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump(data, f)
+            with Telemetry.timer('cache_save'):
+                fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=f"{cache_path.name}.", suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f)
+                    size = f.tell()
+                os.replace(tmp_path, cache_path)
+            Telemetry.count('cache_write_bytes', size, kind=kind)
         except Exception as e:
-            print(f"保存宏观数据缓存失败 {cache_path}: {str(e)}")
+            Telemetry.count('cache_errors', kind=kind)
+            print(f"{error_message} {cache_path}: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
     
     @classmethod
     def clear_expired_cache(cls):
@@ -0,0 +1,274 @@
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from cache_manager import CacheManager
+from data_resilient import DataResilient
+from panel import PricePanel
+from universe import Universe, add_universe_argument
+
+# 分块行数：每次只生成 BLOCK × N 的结果块，5000只股票时临时数组约20MB
+BLOCK = 1024
+
+
+def daily_returns(close: np.ndarray) -> np.ndarray:
+    """收盘价面板 → 日收益面板（首行及停牌日为NaN）"""
+    returns = np.full_like(close, np.nan, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = close[1:] / close[:-1] - 1
+    return returns
+
+
+def correlation_matrix(returns: np.ndarray, min_periods: int = 20, block: int = BLOCK, out: np.ndarray = None) -> np.ndarray:
+    """
+    一次性计算 股票 × 股票 收益相关系数矩阵（float32）：每列去均值、除以范数后，按行块做矩阵乘法。
+    停牌日收益按0计（停牌期间价格不变）；有效交易日少于 min_periods 的股票整行/整列为NaN。
+    out 可传入预先分配的数组（如 np.memmap），避免再占一份内存
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    valid = ~np.isnan(returns)
+    filled = np.where(valid, returns, 0.0)
+    centered = filled - filled.mean(axis=0)
+    norm = np.sqrt((centered * centered).sum(axis=0))
+    enough = (valid.sum(axis=0) >= min_periods) & (norm > 0)
+    unit = (centered / np.where(enough, norm, 1.0)).astype(np.float32)
+    unit[:, ~enough] = np.nan
+
+    columns = returns.shape[1]
+    out = np.empty((columns, columns), dtype=np.float32) if out is None else out
+    for start in range(0, columns, block):
+        stop = min(start + block, columns)
+        np.matmul(unit[:, start:stop].T, unit, out=out[start:stop])
+    return out
+
+
+def diversify(ranked: list, correlation: np.ndarray, max_corr: float, limit: int = None):
+    """
+    贪心分散化：按排名依次入选，与任一已入选股票的相关系数超过 max_corr 的跳过。
+    ranked 为排名顺序的标签，correlation 为同顺序的相关矩阵（NaN视为不相关）。
+    返回 (入选标签列表, {被剔除标签: (相关的已入选标签, 相关系数)})
+    """
+    correlation = np.nan_to_num(np.asarray(correlation, dtype=np.float64), nan=0.0)
+    kept = []
+    dropped = {}
+    for i, label in enumerate(ranked):
+        if limit is not None and len(kept) >= limit:
+            break
+        if kept:
+            row = correlation[i, kept]
+            worst = int(np.argmax(row))
+            if row[worst] > max_corr:
+                dropped[label] = (ranked[kept[worst]], float(row[worst]))
+                continue
+        kept.append(i)
+    return [ranked[i] for i in kept], dropped
+
+
+def diversify_frames(ranked: list, frames: dict, max_corr: float, window: int = 60, min_periods: int = 20):
+    """
+    对排名列表按近 window 日收益相关性做贪心分散化：frames 为 {标签: 日线DataFrame}，
+    没有行情的标签视为与其他股票不相关（保留）。返回值同 diversify
+    """
+    panel = PricePanel.from_frames({label: frames.get(label) for label in ranked})
+    if not panel.symbols:
+        return list(ranked), {}
+    returns = daily_returns(panel['close'])[-window:]
+    matrix = correlation_matrix(returns, min_periods=min(min_periods, window))
+    column = {symbol: i for i, symbol in enumerate(panel.symbols)}
+    order = np.array([column.get(label, -1) for label in ranked])
+    full = np.full((len(ranked), len(ranked)), np.nan, dtype=np.float32)
+    present = np.flatnonzero(order >= 0)
+    full[np.ix_(present, present)] = matrix[np.ix_(order[present], order[present])]
+    return diversify(ranked, full, max_corr)
+
+"""滚动相关矩阵：保存最近 window 个交易日的收益与 N × N 交叉乘积（float32），每新增一天只做一次秩1更新"""
+class RollingCorrelation:
+    DIR = CacheManager.CACHE_DIR / "correlation"
+
+    def __init__(self, symbols: list, window: int = 60, min_periods: int = 20, block: int = BLOCK):
+        self.symbols = list(symbols)
+        self.window = window
+        self.min_periods = min_periods
+        self.block = block
+        n = len(self.symbols)
+        self.buffer = np.zeros((window, n), dtype=np.float64)   # 环形缓冲，停牌日记为0
+        self.valid = np.zeros((window, n), dtype=bool)
+        self.sum = np.zeros(n)
+        self.cross = np.zeros((n, n), dtype=np.float32)         # Σ r_i r_j（窗口内）
+        self.length = 0
+        self.position = 0
+        self.last_date = None
+        self._updates = 0
+
+    def update(self, returns: np.ndarray, date=None):
+        """加入一个交易日的收益（长度N，停牌为NaN）；窗口已满时同时移出最早一天"""
+        row = np.asarray(returns, dtype=np.float64)
+        valid = ~np.isnan(row)
+        row = np.where(valid, row, 0.0)
+        old = self.buffer[self.position].copy() if self.length == self.window else None
+
+        # 交叉乘积按行块做秩1更新：C += r rᵀ - r_old r_oldᵀ，临时数组只有 block × N
+        new32, old32 = row.astype(np.float32), None if old is None else old.astype(np.float32)
+        for start in range(0, len(row), self.block):
+            stop = min(start + self.block, len(row))
+            self.cross[start:stop] += np.outer(new32[start:stop], new32)
+            if old32 is not None:
+                self.cross[start:stop] -= np.outer(old32[start:stop], old32)
+
+        if old is not None:
+            self.sum -= old
+        self.sum += row
+        self.buffer[self.position] = row
+        self.valid[self.position] = valid
+        self.position = (self.position + 1) % self.window
+        self.length = min(self.length + 1, self.window)
+        self.last_date = date
+        # float32 反复加减会累积舍入误差，每滚动一整个窗口从缓冲重算一次
+        self._updates += 1
+        if self._updates >= self.window:
+            self.recompute()
+
+    def extend(self, returns: np.ndarray, dates=None):
+        """依次加入多个交易日（日期 × 股票）；超过窗口长度的部分只保留最后 window 行后整体重算"""
+        returns = np.asarray(returns, dtype=np.float64)
+        if len(returns) >= self.window:
+            tail = returns[-self.window:]
+            self.valid = ~np.isnan(tail)
+            self.buffer = np.where(self.valid, tail, 0.0)
+            self.sum = self.buffer.sum(axis=0)
+            self.length = self.window
+            self.position = 0
+            self.last_date = dates[-1] if dates is not None else None
+            self.recompute()
+            return
+        for i, row in enumerate(returns):
+            self.update(row, dates[i] if dates is not None else None)
+
+    def recompute(self):
+        """由窗口缓冲按行块重算交叉乘积"""
+        data = self.buffer[:self.length].astype(np.float32)
+        for start in range(0, data.shape[1], self.block):
+            stop = min(start + self.block, data.shape[1])
+            np.matmul(data[:, start:stop].T, data, out=self.cross[start:stop])
+        self._updates = 0
+
+    def _moments(self, columns):
+        n = self.length
+        mean = self.sum[columns] / n
+        var = np.diag(self.cross)[columns] / n - mean * mean
+        enough = (self.valid[:n, columns].sum(axis=0) >= self.min_periods) & (var > 0)
+        return mean, np.where(enough, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+    def correlation(self, columns=None) -> np.ndarray:
+        """指定列（下标数组，缺省为全部）之间的相关矩阵：cov = C/n - μᵢμⱼ，按行块换算，结果为 float32"""
+        columns = np.arange(len(self.symbols)) if columns is None else np.asarray(columns)
+        mean, std = self._moments(columns)
+        out = np.empty((len(columns), len(columns)), dtype=np.float32)
+        for start in range(0, len(columns), self.block):
+            stop = min(start + self.block, len(columns))
+            rows = columns[start:stop]
+            cov = self.cross[np.ix_(rows, columns)] / self.length - np.outer(mean[start:stop], mean)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[start:stop] = cov / np.outer(std[start:stop], std)
+        np.fill_diagonal(out, np.where(np.isnan(std), np.nan, 1.0))
+        return out
+
+    def subset(self, symbols: list):
+        """按给定顺序返回 (在窗口内的股票, 它们之间的相关矩阵)"""
+        index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        present = [symbol for symbol in symbols if symbol in index]
+        return present, self.correlation([index[symbol] for symbol in present])
+
+    def top_pairs(self, count: int = 20):
+        """相关系数最高的股票对 [(股票A, 股票B, 相关系数)]，按行块扫描上三角，每块只保留前 count 个"""
+        n = len(self.symbols)
+        best = []
+        for start in range(0, n, self.block):
+            stop = min(start + self.block, n)
+            block = self.correlation_rows(start, stop)
+            block[np.arange(start, stop)[:, None] >= np.arange(n)[None, :]] = np.nan
+            flat = np.nan_to_num(block, nan=-np.inf).ravel()
+            take = min(count, flat.size)
+            for position in np.argpartition(-flat, take - 1)[:take]:
+                if np.isfinite(flat[position]):
+                    i, j = divmod(int(position), n)
+                    best.append((self.symbols[start + i], self.symbols[j], float(flat[position])))
+        return sorted(best, key=lambda pair: -pair[2])[:count]
+
+    def correlation_rows(self, start: int, stop: int) -> np.ndarray:
+        """第 start~stop 行与全部股票的相关系数（只生成一个行块）"""
+        mean, std = self._moments(np.arange(len(self.symbols)))
+        cov = self.cross[start:stop] / self.length - np.outer(mean[start:stop], mean)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (cov / np.outer(std[start:stop], std)).astype(np.float32)
+
+    # ========== 持久化（增量更新） ==========
+    @classmethod
+    def path(cls, name: str):
+        return cls.DIR / f"{name}.pkl"
+
+    def save(self, name: str):
+        self.DIR.mkdir(parents=True, exist_ok=True)
+        CacheManager.save_file(self.path(name), self, 'correlation', "保存相关矩阵失败")
+
+    @classmethod
+    def load(cls, name: str):
+        path = cls.path(name)
+        if not path.exists():
+            return None
+        return CacheManager.load_file(path, 'correlation', "加载相关矩阵失败")
+
+    @classmethod
+    def from_panel(cls, panel: PricePanel, window: int = 60, min_periods: int = 20, state: 'RollingCorrelation' = None):
+        """
+        由价格面板构建；传入上次保存的状态且股票列表与窗口一致时，只加入上次之后的新交易日
+        """
+        returns = daily_returns(panel['close'])
+        if (state is not None and state.symbols == panel.symbols and state.window == window
+                and state.last_date is not None and state.last_date in panel.dates):
+            start = panel.dates.get_loc(state.last_date) + 1
+            state.min_periods = min_periods
+            if start < len(panel.dates):
+                state.extend(returns[start:], panel.dates[start:])
+            return state, len(panel.dates) - start
+        rolling = cls(panel.symbols, window, min_periods)
+        rolling.extend(returns, panel.dates)
+        return rolling, len(panel.dates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='股票池滚动收益相关矩阵（分块计算、增量更新）')
+    add_universe_argument(parser)
+    parser.add_argument('--window', type=int, default=60, help='相关系数窗口（交易日）')
+    parser.add_argument('--min-periods', type=int, default=20, help='窗口内最少有效交易日')
+    parser.add_argument('--pairs', type=int, default=20, help='输出相关性最高的N对股票')
+    parser.add_argument('--output', default=None, help='保存完整相关矩阵（.npy，float32）')
+    parser.add_argument('--rebuild', action='store_true', help='忽略上次保存的状态，全量重算')
+    parser.add_argument('--offline', action='store_true', help='离线模式：只使用本地缓存，不联网')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    DataResilient.set_offline(args.offline)
+    symbols = Universe.resolve(args.universe)
+    end_date = datetime.now().strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=args.window * 2 + 30)).strftime('%Y%m%d')
+    panel = PricePanel.load(symbols, start_date, end_date)
+    print(f"面板: {panel.shape[0]} 个交易日 × {panel.shape[1]} 只股票")
+
+    name = f"{args.universe.replace(':', '_').replace('/', '_')}_{args.window}"
+    state = None if args.rebuild else RollingCorrelation.load(name)
+    rolling, added = RollingCorrelation.from_panel(panel, args.window, args.min_periods, state)
+    print(f"{'增量更新' if rolling is state else '全量计算'}: 加入 {added} 个交易日")
+    rolling.save(name)
+
+    if args.output:
+        matrix = np.lib.format.open_memmap(args.output, mode='w+', dtype=np.float32,
+                                           shape=(len(rolling.symbols), len(rolling.symbols)))
+        for start in range(0, len(rolling.symbols), rolling.block):
+            stop = min(start + rolling.block, len(rolling.symbols))
+            matrix[start:stop] = rolling.correlation_rows(start, stop)
+        matrix.flush()
+        print(f"相关矩阵已写入 {args.output}（股票顺序同面板，代码升序）")
+
+    print(f"\n=== 近{args.window}日收益相关性最高的{args.pairs}对股票 ===")
+    for a, b, value in rolling.top_pairs(args.pairs):
+        print(f"{a:<12}{b:<12}{value:>8.3f}")
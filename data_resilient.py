@@ -1,37 +1,81 @@
 import pandas as pd
-import akshare as ak
 import time
 import random
 from datetime import datetime
 from cache_manager import CacheManager
+from telemetry import Telemetry
+
+
+def _akshare():
+    """首次需要联网取数时才导入akshare（导入耗时约1秒，缓存命中时完全跳过）"""
+    if DataResilient.OFFLINE:
+        raise RuntimeError("离线模式下不允许联网获取数据")
+    import akshare
+    return akshare
+
 
 class DataResilient:
+    # 离线模式：只读本地缓存（忽略过期时间），缓存缺失时不联网
+    OFFLINE = False
+    # 复权方式：qfq 前复权 / hfq 后复权 / none 不复权（本地只存原始行情与复权因子，读取时换算）
+    ADJUST = 'qfq'
+
+    @classmethod
+    def set_offline(cls, offline: bool = True):
+        cls.OFFLINE = offline
+
+    @classmethod
+    def set_adjust(cls, adjust: str):
+        cls.ADJUST = adjust
+
     @staticmethod
-    def fetch_stock_data(symbol: str, start_date: str, end_date: str, use_cache: bool = True) -> pd.DataFrame:
+    def fetch_stock_data(symbol: str, start_date: str, end_date: str, use_cache: bool = True, max_retries: int = 3) -> pd.DataFrame:
+        from price_store import PriceStore
+        if DataResilient.OFFLINE:
+            return DataResilient.load_cached_stock_data(symbol, start_date, end_date)
+
         if use_cache:
-            cached_data = CacheManager.load_stock_cache(symbol, start_date, end_date)
-            if cached_data is not None:
-                return cached_data
+            return PriceStore.load(symbol, start_date, end_date, DataResilient.ADJUST, max_retries)
         
-        df = DataResilient._fetch_with_retry(symbol, start_date, end_date)
-        
-        if use_cache and df is not None and not df.empty:
-            CacheManager.save_stock_cache(symbol, start_date, end_date, df)
-        
-        return df
+        adjust = '' if DataResilient.ADJUST == 'none' else DataResilient.ADJUST
+        return DataResilient._fetch_with_retry(symbol, start_date, end_date, max_retries, adjust=adjust)
+    
+    @staticmethod
+    def load_cached_stock_data(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """只读本地缓存（可能已过期），不联网：离线模式与限时扫描的降级路径"""
+        from price_store import PriceStore
+        if PriceStore.raw_path(symbol).exists():
+            return PriceStore.load(symbol, start_date, end_date, DataResilient.ADJUST, local_only=True)
+        # 兼容旧版按区间缓存的行情
+        cached_data = CacheManager.load_stock_cache(symbol, start_date, end_date, ignore_expiry=True)
+        if cached_data is None:
+            cached_data = CacheManager.load_latest_stock_cache(symbol, start_date, end_date)
+        if cached_data is None:
+            raise ValueError(f"本地无缓存数据: {symbol}")
+        return cached_data
+
+    @staticmethod
+    def fetch_raw_bars(symbol: str, start_date: str, end_date: str, max_retries: int = 3) -> pd.DataFrame:
+        """不复权日线；区间内没有交易（如节假日、停牌）时返回空表"""
+        return DataResilient._fetch_with_retry(symbol, start_date, end_date, max_retries, adjust='', allow_empty=True)
     
     @staticmethod
-    def _fetch_with_retry(symbol: str, start_date: str, end_date: str, max_retries: int = 3) -> pd.DataFrame:
+    def _fetch_with_retry(symbol: str, start_date: str, end_date: str, max_retries: int = 3,
+                          adjust: str = '', allow_empty: bool = False) -> pd.DataFrame:
         for attempt in range(max_retries + 1):
             try:
-                df = ak.stock_zh_a_hist(
-                    symbol=symbol,
-                    period="daily",
-                    start_date=start_date,
-                    end_date=end_date
-                )
+                with Telemetry.timer('fetch_network', symbol):
+                    df = _akshare().stock_zh_a_hist(
+                        symbol=symbol,
+                        period="daily",
+                        start_date=start_date,
+                        end_date=end_date,
+                        adjust=adjust
+                    )
                 
                 if df is None or df.empty:
+                    if allow_empty:
+                        return pd.DataFrame()
                     raise ValueError(f"获取数据为空: {symbol}")
                 
                 df.rename(columns={
@@ -52,13 +96,62 @@ class DataResilient:
                 if attempt < max_retries:
                     delay = random.uniform(1, 3)
                     print(f"重试获取 {symbol} (第{attempt + 1}次) - 延迟 {delay:.1f}秒...")
+                    Telemetry.count('fetch_retries', kind='stock')
                     time.sleep(delay)
                 else:
                     print(f"获取 {symbol} 失败: {str(e)}")
+                    Telemetry.count('fetch_failures', kind='stock')
                     raise
     
+    @staticmethod
+    def fetch_minute_bars(symbol: str, start_date: str, end_date: str, period: str = '1', max_retries: int = 3) -> pd.DataFrame:
+        """
+        不复权分钟线（period: 1/5/15/30/60），时间戳为每根K线的结束时刻；区间内没有交易时返回空表。
+        数据源只保留近期分钟线（1分钟约最近5个交易日），更早的历史需逐日累积保存
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                with Telemetry.timer('fetch_minute', symbol):
+                    df = _akshare().stock_zh_a_hist_min_em(
+                        symbol=symbol,
+                        start_date=f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:]} 09:30:00",
+                        end_date=f"{end_date[:4]}-{end_date[4:6]}-{end_date[6:]} 15:00:00",
+                        period=period,
+                        adjust=''
+                    )
+
+                if df is None or df.empty:
+                    return pd.DataFrame()
+
+                df = df.rename(columns={
+                    '时间': 'date',
+                    '开盘': 'open',
+                    '收盘': 'close',
+                    '最高': 'high',
+                    '最低': 'low',
+                    '成交量': 'volume'
+                })[['date', 'open', 'close', 'high', 'low', 'volume']]
+
+                df['date'] = pd.to_datetime(df['date'])
+                return df.set_index('date')
+
+            except Exception as e:
+                if attempt < max_retries:
+                    delay = random.uniform(1, 3)
+                    print(f"重试获取 {symbol} 分钟线 (第{attempt + 1}次) - 延迟 {delay:.1f}秒...")
+                    Telemetry.count('fetch_retries', kind='minute')
+                    time.sleep(delay)
+                else:
+                    print(f"获取 {symbol} 分钟线失败: {str(e)}")
+                    Telemetry.count('fetch_failures', kind='minute')
+                    raise
+
     @staticmethod
     def fetch_macro_data(data_type: str, use_cache: bool = True) -> pd.DataFrame:
+        if DataResilient.OFFLINE:
+            cached_data = CacheManager.load_macro_cache(data_type, ignore_expiry=True)
+            return cached_data if cached_data is not None else pd.DataFrame()
+
         if use_cache:
             cached_data = CacheManager.load_macro_cache(data_type)
             if cached_data is not None:
@@ -74,10 +167,10 @@ class DataResilient:
     @staticmethod
     def _fetch_macro_with_retry(data_type: str, max_retries: int = 3) -> pd.DataFrame:
         fetch_functions = {
-            'cpi': lambda: ak.macro_china_cpi(),
-            'gdp': lambda: ak.macro_china_gdp(),
-            'pmi': lambda: ak.macro_china_pmi(),
-            'fx': lambda: ak.fx_spot_quote()
+            'cpi': lambda: _akshare().macro_china_cpi(),
+            'gdp': lambda: _akshare().macro_china_gdp(),
+            'pmi': lambda: _akshare().macro_china_pmi(),
+            'fx': lambda: _akshare().fx_spot_quote()
         }
         
         if data_type not in fetch_functions:
@@ -85,7 +178,8 @@ class DataResilient:
         
         for attempt in range(max_retries + 1):
             try:
-                df = fetch_functions[data_type]()
+                with Telemetry.timer('fetch_macro', data_type):
+                    df = fetch_functions[data_type]()
                 
                 if df is None:
                     df = pd.DataFrame()
@@ -96,22 +190,24 @@ class DataResilient:
                 if attempt < max_retries:
                     delay = random.uniform(1, 3)
                     print(f"重试获取 {data_type} 数据 (第{attempt + 1}次) - 延迟 {delay:.1f}秒...")
+                    Telemetry.count('fetch_retries', kind='macro')
                     time.sleep(delay)
                 else:
                     print(f"获取 {data_type} 数据失败: {str(e)}")
+                    Telemetry.count('fetch_failures', kind='macro')
                     return pd.DataFrame()
     
     @staticmethod
     def get_stock_info(use_cache: bool = True) -> pd.DataFrame:
         cache_key = 'stock_info'
         
-        if use_cache:
-            cached_data = CacheManager.load_macro_cache(cache_key)
+        if use_cache or DataResilient.OFFLINE:
+            cached_data = CacheManager.load_macro_cache(cache_key, ignore_expiry=DataResilient.OFFLINE)
             if cached_data is not None:
                 return cached_data
         
         try:
-            df = ak.stock_info_a_code_name()
+            df = _akshare().stock_info_a_code_name()
             
             if use_cache and df is not None and not df.empty:
                 CacheManager.save_macro_cache(cache_key, df)
@@ -125,13 +221,13 @@ class DataResilient:
     def get_hs300_symbols(use_cache: bool = True) -> list:
         cache_key = 'hs300_symbols'
         
-        if use_cache:
-            cached_data = CacheManager.load_macro_cache(cache_key)
+        if use_cache or DataResilient.OFFLINE:
+            cached_data = CacheManager.load_macro_cache(cache_key, ignore_expiry=DataResilient.OFFLINE)
             if cached_data is not None:
                 return cached_data
         
         try:
-            hs300 = ak.index_stock_cons(symbol="000300")
+            hs300 = _akshare().index_stock_cons(symbol="000300")
             hs300 = hs300.drop_duplicates(subset=['品种代码'], keep='first')
             hs300['symbol'] = hs300['品种代码'].astype(str).str.replace(r'\D', '', regex=True).str.zfill(6)
             hs300['symbol'] = hs300['symbol'].apply(lambda x: f"{x}.SZ" if x.startswith(('0','3')) else f"{x}.SH")
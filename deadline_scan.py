@@ -0,0 +1,166 @@
+import threading
+import time
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient, _akshare
+from price_store import PriceStore
+from telemetry import Telemetry
+
+# 连续超时/失败达到该次数视为上游降级，之后全部改读本地缓存
+BREAKER_THRESHOLD = 5
+
+
+class DeadlineSkip(Exception):
+    """限时扫描中放弃的股票（已记录在 DeadlineScan.skipped），不作为错误处理"""
+
+
+def call_with_timeout(fn, timeout: float):
+    """
+    在守护线程中执行 fn，最多等待 timeout 秒：返回 (完成与否, 结果, 异常)。
+    超时的调用无法强行中止，线程留在后台自行结束（守护线程不阻塞进程退出）
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = fn()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(max(timeout, 0))
+    if thread.is_alive():
+        return False, None, None
+    return True, outcome.get('result'), outcome.get('error')
+
+
+"""限时扫描：按优先级排序股票，取数超时或上游降级时改用本地旧缓存，到期立即停止并给出跳过/旧数据清单"""
+class DeadlineScan:
+    def __init__(self, budget: float, fetch_timeout: float = 20.0, reserve: float = None):
+        """
+        budget: 总时限（秒，从创建时起算）
+        fetch_timeout: 单只股票联网取数的最长等待时间
+        reserve: 时限末尾留给计算与输出的时间（默认总时限的20%，最多30秒），此后只读本地缓存
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        reserve = min(budget * 0.2, 30.0) if reserve is None else reserve
+        self.fetch_deadline = self.deadline - reserve
+        self.fetch_timeout = fetch_timeout
+        self.stale = {}      # 股票 → 原因（使用本地旧缓存）
+        self.skipped = {}    # 股票 → 原因（没有结果）
+        self.degraded = False
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    # ========== 优先级 ==========
+    def order(self, symbols: list, watchlist=(), liquidity: dict = None) -> list:
+        """
+        排序：本地行情已是最新的股票（无需联网）→ 自选股 → 按成交额降序（缺省保持股票池原顺序，
+        指数成分股即按指数给出的顺序）。同一档内保持相对顺序
+        """
+        watchlist = set(watchlist or ())
+        liquidity = liquidity or {}
+        position = {symbol: i for i, symbol in enumerate(symbols)}
+
+        def key(symbol):
+            code = symbol.split('.')[0]
+            return (not PriceStore.is_current(code), symbol not in watchlist,
+                    -liquidity.get(code, 0.0), position[symbol])
+
+        return sorted(symbols, key=key)
+
+    def liquidity(self, timeout: float = 5.0) -> dict:
+        """代码 → 当日成交额（全市场快照，一次请求；超时或失败时用最近一次缓存，仍没有则返回空）"""
+        cache_key = 'spot_amount'
+        amounts = CacheManager.load_macro_cache(cache_key, ignore_expiry=DataResilient.OFFLINE)
+        if amounts is not None or DataResilient.OFFLINE:
+            return amounts or {}
+
+        def fetch():
+            df = _akshare().stock_zh_a_spot_em()
+            return dict(zip(df['代码'].astype(str).str.zfill(6), pd.to_numeric(df['成交额'], errors='coerce').fillna(0.0)))
+
+        done, amounts, error = call_with_timeout(fetch, min(timeout, max(self.fetch_deadline - time.monotonic(), 0)))
+        if done and error is None:
+            CacheManager.save_macro_cache(cache_key, amounts)
+            return amounts
+        print(f"获取成交额快照{'超时' if not done else '失败: ' + str(error)}，使用最近一次缓存")
+        return CacheManager.load_macro_cache(cache_key, ignore_expiry=True) or {}
+
+    # ========== 取数 ==========
+    def wrap(self, fetch_fn, local_fn):
+        """
+        包装流水线的取数函数：剩余时间内限时联网取数，超时、失败、上游降级或已过取数截止时间时
+        改读本地缓存（记入 stale），本地也没有则抛出 DeadlineSkip（记入 skipped）
+        """
+        def fetch(symbol):
+            if self.expired():
+                return self._skip(symbol, '已到时限')
+            budget = min(self.fetch_timeout, self.fetch_deadline - time.monotonic())
+            if self.degraded or budget <= 0:
+                return self._local(symbol, local_fn, '上游降级' if self.degraded else '取数截止')
+
+            done, df, error = call_with_timeout(lambda: fetch_fn(symbol), budget)
+            if done and error is None and df is not None and not df.empty:
+                with self._lock:
+                    self._failures = 0
+                return df
+            self._record_failure()
+            Telemetry.count('deadline_fallbacks')
+            return self._local(symbol, local_fn, f"取数超时（{budget:.1f}秒）" if not done else f"取数失败: {error}")
+
+        return fetch
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= BREAKER_THRESHOLD and not self.degraded:
+                self.degraded = True
+                print(f"连续 {self._failures} 只股票取数超时或失败，判定上游降级，其余股票改读本地缓存")
+
+    def _local(self, symbol, local_fn, reason: str):
+        try:
+            df = local_fn(symbol)
+        except Exception:
+            df = None
+        if df is None or df.empty:
+            return self._skip(symbol, f"{reason}，本地无缓存")
+        with self._lock:
+            self.stale[symbol] = f"{reason}，使用截至 {df.index[-1].strftime('%Y-%m-%d')} 的本地缓存"
+        return df
+
+    def _skip(self, symbol, reason: str):
+        with self._lock:
+            self.skipped[symbol] = reason
+        Telemetry.count('deadline_skips')
+        raise DeadlineSkip(reason)
+
+    # ========== 收尾 ==========
+    def finish(self, symbols: list, processed) -> None:
+        """到时限时仍未出结果的股票记为跳过"""
+        for symbol in symbols:
+            if symbol not in processed and symbol not in self.skipped:
+                self.skipped[symbol] = '已到时限，未处理'
+
+    def report(self):
+        """打印旧数据与跳过清单"""
+        elapsed = time.monotonic() - self.started
+        print(f"\n=== 限时扫描: 用时 {elapsed:.1f}秒（时限 {self.deadline - self.started:.0f}秒）"
+              f"，使用旧缓存 {len(self.stale)} 只，跳过 {len(self.skipped)} 只 ===")
+        for title, entries in (('使用本地旧缓存', self.stale), ('跳过', self.skipped)):
+            if entries:
+                print(f"{title}:")
+                for symbol, reason in entries.items():
+                    print(f"  {symbol:<12} {reason}")
+
+    def summary(self) -> dict:
+        return {'elapsed': round(time.monotonic() - self.started, 2), 'degraded': self.degraded,
+                'stale': dict(self.stale), 'skipped': dict(self.skipped)}
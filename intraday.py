@@ -0,0 +1,249 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient
+from price_store import MARKET_CLOSE
+from telemetry import Telemetry
+from universe import Universe, add_universe_argument
+
+PERIODS = ('1', '5', '15', '30', '60')
+
+# 按列存储：时间为 datetime64[s] 的整数表示，价格与成交量用 float32（每根K线 24 字节）
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+COLUMNS = PRICE_COLUMNS + ['volume']
+
+# 连续竞价时段（以K线结束时刻计，单位：当日分钟数）：上午 9:31~11:30，下午 13:01~15:00，共240分钟
+MORNING_FIRST, MORNING_LAST = 9 * 60 + 31, 11 * 60 + 30
+AFTERNOON_FIRST = 13 * 60 + 1
+SESSION_MINUTES = 240
+
+
+def session_index(minute_of_day: np.ndarray) -> np.ndarray:
+    """K线结束时刻 → 当日第几分钟（0~239）；9:30 集合竞价K线并入第一分钟"""
+    index = np.where(minute_of_day <= MORNING_LAST,
+                     minute_of_day - MORNING_FIRST,
+                     minute_of_day - AFTERNOON_FIRST + (MORNING_LAST - MORNING_FIRST + 1))
+    return np.clip(index, 0, SESSION_MINUTES - 1)
+
+
+def session_minute(index: np.ndarray) -> np.ndarray:
+    """session_index 的反函数：当日第几分钟 → K线结束时刻（当日分钟数）"""
+    half = MORNING_LAST - MORNING_FIRST + 1
+    return np.where(index < half, index + MORNING_FIRST, index - half + AFTERNOON_FIRST)
+
+
+"""分钟线存储：每只股票每月一个 npz 列存文件，文件内按交易日分区（日期 + 起始行），按日期区间读取时只切片需要的交易日"""
+class IntradayStore:
+    ROOT = CacheManager.CACHE_DIR / "intraday"
+
+    @classmethod
+    def month_path(cls, symbol: str, period: str, month: str):
+        return cls.ROOT / f"{period}m" / symbol / f"{month}.npz"
+
+    # ========== 读取 ==========
+    @classmethod
+    def load_arrays(cls, symbol: str, start_date: str, end_date: str, period: str = '1') -> dict:
+        """返回 {'time': int64秒, 'open'..'volume': float32} 列数组（按时间升序）"""
+        first, last = int(start_date), int(end_date)
+        parts = []
+        for month in pd.period_range(pd.Timestamp(start_date), pd.Timestamp(end_date), freq='M'):
+            path = cls.month_path(symbol, period, month.strftime('%Y%m'))
+            if not path.exists():
+                continue
+            with Telemetry.timer('cache_load'), np.load(path, allow_pickle=False) as chunk:
+                days, offsets = chunk['days'], chunk['offsets']
+                # 日分区索引：offsets 比 days 多一项（末尾为总行数）
+                lo = offsets[np.searchsorted(days, first, side='left')]
+                hi = offsets[np.searchsorted(days, last, side='right')]
+                if hi > lo:
+                    parts.append({key: chunk[key][lo:hi] for key in ['time'] + COLUMNS})
+        if not parts:
+            return {key: np.empty(0, dtype=np.int64 if key == 'time' else np.float32) for key in ['time'] + COLUMNS}
+        return {key: np.concatenate([part[key] for part in parts]) for key in ['time'] + COLUMNS}
+
+    @classmethod
+    def load(cls, symbol: str, start_date: str, end_date: str, period: str = '1', bar_minutes: int = None) -> pd.DataFrame:
+        """
+        读取分钟线为 DataFrame（列与日线一致，可直接交给指标/信号/回测模块）。
+        bar_minutes: 聚合为更粗的周期（如 30、60、120，240 为日线），须为分钟线周期的整数倍
+        """
+        if bar_minutes and (bar_minutes < int(period) or bar_minutes % int(period)):
+            raise ValueError(f"聚合周期须为分钟线周期（{period}分钟）的整数倍: {bar_minutes}")
+        arrays = cls.load_arrays(symbol, start_date, end_date, period)
+        if bar_minutes and bar_minutes != int(period):
+            arrays = aggregate(arrays, bar_minutes)
+        return to_frame(arrays)
+
+    # ========== 写入 ==========
+    @classmethod
+    def save(cls, symbol: str, period: str, df: pd.DataFrame) -> int:
+        """按月合并写入（同一时刻以新数据为准），返回写入的K线数"""
+        if df is None or df.empty:
+            return 0
+        arrays = from_frame(df)
+        months = (arrays['time'] // 86400).astype('datetime64[D]').astype('datetime64[M]')
+        for month in np.unique(months):
+            mask = months == month
+            path = cls.month_path(symbol, period, str(month).replace('-', ''))
+            chunk = {key: values[mask] for key, values in arrays.items()}
+            if path.exists():
+                with np.load(path, allow_pickle=False) as existing:
+                    chunk = {key: np.concatenate([existing[key], chunk[key]]) for key in chunk}
+            cls._write(path, chunk)
+        return len(arrays['time'])
+
+    @staticmethod
+    def _write(path, chunk: dict):
+        # 倒序去重保留最后写入的一条（np.unique 同时按时间排序），再重建日分区索引
+        _, first = np.unique(chunk['time'][::-1], return_index=True)
+        rows = len(chunk['time']) - 1 - first
+        chunk = {key: values[rows] for key, values in chunk.items()}
+        dates = (chunk['time'] // 86400).astype('datetime64[D]')
+        day_numbers = np.char.replace(dates.astype(str), '-', '').astype(np.int32)
+        days, starts = np.unique(day_numbers, return_index=True)
+        offsets = np.append(starts, len(day_numbers)).astype(np.int64)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with Telemetry.timer('cache_save'):
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, days=days, offsets=offsets, **chunk)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        Telemetry.count('cache_write_bytes', size, kind='intraday')
+
+    @classmethod
+    def last_date(cls, symbol: str, period: str):
+        """本地已保存的最后一个交易日（YYYYMMDD），没有数据时返回 None"""
+        directory = cls.ROOT / f"{period}m" / symbol
+        months = sorted(directory.glob('*.npz')) if directory.exists() else []
+        if not months:
+            return None
+        with np.load(months[-1], allow_pickle=False) as chunk:
+            return str(chunk['days'][-1]) if len(chunk['days']) else None
+
+    @classmethod
+    def update(cls, symbol: str, start_date: str, end_date: str, period: str = '1', max_retries: int = 3) -> int:
+        """
+        只下载本地最后一个交易日之后的分钟线（最后一日重新下载以补全盘中保存的部分）。
+        收盘前取到的当日数据不写入，避免保存不完整的交易日
+        """
+        last = cls.last_date(symbol, period)
+        begin = max(start_date, last) if last else start_date
+        now = datetime.now()
+        settled = now.strftime('%Y%m%d') if now.strftime('%H:%M') >= MARKET_CLOSE else (now - timedelta(days=1)).strftime('%Y%m%d')
+        end = min(end_date, settled)
+        if begin > end:
+            return 0
+        df = DataResilient.fetch_minute_bars(symbol, begin, end, period, max_retries)
+        return cls.save(symbol, period, df)
+
+
+# ========== 列数组转换与聚合 ==========
+def from_frame(df: pd.DataFrame) -> dict:
+    arrays = {'time': df.index.values.astype('datetime64[s]').astype(np.int64)}
+    for column in COLUMNS:
+        arrays[column] = df[column].to_numpy(dtype=np.float32)
+    return arrays
+
+
+def to_frame(arrays: dict) -> pd.DataFrame:
+    """列数组 → DataFrame（价格转回 float64，避免指标累计误差）"""
+    index = pd.DatetimeIndex(arrays['time'].astype('datetime64[s]'), name='date')
+    return pd.DataFrame({column: arrays[column].astype(np.float64) for column in ['open', 'close', 'high', 'low', 'volume']},
+                        index=index)
+
+
+def aggregate(arrays: dict, bar_minutes: int) -> dict:
+    """
+    向量化聚合为 bar_minutes 分钟K线（须整除120，或为240即日线）：
+    按 (交易日, 时段桶) 分组，开盘取首根、收盘取末根、最高/最低/成交量用 reduceat，时间戳为桶的结束时刻
+    """
+    if not (120 % bar_minutes == 0 or bar_minutes == SESSION_MINUTES):
+        raise ValueError(f"聚合周期须整除120分钟或为240分钟: {bar_minutes}")
+    time = arrays['time']
+    if len(time) == 0:
+        return arrays
+    day = time // 86400
+    bucket = session_index((time % 86400) // 60) // bar_minutes
+    key = day * (SESSION_MINUTES + 1) + bucket
+    starts = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+    ends = np.append(starts[1:], len(time)) - 1
+    end_minute = session_minute((bucket[starts] + 1) * bar_minutes - 1)
+    return {
+        'time': day[starts] * 86400 + end_minute * 60,
+        'open': arrays['open'][starts],
+        'high': np.maximum.reduceat(arrays['high'], starts),
+        'low': np.minimum.reduceat(arrays['low'], starts),
+        'close': arrays['close'][ends],
+        'volume': np.add.reduceat(arrays['volume'], starts),
+    }
+
+
+# ========== 在分钟线上运行策略 ==========
+def evaluate(strategy: str, symbol: str, df: pd.DataFrame) -> dict:
+    """复用日线策略的指标/信号/回测模块；日期字段带上时刻"""
+    if strategy == 'pre':
+        import stockPre
+        result = stockPre.evaluate_symbol(symbol, df)
+    else:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock_grain_ranking'))
+        from main import MainExecutor
+        from data import DataCache
+        if not DataCache.macro_data:
+            DataCache.initialize()
+        analyzed = MainExecutor.analyze(symbol, df)
+        result = {'symbol': symbol, 'signal': int(analyzed['latest_signal']), 'return': analyzed['cum_return'],
+                  'latest_price': analyzed['latest_price'], 'buy_score': analyzed['latest_score']['buy_score']}
+    result['date'] = df.index[-1].strftime('%Y-%m-%d %H:%M')
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='分钟线下载、聚合与策略评估')
+    commands = parser.add_subparsers(dest='command', required=True)
+    fetch = commands.add_parser('fetch', help='增量下载分钟线到本地列存')
+    analyze = commands.add_parser('analyze', help='聚合分钟线并运行策略')
+    for command in (fetch, analyze):
+        command.add_argument('-s', '--symbols', nargs='+', help='股票代码（默认使用 -u 股票池）')
+        add_universe_argument(command)
+        command.add_argument('--period', choices=PERIODS, default='1', help='分钟线周期（默认1分钟）')
+        command.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=7)).strftime('%Y%m%d'),
+                             help='开始日期（YYYYMMDD，默认7天前）')
+        command.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    fetch.add_argument('--io-workers', type=int, default=8, help='下载线程数')
+    analyze.add_argument('--bar', type=int, default=30, help='聚合后的K线分钟数（--period 的整数倍，且整除120或为240即日线）')
+    analyze.add_argument('--strategy', choices=['pre', 'grain'], default='pre', help='pre=stockPre / grain=多维评分')
+    args = parser.parse_args()
+    if args.command == 'analyze' and (args.bar < int(args.period) or args.bar % int(args.period)):
+        parser.error(f"--bar 须为 --period（{args.period}分钟）的整数倍: {args.bar}")
+
+    symbols = [s.split('.')[0] for s in (args.symbols or Universe.resolve(args.universe))]
+    if args.command == 'fetch':
+        def fetch_one(symbol):
+            try:
+                return IntradayStore.update(symbol, args.begin, args.end, args.period)
+            except Exception as e:
+                print(f"{symbol} 下载失败: {str(e)}")
+                return 0
+        with ThreadPoolExecutor(max_workers=args.io_workers) as pool:
+            rows = sum(pool.map(fetch_one, symbols))
+        print(f"{len(symbols)} 只股票共写入 {rows} 根 {args.period} 分钟K线 → {IntradayStore.ROOT}")
+    else:
+        print(f"{'代码':<8}{'时间':<18}{'信号':>4}{'最新价':>8}{'收益率':>9}")
+        for symbol in symbols:
+            df = IntradayStore.load(symbol, args.begin, args.end, args.period, args.bar)
+            if len(df) < 30:
+                print(f"{symbol:<8}数据不足（{len(df)} 根K线）")
+                continue
+            try:
+                result = evaluate(args.strategy, symbol, df)
+            except Exception as e:
+                print(f"处理{symbol}时发生错误: {str(e)}")
+                continue
+            print(f"{symbol:<8}{result['date']:<18}{result['signal']:>4}{result['latest_price']:>8.2f}{result['return']:>9.2%}")
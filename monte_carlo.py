@@ -0,0 +1,166 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from panel import PricePanel
+from panel_indicators import IndicatorCache
+from panel_strategies import PanelStrategies
+from data_resilient import DataResilient
+from cache_manager import CacheManager
+
+"""蒙特卡洛稳健性分析：区块自助法置信区间 + 随机入场基准"""
+class MonteCarlo:
+    @staticmethod
+    def stationary_indices(rng, n_resamples: int, length: int, mean_block: float) -> np.ndarray:
+        """平稳自助法（Politis-Romano）：块长服从均值为mean_block的几何分布，一次生成全部重采样下标"""
+        steps = np.arange(length)
+        restart = rng.random((n_resamples, length)) < 1.0 / mean_block
+        restart[:, 0] = True
+        starts = rng.integers(0, length, size=(n_resamples, length))
+        block_start = np.maximum.accumulate(np.where(restart, steps, 0), axis=1)
+        base = np.take_along_axis(starts, block_start, axis=1)
+        return ((base + steps - block_start) % length).astype(np.int32)
+
+    @staticmethod
+    def block_indices(rng, n_resamples: int, length: int, block: int) -> np.ndarray:
+        """固定块长的移动区块自助法"""
+        n_blocks = -(-length // block)
+        starts = rng.integers(0, max(length - block, 0) + 1, size=(n_resamples, n_blocks))
+        indices = (starts[:, :, None] + np.arange(block)).reshape(n_resamples, -1)[:, :length]
+        return indices.astype(np.int32)
+
+    @staticmethod
+    def _index_counts(indices: np.ndarray, length: int) -> np.ndarray:
+        """重采样下标 → 每次重采样中各原始日期被抽中的次数（重采样数 × 日期）"""
+        n_resamples = indices.shape[0]
+        flat = (np.arange(n_resamples)[:, None] * length + indices).ravel()
+        return np.bincount(flat, minlength=n_resamples * length).reshape(n_resamples, length).astype(np.float64)
+
+    @staticmethod
+    def bootstrap(returns: np.ndarray, n_resamples: int = 10000, mean_block: float = 10, method: str = 'stationary',
+                  seed: int = None, periods_per_year: int = 252, alpha: float = 0.05) -> pd.DataFrame:
+        """
+        returns: 股票 × 日期 的策略收益（NaN按0计）
+        全部股票共用同一组日期重采样下标，保留横截面相关性。
+        累计收益与夏普只依赖求和，用 抽中次数矩阵 @ 收益 的矩阵乘法一次得到；回撤依赖路径，沿时间推进计算。
+        """
+        returns = np.nan_to_num(np.atleast_2d(np.asarray(returns, dtype=np.float64)))
+        n_symbols, length = returns.shape
+        rng = np.random.default_rng(seed)
+        if method == 'stationary':
+            indices = MonteCarlo.stationary_indices(rng, n_resamples, length, mean_block)
+        elif method == 'block':
+            indices = MonteCarlo.block_indices(rng, n_resamples, length, int(mean_block))
+        else:
+            raise ValueError(f"不支持的重采样方法: {method}")
+
+        log_returns = np.log1p(returns)
+        counts = MonteCarlo._index_counts(indices, length)
+        total_return = np.expm1(counts @ log_returns.T)
+        mean = (counts @ returns.T) / length
+        var = ((counts @ (returns ** 2).T) / length - mean ** 2) * length / (length - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe = mean / np.sqrt(var) * np.sqrt(periods_per_year)
+
+        # 沿时间逐步推进、在 重采样 × 股票 维度上整体向量化：内存只占两维，无需展开三维路径
+        log_rows = np.ascontiguousarray(log_returns.T, dtype=np.float32)
+        equity = np.zeros((n_resamples, n_symbols), dtype=np.float32)
+        peak = np.zeros_like(equity)
+        drawdown = np.zeros_like(equity)
+        gap = np.empty_like(equity)
+        for step in np.ascontiguousarray(indices.T):
+            np.add(equity, log_rows[step], out=equity)
+            np.maximum(peak, equity, out=peak)
+            np.subtract(peak, equity, out=gap)
+            np.maximum(drawdown, gap, out=drawdown)
+        max_drawdown = -np.expm1(-drawdown.astype(np.float64))
+
+        quantiles = [alpha / 2, 0.5, 1 - alpha / 2]
+        columns = {}
+        for name, samples in (('total_return', total_return), ('sharpe', sharpe), ('max_drawdown', max_drawdown)):
+            low, median, high = np.nanquantile(samples, quantiles, axis=0)
+            columns[f'{name}_low'] = low
+            columns[f'{name}_median'] = median
+            columns[f'{name}_high'] = high
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def _circular_correlation(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """所有循环平移量下的 Σ_t a[(t+s) % T] * b[t]，FFT一次算出（股票 × 平移量）"""
+        length = a.shape[1]
+        return np.fft.irfft(np.fft.rfft(a, axis=1) * np.conj(np.fft.rfft(b, axis=1)), n=length, axis=1)
+
+    @staticmethod
+    def random_entry(positions: np.ndarray, market_returns: np.ndarray, n_resamples: int = 10000,
+                     seed: int = None, periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        随机入场基准：把策略持仓序列整体随机循环平移，保持持仓占比、持仓段长度与多空结构，只打乱入场时点。
+        持仓取值 {-1, 0, 1} 时对数收益可拆为线性项，所有平移量的结果通过FFT一次求出，再按随机平移量抽样。
+        """
+        positions = np.nan_to_num(np.atleast_2d(np.asarray(positions, dtype=np.float64)))
+        market = np.nan_to_num(np.atleast_2d(np.asarray(market_returns, dtype=np.float64)))
+        length = market.shape[1]
+
+        long_leg = MonteCarlo._circular_correlation((positions > 0).astype(np.float64), np.log1p(market))
+        short_leg = MonteCarlo._circular_correlation((positions < 0).astype(np.float64), np.log1p(-market))
+        total_return = np.expm1(long_leg + short_leg)
+        mean = MonteCarlo._circular_correlation(positions, market) / length
+        second = MonteCarlo._circular_correlation(positions ** 2, market ** 2) / length
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe = mean / np.sqrt((second - mean ** 2) * length / (length - 1)) * np.sqrt(periods_per_year)
+
+        rng = np.random.default_rng(seed)
+        shifts = rng.integers(1, length, size=n_resamples)
+        observed_return = total_return[:, 0]
+        sampled_return = total_return[:, shifts]
+        sampled_sharpe = sharpe[:, shifts]
+        return pd.DataFrame({
+            'observed_return': observed_return,
+            'baseline_return_mean': sampled_return.mean(axis=1),
+            'baseline_return_p95': np.quantile(sampled_return, 0.95, axis=1),
+            'observed_sharpe': sharpe[:, 0],
+            'baseline_sharpe_mean': np.nanmean(sampled_sharpe, axis=1),
+            # 随机入场结果不低于实际策略的比例，越小说明入场时点越有效
+            'p_value': (sampled_return >= observed_return[:, None]).mean(axis=1),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='stockPre 策略收益蒙特卡洛稳健性分析')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（默认沪深300成分股）')
+    parser.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=365)).strftime('%Y%m%d'), help='开始日期（格式：YYYYMMDD）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--resamples', type=int, default=10000, help='重采样次数')
+    parser.add_argument('--block', type=float, default=10, help='平均块长（交易日）')
+    parser.add_argument('--method', choices=['stationary', 'block'], default='stationary', help='重采样方法')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', default='monte_carlo.csv', help='结果CSV文件')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    symbols = args.symbols or DataResilient.get_hs300_symbols(use_cache=True)
+    if not symbols:
+        raise ValueError("无法获取沪深300成分股数据")
+
+    panel = PricePanel.load(symbols, args.begin, args.end)
+    cache = IndicatorCache(panel.fields)
+    signal = PanelStrategies.pre_signals(cache, {})
+    market_returns = cache.get('returns')
+    strategy_returns = PanelStrategies.backtest(signal, market_returns)
+    positions = np.vstack([np.zeros((1, signal.shape[1])), signal[:-1]])
+
+    start_time = time.time()
+    intervals = MonteCarlo.bootstrap(strategy_returns.T, n_resamples=args.resamples, mean_block=args.block,
+                                     method=args.method, seed=args.seed)
+    baseline = MonteCarlo.random_entry(positions.T, market_returns.T, n_resamples=args.resamples, seed=args.seed)
+    print(f"{len(panel.symbols)}只股票 × {args.resamples}次重采样 用时: {time.time() - start_time:.1f}秒")
+
+    table = pd.concat([baseline, intervals], axis=1)
+    table.index = pd.Index(panel.symbols, name='symbol')
+    table = table.sort_values('observed_return', ascending=False)
+    print("\n=== 累计收益95%置信区间与随机入场基准 (前20) ===")
+    print(table[['observed_return', 'total_return_low', 'total_return_median', 'total_return_high',
+                 'baseline_return_mean', 'p_value']].head(20).to_string(float_format=lambda x: f"{x:.4f}"))
+    table.to_csv(args.output, encoding='utf-8-sig')
+    print(f"结果已保存到 {args.output}")
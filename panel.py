@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+from data_resilient import DataResilient
+
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+"""价格面板模块：日期 × 股票 的二维数组"""
+class PricePanel:
+    def __init__(self, symbols: List[str], dates: pd.DatetimeIndex, fields: Dict[str, np.ndarray]):
+        self.symbols = list(symbols)
+        self.dates = pd.DatetimeIndex(dates)
+        self.fields = fields
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+
+    @property
+    def shape(self) -> tuple:
+        return len(self.dates), len(self.symbols)
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame], fields=PANEL_FIELDS) -> 'PricePanel':
+        """将 {股票代码: 日线DataFrame} 按日期并集对齐为面板，停牌日为NaN"""
+        frames = {s: f for s, f in frames.items() if f is not None and not f.empty}
+        symbols = sorted(frames)
+        if not symbols:
+            return cls([], pd.DatetimeIndex([]), {f: np.empty((0, 0)) for f in fields})
+
+        dates = frames[symbols[0]].index
+        for symbol in symbols[1:]:
+            dates = dates.union(frames[symbol].index)
+
+        data = {}
+        for field in fields:
+            columns = {s: frames[s][field] for s in symbols if field in frames[s].columns}
+            data[field] = (pd.DataFrame(columns)
+                           .reindex(index=dates, columns=symbols)
+                           .to_numpy(dtype=np.float64))
+        return cls(symbols, dates, data)
+
+    @classmethod
+    def load(cls, symbols: List[str], start_date: str, end_date: str, use_cache: bool = True) -> 'PricePanel':
+        """一次性加载整个股票池（走缓存+重试），获取失败的股票直接跳过"""
+        frames = {}
+        for symbol in symbols:
+            base_symbol = symbol.split('.')[0]
+            try:
+                frames[symbol] = DataResilient.fetch_stock_data(base_symbol, start_date, end_date, use_cache=use_cache)
+            except Exception as e:
+                print(f"加载 {symbol} 失败，跳过: {str(e)}")
+        return cls.from_frames(frames)
+
+    def frame(self, field: str) -> pd.DataFrame:
+        return pd.DataFrame(self.fields[field], index=self.dates, columns=self.symbols)
+
+
+"""共享内存面板：父进程发布一次，子进程按名称挂载，避免每个任务重复pickle大数组"""
+class SharedPanel:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            view[...] = array
+            self._blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # 子进程持有的共享块引用，防止被回收后视图失效
+    _attached = []
+
+    @classmethod
+    def attach(cls, spec: dict) -> Dict[str, np.ndarray]:
+        """在子进程中按spec挂载共享数组（只读视图）"""
+        arrays = {}
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            cls._attached.append(block)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            view.flags.writeable = False
+            arrays[name] = view
+        return arrays
+
+
+def panel_arrays(panel: PricePanel, extra: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """面板字段 + 日期(int64纳秒) 打包为可发布到共享内存的数组字典"""
+    arrays = dict(panel.fields)
+    arrays['_dates'] = panel.dates.asi8.copy()
+    if extra:
+        arrays.update(extra)
+    return arrays
@@ -0,0 +1,175 @@
+import ast
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from rolling_index import RollingIndex
+
+"""面板指标计算模块：对 日期 × 股票 二维数组整体向量化计算，口径与 pandas_ta 默认参数一致"""
+class PanelIndicators:
+    @staticmethod
+    def _frame(values):
+        return pd.DataFrame(values, copy=False)
+
+    @staticmethod
+    def sma(values, length):
+        """简单移动平均（同 ta.sma）"""
+        return PanelIndicators._frame(values).rolling(window=length, min_periods=length).mean().to_numpy()
+
+    @staticmethod
+    def rolling_std(values, length, ddof=0):
+        """滚动标准差（BOLL使用总体标准差，同 ta.bbands 默认 ddof=0）"""
+        return PanelIndicators._frame(values).rolling(window=length, min_periods=length).std(ddof=ddof).to_numpy()
+
+    @staticmethod
+    def ema(values, length):
+        """指数移动平均（同 ta.ema：以每列首个有效值起前length个值的均值作为初值，adjust=False）"""
+        values = np.asarray(values, dtype=np.float64)
+        rows = values.shape[0]
+        if rows == 0:
+            return values.copy()
+        valid = ~np.isnan(values)
+        first = valid.argmax(axis=0)
+        seed = first + length - 1
+        usable = valid.any(axis=0) & (seed < rows)
+
+        # 用前缀和一次求出每列种子窗口的均值（跳过NaN，同 Series.mean）
+        padded = np.zeros((rows + 1, values.shape[1]))
+        counts = np.zeros((rows + 1, values.shape[1]))
+        np.cumsum(np.where(valid, values, 0.0), axis=0, out=padded[1:])
+        np.cumsum(valid, axis=0, out=counts[1:])
+        cols = np.nonzero(usable)[0]
+        seed_sum = padded[seed[cols] + 1, cols] - padded[first[cols], cols]
+        seed_cnt = counts[seed[cols] + 1, cols] - counts[first[cols], cols]
+
+        seeded = values.copy()
+        seed_row = np.where(usable, seed, rows)
+        seeded[np.arange(rows)[:, None] < seed_row[None, :]] = np.nan
+        seeded[seed[cols], cols] = seed_sum / seed_cnt
+        return pd.DataFrame(seeded).ewm(span=length, adjust=False).mean().to_numpy()
+
+    @staticmethod
+    def macd(close, fast=12, slow=26, signal=9):
+        """MACD：返回 (macd, macd_signal, macd_hist)"""
+        macd = PanelIndicators.ema(close, fast) - PanelIndicators.ema(close, slow)
+        macd_signal = PanelIndicators.ema(macd, signal)
+        return macd, macd_signal, macd - macd_signal
+
+    @staticmethod
+    def rsi(close, length=14):
+        """RSI（同 ta.rsi：Wilder平滑 rma）"""
+        diff = PanelIndicators._frame(close).diff()
+        alpha = 1.0 / length
+        gain = diff.clip(lower=0).ewm(alpha=alpha, min_periods=length).mean()
+        loss = (-diff).clip(lower=0).ewm(alpha=alpha, min_periods=length).mean()
+        return (100 * gain / (gain + loss)).to_numpy()
+
+    @staticmethod
+    def bbands(close, length=20, std=2.0):
+        """BOLL：返回 (lower, mid, upper)"""
+        mid = PanelIndicators.sma(close, length)
+        dev = PanelIndicators.rolling_std(close, length) * std
+        return mid - dev, mid, mid + dev
+
+    @staticmethod
+    def volume_pct_change(volume, length=3):
+        """成交量相对前length日均量的变化率"""
+        volume_ma = PanelIndicators.sma(volume, length)
+        shifted = np.full_like(volume_ma, np.nan)
+        shifted[1:] = volume_ma[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return volume / shifted - 1
+
+
+"""指标缓存：同一进程内参数相同的指标只计算一次，供多个参数组合复用（LRU淘汰控制内存）"""
+class IndicatorCache:
+    def __init__(self, fields, max_entries=64, rolling_index=True):
+        """rolling_index: 均线/BOLL/均量由前缀和索引查表计算，多个窗口长度共用一次预处理"""
+        self.fields = fields
+        self.max_entries = max_entries
+        self.rolling_index = rolling_index
+        self._indexes = {}
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, *params):
+        key = (name,) + params
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        value = self._compute(name, params)
+        self._cache[key] = value
+        if self.max_entries and len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return value
+
+    def index(self, field):
+        """字段的滚动统计前缀索引（首次使用时构建）"""
+        if field not in self._indexes:
+            self._indexes[field] = RollingIndex(self.fields[field])
+        return self._indexes[field]
+
+    def _compute(self, name, params):
+        close = self.fields['close']
+        if self.rolling_index and name in ('sma', 'bbands', 'sma_volume'):
+            if name == 'sma':
+                return self.index('close').mean(*params)
+            if name == 'bbands':
+                return self.index('close').bbands(*params)
+            return self.index('volume').mean(*params)
+        if name == 'sma':
+            return PanelIndicators.sma(close, *params)
+        if name == 'macd':
+            return PanelIndicators.macd(close, *params)
+        if name == 'rsi':
+            return PanelIndicators.rsi(close, *params)
+        if name == 'bbands':
+            return PanelIndicators.bbands(close, *params)
+        if name == 'sma_volume':
+            return PanelIndicators.sma(self.fields['volume'], *params)
+        if name == 'volume_pct_change':
+            return PanelIndicators.volume_pct_change(self.fields['volume'], *params)
+        if name == 'returns':
+            # 停牌日收益为NaN，复牌日相对停牌前最后收盘价计算
+            prev_close = pd.DataFrame(close).ffill().shift(1).to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return close / prev_close - 1
+        raise ValueError(f"不支持的指标: {name}")
+
+    def clear(self):
+        self._cache.clear()
+        self._indexes.clear()
+
+    def export(self) -> dict:
+        """导出已计算指标为 名称→数组，可发布到共享内存"""
+        arrays = {}
+        for key, value in self._cache.items():
+            if isinstance(value, tuple):
+                for i, item in enumerate(value):
+                    arrays[f"{key!r}#{i}"] = item
+            else:
+                arrays[repr(key)] = value
+        return arrays
+
+    def preload(self, arrays: dict):
+        """载入 export() 导出的指标（如子进程挂载的共享内存视图）"""
+        parts = {}
+        for name, array in arrays.items():
+            key, _, index = name.partition('#')
+            key = ast.literal_eval(key)
+            if index:
+                parts.setdefault(key, {})[int(index)] = array
+            else:
+                self._cache[key] = array
+        for key, items in parts.items():
+            self._cache[key] = tuple(items[i] for i in sorted(items))
+
+    def sliced(self, rows: slice) -> 'IndicatorCache':
+        """按行（日期）切片得到子缓存，只建视图不复制；逐元素策略可直接在子缓存上计算"""
+        view = IndicatorCache({name: array[rows] for name, array in self.fields.items()}, self.max_entries,
+                              self.rolling_index)
+        for key, value in self._cache.items():
+            view._cache[key] = tuple(v[rows] for v in value) if isinstance(value, tuple) else value[rows]
+        return view
@@ -0,0 +1,172 @@
+import numpy as np
+from panel_indicators import IndicatorCache
+
+# stockPre 多条件策略默认参数（与 stockPre.py 完全一致）
+PRE_DEFAULTS = {
+    'ma_short': 5,
+    'ma_long': 20,
+    'rsi_length': 14,
+    'rsi_buy': 30,
+    'rsi_sell': 70,
+    'boll_length': 20,
+    'boll_std': 2.0,
+    'volume_length': 3,
+    'volume_threshold': 0.2,
+    'min_conditions': 2,
+}
+
+# stockPre 买入条件名称（与输出的“判定依据”一致）
+PRE_CRITERIA = ["均线金叉", "MACD金叉", "RSI超卖", "BOLL下轨", "放量20%"]
+
+# stock_grain_ranking 多维评分策略默认参数（阈值取趋势市低波动档）
+GRAIN_DEFAULTS = {
+    'ma_short': 5,
+    'ma_long': 20,
+    'rsi_length': 14,
+    'boll_length': 20,
+    'boll_std': 2.0,
+    'volume_length': 3,
+    'buy_threshold': 0.58,
+    'sell_threshold': 0.12,
+}
+
+# 指标参数键：参数组合按这些键排序后，相邻组合可复用同一批缓存指标
+INDICATOR_KEYS = ('ma_short', 'ma_long', 'rsi_length', 'boll_length', 'boll_std', 'volume_length')
+
+
+"""面板策略模块：在 日期 × 股票 面板上向量化复现两套策略的信号与回测"""
+class PanelStrategies:
+    @staticmethod
+    def pre_conditions(cache: IndicatorCache, params: dict):
+        """stockPre：返回 (5个买入条件布尔面板列表, 卖出条件布尔面板)，顺序同 PRE_CRITERIA"""
+        params = {**PRE_DEFAULTS, **params}
+        close = cache.fields['close']
+        ma_short = cache.get('sma', params['ma_short'])
+        ma_long = cache.get('sma', params['ma_long'])
+        macd, macd_signal, _ = cache.get('macd', 12, 26, 9)
+        rsi = cache.get('rsi', params['rsi_length'])
+        boll_lower, _, boll_upper = cache.get('bbands', params['boll_length'], params['boll_std'])
+        volume_pct_change = cache.get('volume_pct_change', params['volume_length'])
+
+        with np.errstate(invalid='ignore'):
+            buy_conditions = [
+                ma_short > ma_long,
+                macd > macd_signal,
+                rsi < params['rsi_buy'],
+                close < boll_lower,
+                volume_pct_change > params['volume_threshold'],
+            ]
+            sell_condition = (macd < macd_signal) | (rsi > params['rsi_sell']) | (close > boll_upper)
+        return buy_conditions, sell_condition
+
+    @staticmethod
+    def pre_signals(cache: IndicatorCache, params: dict) -> np.ndarray:
+        """stockPre：5个买入条件至少满足min_conditions个买入，任一卖出条件触发卖出"""
+        params = {**PRE_DEFAULTS, **params}
+        buy_conditions, sell_condition = PanelStrategies.pre_conditions(cache, params)
+        satisfied_counts = sum(cond.astype(np.int8) for cond in buy_conditions)
+
+        signal = np.where(satisfied_counts >= params['min_conditions'], 1, 0).astype(np.int8)
+        signal[sell_condition] = -1
+        return signal
+
+    @staticmethod
+    def grain_scores(cache: IndicatorCache, params: dict, macro_score=None):
+        """stock_grain_ranking：返回 (buy_score, sell_pressure)，macro_score为按日期的一维数组，缺省取0.10"""
+        params = {**GRAIN_DEFAULTS, **params}
+        close = cache.fields['close']
+        volume = cache.fields['volume']
+        ma_short = cache.get('sma', params['ma_short'])
+        ma_long = cache.get('sma', params['ma_long'])
+        macd, macd_signal, _ = cache.get('macd', 12, 26, 9)
+        rsi = cache.get('rsi', params['rsi_length'])
+        boll_lower, boll_mid, _ = cache.get('bbands', params['boll_length'], params['boll_std'])
+        volume_pct_change = cache.get('volume_pct_change', params['volume_length'])
+        volume_ma = cache.get('sma_volume', params['volume_length'])
+        pct_change = cache.get('returns')
+
+        if macro_score is None:
+            macro_score = 0.10
+        else:
+            macro_score = np.asarray(macro_score, dtype=np.float64)[:, None]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            buy_score = (
+                (macd > macd_signal) * 0.3
+                + np.where(close < boll_lower, 1.0, np.where(close > boll_mid, 0.5, 0.0)) * 0.2
+                + (rsi < 30) * 0.15
+                + (volume_pct_change > 0.2) * 0.2
+                + macro_score
+            )
+
+            ma_decay = (ma_long - ma_short) / ma_long
+            macd_decay = (macd_signal - macd) / (np.abs(macd_signal) + 1e-6)
+            trend_decay = np.clip(ma_decay * 0.6 + macd_decay * 0.4, 0, 1) * 0.1
+            overbought = np.clip((rsi - 60) / (100 - 60), 0, 1) * 0.1
+            capital_outflow = np.clip((-volume_pct_change - 0.1) / 0.8, 0, 1) * 0.1
+
+            price_drops = np.clip(-pct_change, 0, None)
+            three_day_drop = PanelStrategies._rolling_sum(pct_change < 0, 3) >= 2
+            cumulative_drop = PanelStrategies._rolling_sum(pct_change, 3) < -0.015
+            single_day_drop = (pct_change < -0.025) & (volume > volume_ma * 1.2)
+            drawdown_pressure = np.where(
+                (three_day_drop & cumulative_drop) | single_day_drop,
+                1.0,
+                np.clip(price_drops / 0.03, 0, 1)
+            ) * 0.1
+
+        # 与 DataFrame.sum(axis=1) 一致：NaN分项按0计
+        sell_pressure = (np.nan_to_num(trend_decay) + np.nan_to_num(overbought)
+                         + np.nan_to_num(capital_outflow) + np.nan_to_num(drawdown_pressure))
+        return buy_score, sell_pressure
+
+    @staticmethod
+    def grain_signals(cache: IndicatorCache, params: dict, macro_score=None) -> np.ndarray:
+        """按固定买卖阈值生成信号（买入优先，同 np.select 顺序）"""
+        params = {**GRAIN_DEFAULTS, **params}
+        buy_score, sell_pressure = PanelStrategies.grain_scores(cache, params, macro_score)
+        return np.select(
+            [buy_score >= params['buy_threshold'], sell_pressure >= params['sell_threshold']],
+            [1, -1],
+            default=0
+        ).astype(np.int8)
+
+    @staticmethod
+    def _rolling_sum(values, window):
+        """固定窗口滚动求和，窗口内含NaN时结果为NaN（同 rolling(window).sum()）"""
+        values = np.asarray(values, dtype=np.float64)
+        out = np.full_like(values, np.nan)
+        if values.shape[0] < window:
+            return out
+        padded = np.vstack([np.zeros((1, values.shape[1])), np.nan_to_num(values)])
+        cumsum = np.cumsum(padded, axis=0)
+        nan_count = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), np.isnan(values)]), axis=0)
+        window_sum = cumsum[window:] - cumsum[:-window]
+        window_nan = nan_count[window:] - nan_count[:-window]
+        out[window - 1:] = np.where(window_nan > 0, np.nan, window_sum)
+        return out
+
+    @staticmethod
+    def backtest(signal: np.ndarray, returns: np.ndarray) -> np.ndarray:
+        """次日执行：position = signal.shift(1)，返回逐日策略收益（NaN表示无持仓数据）"""
+        position = np.full(signal.shape, np.nan)
+        position[1:] = signal[:-1]
+        return position * returns
+
+    @staticmethod
+    def report(strategy_returns: np.ndarray, periods_per_year: int = 252) -> dict:
+        """逐股票计算 BacktestStrategy.generate_report 同口径指标：最终净值、最大回撤、夏普"""
+        filled = np.nan_to_num(strategy_returns)
+        cum_returns = np.cumprod(1 + filled, axis=0)
+        valid = ~np.isnan(strategy_returns).all(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            final_return = np.where(valid, cum_returns[-1], np.nan) if len(cum_returns) else np.full(valid.shape, np.nan)
+            max_drawdown = np.where(valid, (np.maximum.accumulate(cum_returns, axis=0) - cum_returns).max(axis=0, initial=0), np.nan)
+            mean = np.nanmean(strategy_returns, axis=0)
+            std = np.nanstd(strategy_returns, axis=0, ddof=1)
+            sharpe_ratio = mean / std * np.sqrt(periods_per_year)
+        return {
+            'final_return': final_return,
+            'max_drawdown': max_drawdown,
+            'sharpe_ratio': sharpe_ratio,
+        }
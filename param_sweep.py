@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from panel import PricePanel, SharedPanel, panel_arrays
+from panel_indicators import IndicatorCache
+from panel_strategies import PanelStrategies, PRE_DEFAULTS, GRAIN_DEFAULTS, INDICATOR_KEYS
+from data_resilient import DataResilient
+from cache_manager import CacheManager
+
+STRATEGIES = {
+    'pre': (PanelStrategies.pre_signals, PRE_DEFAULTS),
+    'grain': (PanelStrategies.grain_signals, GRAIN_DEFAULTS),
+}
+
+# 子进程状态：共享面板与指标缓存在进程生命周期内常驻，跨任务复用
+_worker_state = {}
+
+
+def _init_worker(spec, strategy, macro_score):
+    arrays = SharedPanel.attach(spec)
+    _worker_state['cache'] = IndicatorCache(arrays)
+    _worker_state['strategy'] = strategy
+    _worker_state['macro_score'] = macro_score
+
+
+def _evaluate_chunk(combos):
+    return [ParamSweep.evaluate(_worker_state['cache'], _worker_state['strategy'], params, _worker_state['macro_score'])
+            for params in combos]
+
+
+"""参数网格搜索引擎"""
+class ParamSweep:
+    @staticmethod
+    def expand_grid(grid: dict, strategy: str = 'pre') -> list:
+        """展开参数网格为参数组合列表，并按指标参数排序使相邻组合共享指标缓存"""
+        defaults = STRATEGIES[strategy][1]
+        unknown = set(grid) - set(defaults)
+        if unknown:
+            raise ValueError(f"未知参数: {sorted(unknown)}")
+
+        keys = list(grid)
+        combos = [{**defaults, **dict(zip(keys, values))} for values in itertools.product(*(grid[k] for k in keys))]
+        combos = [c for c in combos if c['ma_short'] < c['ma_long']]
+        combos.sort(key=lambda c: tuple(c[k] for k in INDICATOR_KEYS))
+        return combos
+
+    @staticmethod
+    def strategy_returns(cache: IndicatorCache, strategy: str, params: dict, macro_score=None) -> np.ndarray:
+        """单个参数组合在全股票池上的逐日策略收益"""
+        signal_fn = STRATEGIES[strategy][0]
+        if strategy == 'grain':
+            signal = signal_fn(cache, params, macro_score)
+        else:
+            signal = signal_fn(cache, params)
+        return PanelStrategies.backtest(signal, cache.get('returns'))
+
+    @staticmethod
+    def summarize(strategy_returns: np.ndarray) -> dict:
+        """按股票计算回测指标后做横截面汇总"""
+        report = PanelStrategies.report(strategy_returns)
+        with np.errstate(invalid='ignore'):
+            return {
+                'mean_return': np.nanmean(report['final_return']) - 1,
+                'median_return': np.nanmedian(report['final_return']) - 1,
+                'mean_sharpe': np.nanmean(report['sharpe_ratio']),
+                'mean_max_drawdown': np.nanmean(report['max_drawdown']),
+                'win_rate': np.nanmean(report['final_return'] > 1),
+                'n_symbols': int(np.sum(~np.isnan(report['final_return']))),
+            }
+
+    @staticmethod
+    def evaluate(cache: IndicatorCache, strategy: str, params: dict, macro_score=None) -> dict:
+        """评估单个参数组合：全股票池回测并汇总"""
+        strategy_returns = ParamSweep.strategy_returns(cache, strategy, params, macro_score)
+        return {**params, **ParamSweep.summarize(strategy_returns)}
+
+    @staticmethod
+    def run(panel: PricePanel, grid: dict, strategy: str = 'pre', workers: int = None,
+            sort_by: str = 'mean_return', macro_score=None) -> pd.DataFrame:
+        """并行评估所有参数组合，返回按 sort_by 降序排列的结果表"""
+        combos = ParamSweep.expand_grid(grid, strategy)
+        workers = workers or os.cpu_count() or 1
+        print(f"参数组合数: {len(combos)}  股票数: {len(panel.symbols)}  交易日: {len(panel.dates)}  进程数: {workers}")
+
+        if workers <= 1 or len(combos) <= 1:
+            cache = IndicatorCache(panel.fields)
+            rows = [ParamSweep.evaluate(cache, strategy, params, macro_score) for params in combos]
+        else:
+            # 连续切块：同一块内的组合指标参数相近，子进程缓存命中率高
+            chunk_size = max(1, len(combos) // (workers * 4))
+            chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+            rows = []
+            with SharedPanel(panel_arrays(panel)) as shared:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(shared.spec, strategy, macro_score)) as executor:
+                    for chunk_rows in executor.map(_evaluate_chunk, chunks):
+                        rows.extend(chunk_rows)
+
+        results = pd.DataFrame(rows)
+        if results.empty:
+            return results
+        return results.sort_values(sort_by, ascending=False).reset_index(drop=True)
+
+
+def add_grid_arguments(parser):
+    """注册各策略参数的网格取值选项（walk_forward.py 复用）"""
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='pre', help='策略：pre=stockPre多条件，grain=多维评分')
+    parser.add_argument('--ma-short', dest='ma_short', type=int, nargs='+')
+    parser.add_argument('--ma-long', dest='ma_long', type=int, nargs='+')
+    parser.add_argument('--rsi-length', dest='rsi_length', type=int, nargs='+')
+    parser.add_argument('--rsi-buy', dest='rsi_buy', type=float, nargs='+')
+    parser.add_argument('--rsi-sell', dest='rsi_sell', type=float, nargs='+')
+    parser.add_argument('--boll-length', dest='boll_length', type=int, nargs='+')
+    parser.add_argument('--boll-std', dest='boll_std', type=float, nargs='+')
+    parser.add_argument('--volume-threshold', dest='volume_threshold', type=float, nargs='+')
+    parser.add_argument('--min-conditions', dest='min_conditions', type=int, nargs='+')
+    parser.add_argument('--buy-threshold', dest='buy_threshold', type=float, nargs='+')
+    parser.add_argument('--sell-threshold', dest='sell_threshold', type=float, nargs='+')
+
+
+def parse_grid(args):
+    """收集命令行给出的网格取值；给出了所选策略没有的参数时报错，避免该维度被静默忽略"""
+    defaults = STRATEGIES[args.strategy][1]
+    grid = {}
+    unsupported = []
+    for key in dict.fromkeys(key for _, keys in STRATEGIES.values() for key in keys):
+        values = getattr(args, key, None)
+        if not values:
+            continue
+        if key in defaults:
+            grid[key] = values
+        else:
+            unsupported.append('--' + key.replace('_', '-'))
+    if unsupported:
+        raise ValueError(f"策略 {args.strategy} 不支持参数: {', '.join(unsupported)}")
+    return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='策略参数网格搜索')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（默认沪深300成分股）')
+    parser.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=365)).strftime('%Y%m%d'), help='开始日期（格式：YYYYMMDD）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认CPU核数）')
+    parser.add_argument('--sort-by', default='mean_return', help='排序指标')
+    parser.add_argument('--top', type=int, default=20, help='输出前N个组合')
+    parser.add_argument('--output', default='param_sweep_results.csv', help='结果CSV文件')
+    add_grid_arguments(parser)
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    symbols = args.symbols or DataResilient.get_hs300_symbols(use_cache=True)
+    if not symbols:
+        raise ValueError("无法获取沪深300成分股数据")
+
+    start_time = time.time()
+    panel = PricePanel.load(symbols, args.begin, args.end)
+    print(f"数据加载完成: {time.time() - start_time:.1f}秒")
+
+    results = ParamSweep.run(panel, parse_grid(args), strategy=args.strategy,
+                             workers=args.workers, sort_by=args.sort_by)
+    print(f"总用时: {time.time() - start_time:.1f}秒")
+
+    print(f"\n=== 参数组合排名 (按{args.sort_by}降序, 前{args.top}) ===")
+    print(results.head(args.top).to_string(index=False))
+    results.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"结果已保存到 {args.output}")
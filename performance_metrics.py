@@ -0,0 +1,129 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from panel import PricePanel
+from panel_indicators import IndicatorCache
+from panel_strategies import PanelStrategies
+from data_resilient import DataResilient
+from cache_manager import CacheManager
+
+METRIC_COLUMNS = [
+    'total_return', 'cagr', 'volatility', 'sharpe', 'sortino', 'calmar',
+    'max_drawdown', 'max_drawdown_duration', 'win_rate', 'turnover', 'exposure', 'periods',
+]
+
+
+"""批量绩效统计：对 股票 × 日期 收益矩阵一次性向量化计算全部指标"""
+class PerformanceMetrics:
+    @staticmethod
+    def compute(returns, positions=None, symbols=None, periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        returns: 股票 × 日期 的逐期策略收益（DataFrame或二维数组，NaN表示无数据）
+        positions: 同形状的持仓矩阵，用于换手率与持仓占比；缺省时按收益非零推断持仓占比
+        """
+        if isinstance(returns, pd.DataFrame):
+            symbols = returns.index if symbols is None else symbols
+            returns = returns.to_numpy(dtype=np.float64)
+        returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+        if symbols is None:
+            symbols = np.arange(returns.shape[0])
+
+        valid = ~np.isnan(returns)
+        periods = valid.sum(axis=1)
+        filled = np.where(valid, returns, 0.0)
+
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            # 收益与波动
+            log_growth = np.log1p(filled).sum(axis=1)
+            total_return = np.expm1(log_growth)
+            cagr = np.expm1(log_growth * periods_per_year / periods)
+            mean = filled.sum(axis=1) / periods
+            demeaned = np.where(valid, returns - mean[:, None], 0.0)
+            std = np.sqrt((demeaned ** 2).sum(axis=1) / (periods - 1))
+            volatility = std * np.sqrt(periods_per_year)
+            sharpe = mean / std * np.sqrt(periods_per_year)
+            downside = np.sqrt((np.minimum(filled, 0.0) ** 2).sum(axis=1) / periods)
+            sortino = mean / downside * np.sqrt(periods_per_year)
+
+            # 回撤：相对历史高点的比例回撤，及最长水下持续期数
+            equity = np.cumprod(1 + filled, axis=1)
+            peak = np.maximum.accumulate(equity, axis=1)
+            max_drawdown = (1 - equity / peak).max(axis=1, initial=0)
+            steps = np.arange(returns.shape[1])
+            last_peak = np.maximum.accumulate(np.where(equity >= peak, steps, -1), axis=1)
+            max_drawdown_duration = (steps - last_peak).max(axis=1, initial=0)
+            calmar = cagr / max_drawdown
+
+            # 交易统计
+            active = valid & (filled != 0)
+            win_rate = (filled > 0).sum(axis=1) / active.sum(axis=1)
+            if positions is None:
+                exposure = active.sum(axis=1) / periods
+                turnover = np.full(returns.shape[0], np.nan)
+            else:
+                positions = positions.to_numpy(dtype=np.float64) if isinstance(positions, pd.DataFrame) else np.asarray(positions, dtype=np.float64)
+                held = np.nan_to_num(positions)
+                # 与 periods 同口径：收益为 NaN 的期不计入持仓期数
+                exposure = ((held != 0) & valid).sum(axis=1) / periods
+                changes = np.abs(np.diff(held, axis=1, prepend=0.0)).sum(axis=1)
+                turnover = changes / periods * periods_per_year
+
+        table = pd.DataFrame({
+            'total_return': total_return,
+            'cagr': cagr,
+            'volatility': volatility,
+            'sharpe': sharpe,
+            'sortino': sortino,
+            'calmar': calmar,
+            'max_drawdown': max_drawdown,
+            'max_drawdown_duration': max_drawdown_duration,
+            'win_rate': win_rate,
+            'turnover': turnover,
+            'exposure': exposure,
+            'periods': periods,
+        }, index=pd.Index(symbols, name='symbol'))
+        return table.replace([np.inf, -np.inf], np.nan)
+
+    @staticmethod
+    def from_panel(strategy_returns: np.ndarray, symbols, positions: np.ndarray = None,
+                   periods_per_year: int = 252) -> pd.DataFrame:
+        """面板口径（日期 × 股票）输入的便捷入口"""
+        return PerformanceMetrics.compute(strategy_returns.T, None if positions is None else positions.T,
+                                          symbols=symbols, periods_per_year=periods_per_year)
+
+    @staticmethod
+    def export(table: pd.DataFrame, filename: str, sort_by: str = 'sharpe', ascending: bool = False):
+        """按指定指标排序后导出CSV"""
+        table.sort_values(sort_by, ascending=ascending).to_csv(filename, encoding='utf-8-sig')
+        print(f"结果已保存到 {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='stockPre 策略批量绩效统计')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（默认沪深300成分股）')
+    parser.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=365)).strftime('%Y%m%d'), help='开始日期（格式：YYYYMMDD）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--sort-by', default='sharpe', choices=METRIC_COLUMNS, help='排序指标')
+    parser.add_argument('--top', type=int, default=20, help='输出前N只股票')
+    parser.add_argument('--output', default='performance_metrics.csv', help='结果CSV文件')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    symbols = args.symbols or DataResilient.get_hs300_symbols(use_cache=True)
+    if not symbols:
+        raise ValueError("无法获取沪深300成分股数据")
+
+    panel = PricePanel.load(symbols, args.begin, args.end)
+    start_time = time.time()
+    cache = IndicatorCache(panel.fields)
+    signal = PanelStrategies.pre_signals(cache, {})
+    strategy_returns = PanelStrategies.backtest(signal, cache.get('returns'))
+    positions = np.vstack([np.zeros((1, signal.shape[1])), signal[:-1]])
+    table = PerformanceMetrics.from_panel(strategy_returns, panel.symbols, positions)
+    print(f"{len(table)}只股票绩效统计用时: {(time.time() - start_time) * 1000:.1f}毫秒")
+
+    print(f"\n=== 策略绩效 (按{args.sort_by}降序, 前{args.top}) ===")
+    print(table.sort_values(args.sort_by, ascending=False).head(args.top).to_string(float_format=lambda x: f"{x:.4f}"))
+    PerformanceMetrics.export(table, args.output, sort_by=args.sort_by)
@@ -0,0 +1,218 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient, _akshare
+from reference_data import exchange_suffix
+from telemetry import Telemetry
+
+# 需要复权的价格列（成交量不复权，与东方财富复权行情一致）
+PRICE_COLUMNS = ['open', 'close', 'high', 'low']
+
+ADJUST_MODES = ('qfq', 'hfq', 'none')
+
+# 交易日收盘时间：此前取到的当日K线可能尚未定型，不写入原始行情库
+MARKET_CLOSE = '15:30'
+
+
+"""除权除息日历：按日期缓存当天有分红送转的股票代码（历史日期不会变化，永久缓存）"""
+class ExRightCalendar:
+    _cache = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def symbols_on(cls, date: str) -> Optional[frozenset]:
+        """date 当天除权除息的股票代码；获取失败返回 None（调用方应按有除权处理）"""
+        with cls._lock:
+            if date in cls._cache:
+                return cls._cache[date]
+        # 联网请求不持有锁，慢请求不阻塞其他取数线程（同一日期偶尔重复请求无妨）
+        cache_key = f'exright_{date}'
+        codes = CacheManager.load_macro_cache(cache_key, ignore_expiry=True)
+        if codes is None and not DataResilient.OFFLINE:
+            try:
+                df = _akshare().news_trade_notify_dividend_baidu(date=date)
+                codes = [] if df is None or df.empty else df['股票代码'].astype(str).str.zfill(6).tolist()
+                # 当天及以后的日历可能还会补充，只缓存已过去的日期
+                if date < datetime.now().strftime('%Y%m%d'):
+                    CacheManager.save_macro_cache(cache_key, codes)
+            except Exception as e:
+                print(f"获取 {date} 除权除息日历失败: {str(e)}")
+                codes = None
+        if codes is None:
+            return None
+        with cls._lock:
+            return cls._cache.setdefault(date, frozenset(codes))
+
+    @classmethod
+    def has_event(cls, symbol: str, dates) -> bool:
+        for date in dates:
+            codes = cls.symbols_on(date.strftime('%Y%m%d'))
+            if codes is None or symbol in codes:
+                return True
+        return False
+
+
+"""原始行情 + 复权因子存储：不复权K线按股票增量追加，复权价格在读取时由后复权因子向量化换算"""
+class PriceStore:
+    RAW_DIR = CacheManager.CACHE_DIR / "raw"
+    FACTOR_DIR = CacheManager.CACHE_DIR / "factors"
+
+    @classmethod
+    def load(cls, symbol: str, start_date: str, end_date: str, adjust: str = 'qfq', max_retries: int = 3,
+             local_only: bool = False) -> pd.DataFrame:
+        """
+        返回 [start_date, end_date] 区间的日线（列与 DataResilient.fetch_stock_data 一致）。
+        adjust: qfq 前复权（以最新因子为基准）/ hfq 后复权 / none 不复权
+        local_only: 只读本地已存的行情与因子，不联网（同离线模式，但只作用于本次调用）
+        """
+        if adjust not in ADJUST_MODES:
+            raise ValueError(f"不支持的复权方式: {adjust}")
+        raw, new_dates = cls.update_raw(symbol, start_date, end_date, max_retries, local_only)
+        if raw.empty:
+            return raw
+        window = raw.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+        if adjust == 'none' or window.empty:
+            return window
+        factors = cls.update_factors(symbol, new_dates, local_only)
+        if factors is None:
+            print(f"{symbol} 无复权因子，使用不复权价格")
+            return window
+        return cls.apply(window, factors, adjust)
+
+    # ========== 复权换算 ==========
+    @staticmethod
+    def apply(raw: pd.DataFrame, factors: pd.Series, adjust: str) -> pd.DataFrame:
+        """
+        factors: 后复权因子变动点（日期升序），某日因子为不晚于该日的最近一个变动点的值。
+        后复权价 = 原始价 × 因子；前复权价 = 原始价 × 因子 / 最新因子
+        """
+        values = factors.to_numpy(dtype=np.float64)
+        position = np.searchsorted(factors.index.values, raw.index.values, side='right') - 1
+        multiplier = values[np.clip(position, 0, None)]
+        if adjust == 'qfq':
+            multiplier = multiplier / values[-1]
+        columns = [column for column in PRICE_COLUMNS if column in raw.columns]
+        adjusted = raw.copy()
+        adjusted[columns] = raw[columns].to_numpy(dtype=np.float64) * multiplier[:, None]
+        return adjusted
+
+    # ========== 原始行情 ==========
+    @classmethod
+    def raw_path(cls, symbol: str):
+        return cls.RAW_DIR / f"{symbol}.pkl"
+
+    @classmethod
+    def update_raw(cls, symbol: str, start_date: str, end_date: str, max_retries: int = 3, local_only: bool = False):
+        """
+        读取本地原始行情，只下载缺失的头部/尾部区间并追加保存。
+        返回 (全部原始行情, 原有最后一根K线之后新增的日期)；离线模式下只读本地。
+        向前补齐的历史日期不返回：已存的后复权因子覆盖过去，无需逐日查询除权日历
+        """
+        path = cls.raw_path(symbol)
+        stored = CacheManager.load_file(path, 'raw', "加载原始行情失败") if path.exists() else None
+        bars = stored['bars'] if stored else None
+        # 已向数据源确认过的区间（上市晚于start_date或长期停牌时，避免每次重复查询空区间）
+        checked_from = stored['checked_from'] if stored else '99999999'
+        checked_until = stored['checked_until'] if stored else ''
+        if DataResilient.OFFLINE or local_only:
+            if bars is None:
+                raise ValueError(f"本地无原始行情: {symbol}")
+            return bars, pd.DatetimeIndex([])
+
+        settled_end = min(end_date, cls._settled_date())
+        ranges = []
+        if bars is None or bars.empty:
+            ranges.append((start_date, end_date))
+        else:
+            if start_date < checked_from:
+                ranges.append((start_date, (bars.index[0] - timedelta(days=1)).strftime('%Y%m%d')))
+            if checked_until < settled_end:
+                ranges.append(((bars.index[-1] + timedelta(days=1)).strftime('%Y%m%d'), end_date))
+        if not ranges:
+            return bars, pd.DatetimeIndex([])
+
+        frames = [bars] if bars is not None else []
+        complete = True
+        for begin, end in ranges:
+            try:
+                df = DataResilient.fetch_raw_bars(symbol, begin, end, max_retries)
+            except Exception:
+                # 已有本地行情时，增量下载失败只影响新数据，继续使用本地部分（下次重新下载）
+                if bars is None:
+                    raise
+                complete = False
+                continue
+            if df is not None and not df.empty:
+                frames.append(df)
+        merged = pd.concat(frames) if len(frames) > 1 else frames[0] if frames else pd.DataFrame()
+        if merged.empty:
+            return merged, pd.DatetimeIndex([])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+
+        # 未收盘的当日K线只返回、不入库
+        settled = merged[merged.index <= pd.Timestamp(settled_end)]
+        added = settled.index.difference(bars.index) if bars is not None else settled.index
+        new_dates = added[added > bars.index[-1]] if bars is not None and not bars.empty else added
+        if complete:
+            checked_from, checked_until = min(checked_from, start_date), max(checked_until, settled_end)
+        if not added.empty or complete:
+            cls.RAW_DIR.mkdir(parents=True, exist_ok=True)
+            CacheManager.save_file(path, {'bars': settled, 'checked_from': checked_from, 'checked_until': checked_until},
+                                   'raw', "保存原始行情失败")
+        return merged, new_dates
+
+    @staticmethod
+    def _settled_date() -> str:
+        """K线已定型的最后日期：收盘后为今天，否则为昨天"""
+        now = datetime.now()
+        if now.strftime('%H:%M') >= MARKET_CLOSE:
+            return now.strftime('%Y%m%d')
+        return (now - timedelta(days=1)).strftime('%Y%m%d')
+
+    @classmethod
+    def is_current(cls, symbol: str) -> bool:
+        """本地原始行情已包含最近一个定型交易日（文件在该日收盘后写入），读取时无需联网；只看文件时间，不反序列化"""
+        path = cls.raw_path(symbol)
+        if not path.exists():
+            return False
+        settled = datetime.strptime(f"{cls._settled_date()} {MARKET_CLOSE}", '%Y%m%d %H:%M')
+        return datetime.fromtimestamp(path.stat().st_mtime) >= settled
+
+    # ========== 复权因子 ==========
+    @classmethod
+    def factor_path(cls, symbol: str):
+        return cls.FACTOR_DIR / f"{symbol}.pkl"
+
+    @classmethod
+    def update_factors(cls, symbol: str, new_dates, local_only: bool = False) -> Optional[pd.Series]:
+        """
+        读取本地复权因子；首次使用或新增K线中出现除权除息日时才重新下载因子序列。
+        原始行情与历史因子都不受新除权事件影响，增量缓存始终有效
+        """
+        path = cls.factor_path(symbol)
+        factors = CacheManager.load_file(path, 'factor', "加载复权因子失败") if path.exists() else None
+        if DataResilient.OFFLINE or local_only:
+            return factors
+
+        if factors is not None and (len(new_dates) == 0 or not ExRightCalendar.has_event(symbol, new_dates)):
+            return factors
+
+        try:
+            with Telemetry.timer('fetch_factor', symbol):
+                df = _akshare().stock_zh_a_daily(symbol=f"{exchange_suffix(symbol).lower()}{symbol}", adjust='hfq-factor')
+            fetched = pd.Series(df['hfq_factor'].astype(float).to_numpy(),
+                                index=pd.DatetimeIndex(pd.to_datetime(df['date']), name='date')).sort_index()
+            fetched = fetched[~fetched.index.duplicated(keep='last')]
+        except Exception as e:
+            print(f"获取 {symbol} 复权因子失败: {str(e)}")
+            Telemetry.count('fetch_failures', kind='factor')
+            return factors
+
+        if factors is None or not fetched.equals(factors):
+            Telemetry.count('factor_updates')
+            cls.FACTOR_DIR.mkdir(parents=True, exist_ok=True)
+            CacheManager.save_file(path, fetched, 'factor', "保存复权因子失败")
+        return fetched
@@ -0,0 +1,199 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient
+from panel import PricePanel
+from panel_indicators import IndicatorCache
+from panel_strategies import PanelStrategies
+from rolling_index import RollingIndex
+from universe import Universe, add_universe_argument
+
+# 可用因子：名称 → (说明, 由指标缓存计算 日期 × 股票 因子面板)；数值越大越好
+FACTORS = {
+    'momentum': ('20日动量', lambda cache: _momentum(cache.fields['close'], 20)),
+    'momentum60': ('60日动量', lambda cache: _momentum(cache.fields['close'], 60)),
+    'low_vol': ('20日低波动', lambda cache: -RollingIndex(cache.get('returns')).std(20, ddof=1)),
+    'buy_score': ('多维买入评分', lambda cache: PanelStrategies.grain_scores(cache, {})[0]),
+    'pre_count': ('stockPre满足条件数', lambda cache: sum(c.astype(np.float64) for c in PanelStrategies.pre_conditions(cache, {})[0])),
+    'volume': ('3日放量', lambda cache: cache.get('volume_pct_change', 3)),
+}
+
+
+def _momentum(close, length):
+    shifted = np.full_like(close, np.nan)
+    shifted[length:] = close[:-length]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return close / shifted - 1
+
+
+def parse_weights(specs) -> dict:
+    """['momentum:0.5', 'low_vol'] → {'momentum': 0.5, 'low_vol': 1.0}"""
+    weights = {}
+    for spec in specs:
+        name, _, weight = spec.partition(':')
+        if name not in FACTORS:
+            raise ValueError(f"未知因子: {name}（可用 {', '.join(FACTORS)}）")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+"""截面排序引擎：日期 × 股票 因子面板按日标准化（z-score/百分位，可行业中性）、多因子合成、argpartition 选前K名并生成持仓"""
+class RankingEngine:
+    # ========== 截面标准化 ==========
+    @staticmethod
+    def zscore(values: np.ndarray, groups: np.ndarray = None) -> np.ndarray:
+        """每个日期（行）在股票间标准化；groups 为每只股票的行业编号时在行业内标准化（行业中性）"""
+        values = np.asarray(values, dtype=np.float64)
+        if groups is not None:
+            out = np.full_like(values, np.nan)
+            for group in np.unique(groups):
+                columns = groups == group
+                out[:, columns] = RankingEngine.zscore(values[:, columns])
+            return out
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=1, keepdims=True)
+        filled = np.where(valid, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = filled.sum(axis=1, keepdims=True) / count
+            deviation = np.where(valid, values - mean, 0.0)
+            std = np.sqrt((deviation * deviation).sum(axis=1, keepdims=True) / count)
+        # 当日只有一只股票或全部相同：标准化值记为0
+        return np.where(valid, deviation / np.where(std > 0, std, np.inf), np.nan)
+
+    @staticmethod
+    def percentile(values: np.ndarray, groups: np.ndarray = None) -> np.ndarray:
+        """每个日期的截面百分位 (0, 1]，最大值为1；并列值取平均名次；NaN 保持 NaN"""
+        values = np.asarray(values, dtype=np.float64)
+        if groups is not None:
+            out = np.full_like(values, np.nan)
+            for group in np.unique(groups):
+                columns = groups == group
+                out[:, columns] = RankingEngine.percentile(values[:, columns])
+            return out
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=1, keepdims=True)
+        # argsort 一次得到升序排列（NaN 排在最后）；并列值取相同值区间 [first, last] 的平均名次，全程按行向量化
+        filled = np.where(valid, values, np.inf)
+        order = np.argsort(filled, axis=1, kind='stable')
+        sorted_values = np.take_along_axis(filled, order, axis=1)
+        position = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+        changed = sorted_values[:, 1:] != sorted_values[:, :-1]
+        edge = np.ones((len(values), 1), dtype=bool)
+        first = np.maximum.accumulate(np.where(np.hstack([edge, changed]), position, 0), axis=1)
+        last = np.minimum.accumulate(np.where(np.hstack([changed, edge]), position, values.shape[1])[:, ::-1], axis=1)[:, ::-1]
+        average = (first + last) / 2.0 + 1
+        ranks = np.empty_like(average)
+        np.put_along_axis(ranks, order, average, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(valid, ranks / count, np.nan)
+
+    # ========== 多因子合成 ==========
+    @staticmethod
+    def composite(factors: dict, weights: dict, method: str = 'zscore', groups: np.ndarray = None) -> np.ndarray:
+        """
+        factors: 因子名 → 日期 × 股票 面板；weights: 因子名 → 权重。
+        各因子先按 method 截面标准化，再加权求和；某只股票缺失部分因子时按其余因子的权重重新归一
+        """
+        normalize = RankingEngine.zscore if method == 'zscore' else RankingEngine.percentile
+        total = None
+        weight_sum = None
+        for name, weight in weights.items():
+            normalized = normalize(factors[name], groups)
+            available = ~np.isnan(normalized)
+            contribution = np.where(available, normalized * weight, 0.0)
+            total = contribution if total is None else total + contribution
+            weight_sum = available * abs(weight) if weight_sum is None else weight_sum + available * abs(weight)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(weight_sum > 0, total / weight_sum, np.nan)
+
+    # ========== 选股与持仓 ==========
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """每个日期得分最高的k只股票（布尔面板）；argpartition 只做部分排序，当日有效股票不足k只时全部入选"""
+        scores = np.asarray(scores, dtype=np.float64)
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return np.zeros(scores.shape, dtype=bool)
+        filled = np.where(np.isnan(scores), -np.inf, scores)
+        chosen = np.argpartition(-filled, k - 1, axis=1)[:, :k]
+        mask = np.zeros(scores.shape, dtype=bool)
+        np.put_along_axis(mask, chosen, True, axis=1)
+        return mask & ~np.isnan(scores)
+
+    @staticmethod
+    def ranked(scores: np.ndarray, k: int, row: int = -1) -> np.ndarray:
+        """某一日前k名的列号（按得分降序）"""
+        values = np.where(np.isnan(scores[row]), -np.inf, scores[row])
+        k = min(k, len(values))
+        chosen = np.argpartition(-values, k - 1)[:k]
+        chosen = chosen[np.argsort(-values[chosen], kind='stable')]
+        return chosen[np.isfinite(values[chosen])]
+
+    @staticmethod
+    def positions(scores: np.ndarray, k: int, rebalance: int = 1) -> np.ndarray:
+        """等权持有前k名，每 rebalance 个交易日调仓一次（期间沿用上次调仓日的持仓）"""
+        mask = RankingEngine.top_k(scores, k)
+        weights = mask / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        if rebalance > 1:
+            weights = weights[(np.arange(len(weights)) // rebalance) * rebalance]
+        return weights
+
+    @staticmethod
+    def backtest(weights: np.ndarray, returns: np.ndarray) -> np.ndarray:
+        """次日执行（同 PanelStrategies.backtest）：返回组合逐日收益，停牌股票当日收益按0计"""
+        held = np.zeros_like(weights)
+        held[1:] = weights[:-1]
+        return np.nansum(held * np.nan_to_num(returns), axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='多因子截面排序与前K名组合回测')
+    add_universe_argument(parser)
+    parser.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=365 * 2)).strftime('%Y%m%d'), help='开始日期（YYYYMMDD）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--factors', nargs='+', default=['momentum:1', 'low_vol:0.5', 'buy_score:0.5'],
+                        help=f"因子:权重（可用 {', '.join(FACTORS)}）")
+    parser.add_argument('--method', choices=['zscore', 'percentile'], default='zscore', help='截面标准化方式')
+    parser.add_argument('--neutral', action='store_true', help='行业中性：在行业内标准化')
+    parser.add_argument('--top', type=int, default=20, help='持有/输出前K名')
+    parser.add_argument('--rebalance', type=int, default=5, help='调仓间隔（交易日）')
+    parser.add_argument('--offline', action='store_true', help='离线模式：只使用本地缓存，不联网')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    DataResilient.set_offline(args.offline)
+    weights = parse_weights(args.factors)
+    symbols = Universe.resolve(args.universe)
+    panel = PricePanel.load(symbols, args.begin, args.end)
+    print(f"面板: {panel.shape[0]} 个交易日 × {panel.shape[1]} 只股票")
+    if not panel.symbols:
+        print("没有可用行情，无法排序")
+        raise SystemExit(0)
+
+    groups = None
+    if args.neutral:
+        industries = Universe.industry_map()
+        labels = [industries.get(symbol.split('.')[0], '未分类') for symbol in panel.symbols]
+        groups = pd.factorize(pd.Index(labels))[0]
+        print(f"行业中性: {groups.max() + 1} 个行业")
+
+    start_time = time.time()
+    cache = IndicatorCache(panel.fields)
+    factors = {name: FACTORS[name][1](cache) for name in weights}
+    scores = RankingEngine.composite(factors, weights, args.method, groups)
+    holdings = RankingEngine.positions(scores, args.top, args.rebalance)
+    portfolio = RankingEngine.backtest(holdings, cache.get('returns'))
+    print(f"因子计算、排序与回测用时: {(time.time() - start_time) * 1000:.1f}毫秒")
+
+    report = PanelStrategies.report(portfolio[:, None])
+    print(f"\n前{args.top}名组合（每{args.rebalance}日调仓）: 净值 {report['final_return'][0]:.4f}  "
+          f"最大回撤 {report['max_drawdown'][0]:.2%}  夏普 {report['sharpe_ratio'][0]:.2f}")
+
+    names = {name: FACTORS[name][0] for name in weights}
+    print(f"\n=== {panel.dates[-1].strftime('%Y-%m-%d')} 综合得分前{args.top}名（{' + '.join(f'{names[n]}×{w:g}' for n, w in weights.items())}）===")
+    for rank, column in enumerate(RankingEngine.ranked(scores, args.top), 1):
+        detail = '  '.join(f"{names[n]} {factors[n][-1, column]:.3f}" for n in weights)
+        print(f"{rank:>3}. {panel.symbols[column]:<10} 得分 {scores[-1, column]:>6.2f}  {detail}")
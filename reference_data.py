@@ -0,0 +1,229 @@
+import os
+import pickle
+import threading
+from datetime import datetime, timedelta
+from types import MappingProxyType
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient, _akshare
+
+# 快照结构变化时递增，旧结构的快照文件不再读取
+SCHEMA_VERSION = 1
+
+# 各部分的刷新周期（小时）：名称/上市日期每日，退市名单每周，指数成分股每日
+REFRESH_HOURS = {
+    'listing': 24,
+    'delist': 24 * 7,
+    'constituents': 24,
+}
+
+
+def exchange_suffix(code: str) -> str:
+    """按代码段推断交易所后缀：6/9开头上交所，4/8/92开头北交所，其余深交所"""
+    if code.startswith(('4', '8', '92')):
+        return 'BJ'
+    if code.startswith(('6', '9')):
+        return 'SH'
+    return 'SZ'
+
+
+def _date_str(value):
+    value = pd.to_datetime(value, errors='coerce')
+    return None if pd.isnull(value) else value.strftime('%Y-%m-%d')
+
+
+"""参考数据只读视图：代码→名称、代码→交易所后缀、指数成分股、上市/退市日期"""
+class ReferenceSnapshot:
+    def __init__(self, data: dict):
+        self.version = data['version']
+        self.updated = data['updated']
+        self.names = MappingProxyType(dict(data['names']))
+        self.suffixes = MappingProxyType(dict(data['suffixes']))
+        self.list_dates = MappingProxyType(dict(data['list_dates']))
+        self.delist_dates = MappingProxyType(dict(data['delist_dates']))
+        self.constituents = MappingProxyType({index: tuple(codes) for index, codes in data['constituents'].items()})
+
+    def name(self, symbol: str) -> str:
+        """支持带后缀的代码（600489.SH）"""
+        return self.names.get(symbol.split('.')[0], "")
+
+    def symbol(self, code: str) -> str:
+        """纯数字代码 → 带交易所后缀的代码"""
+        code = code.split('.')[0]
+        return f"{code}.{self.suffixes.get(code) or exchange_suffix(code)}"
+
+    def index_symbols(self, index: str = '000300') -> list:
+        """指数成分股（带后缀），与 get_hs300_symbols 返回格式一致"""
+        return [self.symbol(code) for code in self.constituents.get(index, ())]
+
+    def is_listed(self, code: str, date=None) -> bool:
+        """指定日期（默认今天）是否处于上市状态"""
+        code = code.split('.')[0]
+        date = _date_str(date or datetime.now())
+        list_date, delist_date = self.list_dates.get(code), self.delist_dates.get(code)
+        if list_date and date < list_date:
+            return False
+        return not (delist_date and date >= delist_date)
+
+
+"""参考数据注册表：每个进程只从磁盘快照加载一次，按部分增量刷新，对外提供不可变的查询视图"""
+class ReferenceData:
+    SNAPSHOT_DIR = CacheManager.CACHE_DIR / "reference"
+    _current = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def snapshot_path(cls):
+        return cls.SNAPSHOT_DIR / f"reference_v{SCHEMA_VERSION}.pkl"
+
+    @classmethod
+    def get(cls, indices=(), refresh: bool = True) -> ReferenceSnapshot:
+        """
+        返回当前进程共享的快照；首次调用时从磁盘加载，并只刷新已过期的部分（离线模式下不刷新）。
+        indices: 需要的指数成分股（如 '000300'、'000905'）
+        """
+        with cls._lock:
+            current = cls._current
+            missing = [index for index in indices if current is None or index not in current.constituents]
+            if current is not None and not missing:
+                return current
+
+            data = cls.load()
+            if refresh and not DataResilient.OFFLINE:
+                data, changed = cls.refresh(data, indices)
+                if changed:
+                    cls.save(data)
+            cls._current = ReferenceSnapshot(data)
+            return cls._current
+
+    @classmethod
+    def load(cls) -> dict:
+        """读取磁盘快照；不存在时以已缓存的股票名称表为种子"""
+        path = cls.snapshot_path()
+        if path.exists():
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get('schema') == SCHEMA_VERSION:
+                    return data
+            except Exception as e:
+                print(f"加载参考数据快照失败 {path}: {str(e)}")
+
+        data = {
+            'schema': SCHEMA_VERSION, 'version': 0, 'updated': None, 'refreshed': {},
+            'names': {}, 'suffixes': {}, 'list_dates': {}, 'delist_dates': {}, 'constituents': {},
+        }
+        stock_info = CacheManager.load_macro_cache('stock_info', ignore_expiry=True)
+        if stock_info is not None and not stock_info.empty:
+            data['names'] = dict(zip(stock_info['code'], stock_info['name']))
+        return data
+
+    @classmethod
+    def save(cls, data: dict):
+        """先写临时文件再原子替换，其他进程不会读到写了一半的快照"""
+        cls.SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        path = cls.snapshot_path()
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"保存参考数据快照失败 {path}: {str(e)}")
+
+    @classmethod
+    def _is_stale(cls, data: dict, part: str, kind: str) -> bool:
+        refreshed = data['refreshed'].get(part)
+        return refreshed is None or datetime.now() - refreshed >= timedelta(hours=REFRESH_HOURS[kind])
+
+    @classmethod
+    def refresh(cls, data: dict, indices=(), force: bool = False):
+        """只重新下载过期的部分并合并进快照：已退市股票的名称保留，单个数据源失败时沿用旧数据"""
+        changed = False
+        if force or cls._is_stale(data, 'listing', 'listing'):
+            listing = cls._fetch_listing()
+            if listing:
+                for code, (name, suffix, list_date) in listing.items():
+                    data['names'][code] = name
+                    data['suffixes'][code] = suffix
+                    if list_date:
+                        data['list_dates'][code] = list_date
+                data['refreshed']['listing'] = datetime.now()
+                changed = True
+
+        if force or cls._is_stale(data, 'delist', 'delist'):
+            delisted = cls._fetch_delist()
+            if delisted:
+                for code, (name, delist_date) in delisted.items():
+                    data['names'].setdefault(code, name)
+                    data['delist_dates'][code] = delist_date
+                data['refreshed']['delist'] = datetime.now()
+                changed = True
+
+        for index in indices:
+            part = f'constituents:{index}'
+            if force or index not in data['constituents'] or cls._is_stale(data, part, 'constituents'):
+                codes = cls._fetch_constituents(index)
+                if codes:
+                    data['constituents'][index] = codes
+                    data['refreshed'][part] = datetime.now()
+                    changed = True
+
+        if changed:
+            data['version'] += 1
+            data['updated'] = datetime.now().isoformat(timespec='seconds')
+        return data, changed
+
+    @staticmethod
+    def _fetch_listing() -> dict:
+        """沪深京上市股票：代码 → (名称, 交易所后缀, 上市日期)"""
+        ak = _akshare()
+        sources = [
+            ('SH', lambda: ak.stock_info_sh_name_code(symbol="主板A股"), '证券代码', '证券简称', '上市日期'),
+            ('SH', lambda: ak.stock_info_sh_name_code(symbol="科创板"), '证券代码', '证券简称', '上市日期'),
+            ('SZ', lambda: ak.stock_info_sz_name_code(symbol="A股列表"), 'A股代码', 'A股简称', 'A股上市日期'),
+            ('BJ', lambda: ak.stock_info_bj_name_code(), '证券代码', '证券简称', '上市日期'),
+        ]
+        listing = {}
+        for suffix, fetch, code_col, name_col, date_col in sources:
+            try:
+                df = fetch()
+                codes = df[code_col].astype(str).str.zfill(6)
+                for code, name, list_date in zip(codes, df[name_col], df[date_col]):
+                    listing[code] = (str(name), suffix, _date_str(list_date))
+            except Exception as e:
+                print(f"获取{suffix}股票列表失败: {str(e)}")
+        return listing
+
+    @staticmethod
+    def _fetch_delist() -> dict:
+        """沪深退市股票：代码 → (名称, 退市日期)"""
+        ak = _akshare()
+        sources = [
+            (lambda: ak.stock_info_sh_delist(symbol="全部"), '公司代码', '公司简称', '暂停上市日期'),
+            (lambda: ak.stock_info_sz_delist(symbol="终止上市公司"), '证券代码', '证券简称', '终止上市日期'),
+        ]
+        delisted = {}
+        for fetch, code_col, name_col, date_col in sources:
+            try:
+                df = fetch()
+                if df is None or df.empty:
+                    continue
+                codes = df[code_col].astype(str).str.zfill(6)
+                for code, name, delist_date in zip(codes, df[name_col], df[date_col]):
+                    delist_date = _date_str(delist_date)
+                    if delist_date:
+                        delisted[code] = (str(name), delist_date)
+            except Exception as e:
+                print(f"获取退市股票列表失败: {str(e)}")
+        return delisted
+
+    @staticmethod
+    def _fetch_constituents(index: str) -> list:
+        try:
+            df = _akshare().index_stock_cons(symbol=index)
+            codes = df['品种代码'].astype(str).str.replace(r'\D', '', regex=True).str.zfill(6)
+            return codes.drop_duplicates().tolist()
+        except Exception as e:
+            print(f"获取指数{index}成分股失败: {str(e)}")
+            return []
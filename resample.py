@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from panel_indicators import PanelIndicators
+
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+
+# 更高周期上的确认条件：名称 → (说明, 由重采样K线的指标计算布尔数组)
+CONDITIONS = {
+    'ma': ('MA5>MA20', lambda close: PanelIndicators.sma(close, 5) > PanelIndicators.sma(close, 20)),
+    'macd': ('MACD金叉', lambda close: np.subtract(*PanelIndicators.macd(close)[:2]) > 0),
+}
+
+RULE_NAMES = {'W': '周线', 'M': '月线'}
+
+
+def parse_rule(rule: str):
+    """'W' 周线 / 'M' 月线 / 'ND'（如 '3D'）N个交易日 → (规则, N)"""
+    rule = rule.upper()
+    if rule in ('W', 'M'):
+        return rule, None
+    if rule.endswith('D') and rule[:-1].isdigit() and int(rule[:-1]) > 1:
+        return 'D', int(rule[:-1])
+    raise ValueError(f"不支持的重采样周期: {rule}（可用 W / M / ND）")
+
+
+def parse_confirm(specs) -> list:
+    """['W:ma', 'M:macd'] → [('W', 'ma'), ('M', 'macd')]"""
+    parsed = []
+    for spec in specs or []:
+        rule, _, condition = spec.partition(':')
+        parse_rule(rule)
+        if condition not in CONDITIONS:
+            raise ValueError(f"不支持的确认条件: {spec}（可用 {', '.join(CONDITIONS)}）")
+        parsed.append((rule.upper(), condition))
+    return parsed
+
+
+def group_keys(dates: pd.DatetimeIndex, rule: str) -> np.ndarray:
+    """按日历分组的整数键：周线为所在周的周一，月线为 年×12+月，N日线为序号//N（从第一根K线起算）"""
+    kind, n = parse_rule(rule)
+    if kind == 'W':
+        days = dates.values.astype('datetime64[D]').astype(np.int64)
+        return days - (days + 3) % 7    # 1970-01-01 为周四
+    if kind == 'M':
+        return dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+    return np.arange(len(dates)) // n
+
+
+"""日线 → 周线/月线/N日线：按日历向量化分组，结果按股票缓存，供多周期信号确认使用（不额外联网）"""
+class Resampler:
+    MAX_ENTRIES = 512
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def resample(cls, df: pd.DataFrame, rule: str, symbol: str = None) -> pd.DataFrame:
+        """
+        返回重采样K线，索引为每组最后一个交易日；'complete' 列标记该K线是否已走完
+        （之后已有下一组的交易日，或最后一组已到周五/月末最后一个工作日/满N根）。
+        传入 symbol 时按 (股票, 周期, 日线区间) 缓存
+        """
+        key = (symbol, rule, df.index[0], df.index[-1], len(df)) if symbol and len(df) else None
+        if key is not None:
+            with cls._lock:
+                if key in cls._cache:
+                    cls._cache.move_to_end(key)
+                    return cls._cache[key]
+
+        if df.empty:
+            bars = pd.DataFrame({column: np.empty(0) for column in OHLCV}, index=df.index)
+            bars['complete'] = np.empty(0, dtype=bool)
+            return bars
+
+        keys = group_keys(df.index, rule)
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        ends = np.append(starts[1:], len(keys)) - 1
+        values = {column: df[column].to_numpy(dtype=np.float64) for column in OHLCV}
+        bars = pd.DataFrame({
+            'open': values['open'][starts],
+            'high': np.maximum.reduceat(values['high'], starts),
+            'low': np.minimum.reduceat(values['low'], starts),
+            'close': values['close'][ends],
+            'volume': np.add.reduceat(values['volume'], starts),
+        }, index=df.index[ends])
+        complete = np.ones(len(starts), dtype=bool)
+        complete[-1] = cls._last_complete(df.index[-1], rule, ends[-1] - starts[-1] + 1)
+        bars['complete'] = complete
+
+        if key is not None:
+            with cls._lock:
+                cls._cache[key] = bars
+                while len(cls._cache) > cls.MAX_ENTRIES:
+                    cls._cache.popitem(last=False)
+        return bars
+
+    @staticmethod
+    def _last_complete(last_date: pd.Timestamp, rule: str, count: int) -> bool:
+        """最后一组是否已走完（节假日导致提前收官的周/月会保守地视为未完成，直到下一组数据出现）"""
+        kind, n = parse_rule(rule)
+        if kind == 'W':
+            return last_date.weekday() >= 4
+        if kind == 'M':
+            return (last_date + pd.offsets.BDay(1)).month != last_date.month
+        return count == n
+
+    @staticmethod
+    def align(values: np.ndarray, bars: pd.DataFrame, index: pd.DatetimeIndex) -> np.ndarray:
+        """
+        把更高周期的逐K线数值对齐到日线：每个交易日只使用当日收盘时已走完的最近一根K线，
+        未走完的当周/当月不参与（避免未来函数），之前没有已完成K线的日期为 NaN
+        """
+        done = bars['complete'].to_numpy()
+        ends = bars.index.values[done]
+        position = np.searchsorted(ends, index.values, side='right') - 1
+        aligned = np.asarray(values, dtype=np.float64)[done][np.clip(position, 0, None)]
+        aligned[position < 0] = np.nan
+        return aligned
+
+    @classmethod
+    def condition(cls, df: pd.DataFrame, rule: str, condition: str, symbol: str = None) -> pd.Series:
+        """更高周期条件（如周线 MA5>MA20）在每个交易日的取值，已对齐到日线索引"""
+        bars = cls.resample(df, rule, symbol)
+        passed = CONDITIONS[condition][1](bars['close'].to_numpy()[:, None])[:, 0]
+        return pd.Series(cls.align(passed, bars, df.index) == 1, index=df.index)
+
+    @classmethod
+    def confirmation(cls, df: pd.DataFrame, confirm: list, symbol: str = None) -> pd.Series:
+        """全部确认条件同时满足的交易日"""
+        passed = pd.Series(True, index=df.index)
+        for rule, condition in confirm:
+            passed &= cls.condition(df, rule, condition, symbol)
+        return passed
+
+    @staticmethod
+    def describe(confirm: list) -> str:
+        return ' + '.join(f"{RULE_NAMES.get(rule, rule[:-1] + '日线')}{CONDITIONS[condition][0]}"
+                          for rule, condition in confirm)
@@ -0,0 +1,74 @@
+import csv
+import heapq
+import itertools
+import json
+import math
+import os
+
+
+"""流式结果输出：逐条写入JSONL/CSV，同时用有界小顶堆维护实时前K名"""
+class ResultSink:
+    def __init__(self, path: str = None, key: str = 'return', top_k: int = 50, columns=None, fmt: str = None):
+        """
+        path: 输出文件（.jsonl 或 .csv，None 表示只排序不落盘），每条结果写入后立即flush
+        key: 排序字段（降序）；top_k=None 表示保留全部结果
+        columns: CSV列顺序，缺省取第一条结果的字段
+        """
+        self.path = path
+        self.key = key
+        self.top_k = top_k
+        self.columns = list(columns) if columns else None
+        self.fmt = fmt or (os.path.splitext(path)[1].lstrip('.').lower() if path else None)
+        if self.fmt not in (None, 'jsonl', 'csv'):
+            raise ValueError(f"不支持的输出格式: {self.fmt}")
+        self.count = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._file = None
+        self._writer = None
+        if path:
+            self._file = open(path, 'w', newline='', encoding='utf-8-sig' if self.fmt == 'csv' else 'utf-8')
+
+    def _sort_value(self, result: dict) -> float:
+        value = result.get(self.key)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return -math.inf
+        return -math.inf if math.isnan(value) else value
+
+    def add(self, result: dict):
+        """写入一条结果并更新前K名"""
+        self.count += 1
+        if self._file is not None:
+            if self.fmt == 'jsonl':
+                self._file.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+            else:
+                if self._writer is None:
+                    self.columns = self.columns or list(result.keys())
+                    self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+                    self._writer.writeheader()
+                self._writer.writerow(result)
+            self._file.flush()
+
+        # 序号参与比较，避免排序值相同时比较字典；同分时先到者优先
+        entry = (self._sort_value(result), -next(self._sequence), result)
+        if self.top_k is None or len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def top(self) -> list:
+        """当前前K名，按排序字段降序"""
+        return [result for _, _, result in sorted(self._heap, reverse=True)]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+
+# stock_grain_ranking 买入评分分项（criteria_bits 第i位表示该分项得分大于0）
+GRAIN_CRITERIA = ['macd_momentum', 'boll_score', 'rsi_divergence', 'volume_score']
+
+RESULT_COLUMNS = ['symbol', 'name', 'data_date', 'signal', 'latest_price', 'return', 'buy_score',
+                  'sell_pressure', 'macro_score', 'criteria_bits', 'criteria', 'components']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_date TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    strategy_version TEXT NOT NULL,
+    universe TEXT,
+    params TEXT,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_date TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    strategy_version TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    name TEXT,
+    data_date TEXT,
+    signal INTEGER,
+    latest_price REAL,
+    return REAL,
+    buy_score REAL,
+    sell_pressure REAL,
+    macro_score REAL,
+    criteria_bits INTEGER,
+    criteria TEXT,
+    components TEXT,
+    PRIMARY KEY (run_date, strategy, strategy_version, symbol)
+);
+CREATE INDEX IF NOT EXISTS idx_results_symbol ON results (symbol, strategy, run_date);
+CREATE INDEX IF NOT EXISTS idx_results_signal ON results (strategy, strategy_version, run_date, signal);
+"""
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return value
+
+
+"""扫描结果库（SQLite）：按 运行日期 × 策略版本 × 股票 保存每次扫描的完整评分，支持历史查询"""
+class ResultStore:
+    DEFAULT_PATH = CacheManager.CACHE_DIR / "results.db"
+
+    def __init__(self, path=None, commit_every: int = 200):
+        self.path = str(path or self.DEFAULT_PATH)
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self._runs = {}      # run_id -> (run_date, strategy, strategy_version)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    # ========== 写入 ==========
+    def start_run(self, strategy: str, strategy_version: str, run_id: str = None, run_date: str = None,
+                  universe: str = None, params: dict = None) -> str:
+        """登记一次扫描；同一天同一策略版本重复扫描时，结果按股票覆盖为最新一次"""
+        run_id = run_id or f"{strategy}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        run_date = run_date or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, run_date, strategy, strategy_version, universe,
+                 json.dumps(params or {}, ensure_ascii=False, default=str), datetime.now().isoformat(timespec='seconds')))
+            self.conn.commit()
+        self._runs[run_id] = (run_date, strategy, strategy_version)
+        return run_id
+
+    def add(self, run_id: str, record: dict):
+        """写入一只股票的结果（字段见 RESULT_COLUMNS，缺失字段记为NULL）"""
+        run_date, strategy, strategy_version = self._runs[run_id]
+        values = [_to_builtin(record.get(column)) for column in RESULT_COLUMNS]
+        components = record.get('components')
+        values[-1] = json.dumps({k: _to_builtin(v) for k, v in components.items()}) if components else None
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO results (run_date, strategy, strategy_version, run_id, {', '.join(RESULT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS) + 4))})",
+                [run_date, strategy, strategy_version, run_id] + values)
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.conn.commit()
+                self._uncommitted = 0
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # ========== 查询 ==========
+    def _query(self, sql: str, params=()) -> pd.DataFrame:
+        with self._lock:
+            self.conn.commit()
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def _latest_version(self, strategy: str) -> str:
+        row = self.conn.execute(
+            "SELECT strategy_version FROM runs WHERE strategy = ? ORDER BY run_date DESC, created DESC LIMIT 1",
+            (strategy,)).fetchone()
+        return row[0] if row else None
+
+    def run_dates(self, strategy: str, strategy_version: str = None, as_of: str = None) -> list:
+        """该策略版本已有结果的运行日期（降序）"""
+        strategy_version = strategy_version or self._latest_version(strategy)
+        rows = self.conn.execute(
+            "SELECT DISTINCT run_date FROM results WHERE strategy = ? AND strategy_version = ? AND run_date <= ? "
+            "ORDER BY run_date DESC", (strategy, strategy_version, as_of or '9999-12-31')).fetchall()
+        return [row[0] for row in rows]
+
+    def signal_changes(self, strategy: str, run_date: str = None, strategy_version: str = None) -> pd.DataFrame:
+        """最近一次（或指定日期）相对上一个运行日期信号发生变化的股票"""
+        strategy_version = strategy_version or self._latest_version(strategy)
+        dates = self.run_dates(strategy, strategy_version, as_of=run_date)
+        if len(dates) < 2:
+            return pd.DataFrame(columns=['symbol', 'name', 'previous_signal', 'signal', 'buy_score', 'latest_price'])
+        return self._query(
+            """
+            SELECT cur.symbol, cur.name, prev.signal AS previous_signal, cur.signal, cur.buy_score, cur.latest_price
+            FROM results cur
+            LEFT JOIN results prev
+              ON prev.symbol = cur.symbol AND prev.strategy = cur.strategy
+             AND prev.strategy_version = cur.strategy_version AND prev.run_date = ?
+            WHERE cur.strategy = ? AND cur.strategy_version = ? AND cur.run_date = ?
+              AND (prev.signal IS NULL OR prev.signal != cur.signal)
+            ORDER BY cur.signal DESC, cur.symbol
+            """, (dates[1], strategy, strategy_version, dates[0]))
+
+    def consecutive_signal(self, strategy: str, days: int = 3, signal: int = 1, as_of: str = None,
+                           strategy_version: str = None) -> pd.DataFrame:
+        """最近days个运行日期信号均为signal的股票（如连续3天买入）"""
+        strategy_version = strategy_version or self._latest_version(strategy)
+        dates = self.run_dates(strategy, strategy_version, as_of=as_of)[:days]
+        if len(dates) < days:
+            return pd.DataFrame(columns=['symbol', 'name', 'days', 'avg_buy_score'])
+        return self._query(
+            f"""
+            SELECT symbol, MAX(name) AS name, COUNT(*) AS days, AVG(buy_score) AS avg_buy_score
+            FROM results
+            WHERE strategy = ? AND strategy_version = ? AND run_date IN ({', '.join('?' * days)})
+            GROUP BY symbol
+            HAVING COUNT(*) = ? AND MIN(signal) = ? AND MAX(signal) = ?
+            ORDER BY symbol
+            """, (strategy, strategy_version, *dates, days, signal, signal))
+
+    def history(self, symbol: str, strategy: str = None, start: str = None) -> pd.DataFrame:
+        """单只股票的评分历史（按运行日期升序）"""
+        sql = ("SELECT run_date, strategy, strategy_version, signal, latest_price, return, buy_score, sell_pressure, "
+               "macro_score, criteria_bits, criteria, components FROM results WHERE symbol = ?")
+        params = [symbol]
+        if strategy:
+            sql += " AND strategy = ?"
+            params.append(strategy)
+        if start:
+            sql += " AND run_date >= ?"
+            params.append(start)
+        return self._query(sql + " ORDER BY run_date, strategy", params)
+
+
+def grain_record(symbol: str, name: str, result: dict) -> dict:
+    """MainExecutor.analyze 的结果 → 结果库记录"""
+    score = result['latest_score']
+    bits = sum(1 << i for i, key in enumerate(GRAIN_CRITERIA) if score.get(key, 0) > 0)
+    return {
+        'symbol': symbol,
+        'name': name,
+        'data_date': result['latest_date'],
+        'signal': int(result['latest_signal']),
+        'latest_price': result['latest_price'],
+        'return': result['cum_return'],
+        'buy_score': score.get('buy_score'),
+        'sell_pressure': score.get('sell_pressure'),
+        'macro_score': score.get('macro_score'),
+        'criteria_bits': bits,
+        'criteria': ' + '.join(key for i, key in enumerate(GRAIN_CRITERIA) if bits & (1 << i)),
+        'components': score,
+    }
+
+
+if __name__ == "__main__":
+    # 写入结果库的扫描：stockPre.py 与 stock_grain_ranking/main.py
+    STRATEGIES = ['stockPre', 'grain']
+    parser = argparse.ArgumentParser(description='扫描结果库查询')
+    parser.add_argument('--db', default=None, help='结果库路径（默认 cache/results.db）')
+    commands = parser.add_subparsers(dest='command', required=True)
+    changes = commands.add_parser('changes', help='相对上一个运行日期信号发生变化的股票')
+    changes.add_argument('--strategy', default='stockPre', choices=STRATEGIES, help='策略（stockPre / grain）')
+    changes.add_argument('--date', help='运行日期（默认最近一次）')
+    consecutive = commands.add_parser('consecutive', help='连续N个运行日期保持同一信号的股票')
+    consecutive.add_argument('--strategy', default='stockPre', choices=STRATEGIES)
+    consecutive.add_argument('--days', type=int, default=3)
+    consecutive.add_argument('--signal', type=int, default=1, help='1买入 / -1卖出 / 0持有')
+    history = commands.add_parser('history', help='单只股票评分历史')
+    history.add_argument('symbol')
+    history.add_argument('--strategy', default=None, choices=STRATEGIES)
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    if args.command == 'changes':
+        table = store.signal_changes(args.strategy, run_date=args.date)
+    elif args.command == 'consecutive':
+        table = store.consecutive_signal(args.strategy, days=args.days, signal=args.signal)
+    else:
+        table = store.history(args.symbol.split('.')[0], strategy=args.strategy)
+    print(table.to_string(index=False) if not table.empty else "无记录")
+    store.close()
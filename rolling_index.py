@@ -0,0 +1,109 @@
+import numpy as np
+
+# 分段长度：段内前缀和从0重新累计，段首基准值用补偿求和保存，长历史上误差不随行数累积
+SEGMENT = 256
+
+
+def _two_sum(a, b):
+    """无误差加法：返回 (a+b 的浮点结果, 舍入误差)"""
+    total = a + b
+    virtual = total - a
+    return total, (a - (total - virtual)) + (b - virtual)
+
+
+"""分段补偿前缀和：P(p) = 段基准 + 段内前缀和，任意区间和由两组切片相减得到"""
+class _PrefixSum:
+    def __init__(self, x: np.ndarray, segment: int):
+        rows, cols = x.shape
+        segments = rows // segment + 1
+        padded = np.zeros((segments * segment, cols))
+        padded[:rows] = x
+        inclusive = np.cumsum(padded.reshape(segments, segment, cols), axis=1)
+
+        # 段内“不含当前行”的前缀和：local[p] = x[k*segment : p] 之和（k = p // segment）
+        exclusive = np.zeros_like(inclusive)
+        exclusive[:, 1:] = inclusive[:, :-1]
+        self.local = exclusive.reshape(segments * segment, cols)[:rows + 1]
+
+        # 段基准 = 之前各段合计，用 hi + lo 双精度补偿累加
+        hi, lo = np.zeros((segments, cols)), np.zeros((segments, cols))
+        for k in range(1, segments):
+            hi[k], error = _two_sum(hi[k - 1], inclusive[k - 1, -1])
+            lo[k] = lo[k - 1] + error
+        # 段基准展开到每个前缀位置，查询时只做切片；补偿项并入段内前缀和（二者量级都只有一段之和）
+        position = np.arange(rows + 1) // segment
+        self.hi = hi[position]
+        self.local += lo[position]
+
+    def window(self, length: int) -> np.ndarray:
+        """每行以该行结尾、长度为 length 的区间和（前 length-1 行为从首行起的部分和）"""
+        total = _window_diff(self.hi, length)
+        total += _window_diff(self.local, length)
+        return total
+
+
+def _window_diff(prefix: np.ndarray, length: int) -> np.ndarray:
+    """prefix[i+1] - prefix[max(i+1-length, 0)]，全部用切片完成，不做逐元素索引"""
+    rows = len(prefix) - 1
+    head = min(length, rows)
+    out = np.empty((rows,) + prefix.shape[1:], dtype=prefix.dtype)
+    np.subtract(prefix[1:head + 1], prefix[0], out=out[:head])
+    np.subtract(prefix[head + 1:], prefix[1:rows + 1 - head], out=out[head:])
+    return out
+
+
+"""滚动统计前缀索引：一次预处理后，任意窗口长度的均值/方差/BOLL 在整个面板上 O(1)/格 查表得到"""
+class RollingIndex:
+    def __init__(self, values, segment: int = SEGMENT):
+        """
+        values: 一维序列或 日期 × 股票 二维数组，NaN（停牌）所在窗口结果为NaN（同 rolling(min_periods=length)）。
+        每列先减去首个有效值再累计，价格水平不进入平方和，方差不会因大数相减丢失精度
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.squeeze = values.ndim == 1
+        # 按维度补列而非 reshape(len, -1)：空面板（0行或0列）保持原形状，各窗口结果为空
+        values = values[:, None] if self.squeeze else values
+        self.rows = len(values)
+        valid = ~np.isnan(values)
+        if self.rows:
+            first = valid.argmax(axis=0)
+            self.offset = np.where(valid.any(axis=0), values[first, np.arange(values.shape[1])], 0.0)
+        else:
+            self.offset = np.zeros(values.shape[1])
+        centered = np.where(valid, values - self.offset, 0.0)
+
+        self.count = np.zeros((self.rows + 1, values.shape[1]), dtype=np.int64)
+        np.cumsum(valid, axis=0, out=self.count[1:])
+        self.sum = _PrefixSum(centered, segment)
+        self.sum_sq = _PrefixSum(centered * centered, segment)
+
+    def _full(self, length: int) -> np.ndarray:
+        """窗口 [i-length+1, i] 是否完整（不越过首行且窗口内无NaN）"""
+        return _window_diff(self.count, length) == length
+
+    def _output(self, values):
+        return values[:, 0] if self.squeeze else values
+
+    def mean(self, length: int) -> np.ndarray:
+        """滚动均值（同 ta.sma）"""
+        mean = self.sum.window(length) / length + self.offset
+        return self._output(np.where(self._full(length), mean, np.nan))
+
+    def var(self, length: int, ddof: int = 0) -> np.ndarray:
+        """滚动方差（BOLL 使用 ddof=0），平方和与和均为去偏移后的值"""
+        total = self.sum.window(length)
+        spread = self.sum_sq.window(length) - total * total / length
+        var = np.maximum(spread, 0.0) / (length - ddof)
+        return self._output(np.where(self._full(length), var, np.nan))
+
+    def std(self, length: int, ddof: int = 0) -> np.ndarray:
+        return np.sqrt(self.var(length, ddof))
+
+    def bbands(self, length: int = 20, std: float = 2.0):
+        """BOLL：返回 (lower, mid, upper)；均值与方差共用同一次区间和"""
+        total = self.sum.window(length)
+        spread = self.sum_sq.window(length) - total * total / length
+        full = self._full(length)
+        mid = np.where(full, total / length + self.offset, np.nan)
+        dev = np.where(full, np.sqrt(np.maximum(spread, 0.0) / length), np.nan) * std
+        return self._output(mid - dev), self._output(mid), self._output(mid + dev)
@@ -0,0 +1,97 @@
+import json
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+
+
+def _to_builtin(value):
+    """json.dumps 的兜底转换：numpy标量、时间戳等转为内置类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+"""扫描断点续跑：每次运行分配ID，逐只股票把结果追加写入 cache/runs/<run_id>.jsonl 日志"""
+class ScanCheckpoint:
+    RUNS_DIR = CacheManager.CACHE_DIR / "runs"
+
+    def __init__(self, run_id: str, meta: dict, completed: dict = None):
+        self.run_id = run_id
+        self.meta = meta
+        self.completed = completed or {}
+        self.path = self.RUNS_DIR / f"{run_id}.jsonl"
+        self._file = None
+
+    @classmethod
+    def start(cls, name: str, meta: dict = None) -> 'ScanCheckpoint':
+        """新建一次运行，日志首行记录运行参数（股票列表、日期区间等），续跑时按原参数执行"""
+        cls.RUNS_DIR.mkdir(parents=True, exist_ok=True)
+        run_id = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        checkpoint = cls(run_id, meta or {})
+        checkpoint._append({'type': 'run', 'run_id': run_id, 'name': name,
+                            'created': datetime.now().isoformat(timespec='seconds'), 'meta': checkpoint.meta})
+        return checkpoint
+
+    @classmethod
+    def resume(cls, run_id: str) -> 'ScanCheckpoint':
+        """读取已有日志：已完成的股票不再处理，失败的股票在续跑时重试"""
+        path = cls.RUNS_DIR / f"{run_id}.jsonl"
+        if not path.exists():
+            raise FileNotFoundError(f"找不到运行记录: {path}")
+
+        meta, completed = {}, {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被强杀时最后一行可能只写了一半，丢弃即可
+                    continue
+                if entry.get('type') == 'run':
+                    meta = entry.get('meta', {})
+                elif entry.get('type') == 'done':
+                    completed[entry['symbol']] = entry.get('result')
+        return cls(run_id, meta, completed)
+
+    @classmethod
+    def list_runs(cls) -> list:
+        """按时间倒序列出已有运行ID"""
+        if not cls.RUNS_DIR.exists():
+            return []
+        runs = sorted(cls.RUNS_DIR.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [p.stem for p in runs]
+
+    def pending(self, symbols) -> list:
+        """尚未完成的股票（保持原顺序）"""
+        return [s for s in symbols if s not in self.completed]
+
+    def record(self, symbol: str, result):
+        """记录一只股票已完成；result为None表示已处理但无需输出"""
+        self.completed[symbol] = result
+        self._append({'type': 'done', 'symbol': symbol, 'result': result})
+
+    def record_error(self, symbol: str, error):
+        self._append({'type': 'error', 'symbol': symbol, 'error': str(error)})
+
+    def finish(self):
+        self._append({'type': 'finished', 'time': datetime.now().isoformat(timespec='seconds')})
+        self.close()
+
+    def _append(self, entry: dict):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            # 上次中断留下的半行不能和新记录拼在一起
+            if self.path.stat().st_size and not self.path.read_bytes().endswith(b'\n'):
+                self._file.write('\n')
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=_to_builtin) + '\n')
+        # 每条立即落盘，进程中断时已完成部分不丢失
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
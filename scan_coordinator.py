@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request as urlrequest
+import numpy as np
+import pandas as pd
+from cache_manager import CacheManager
+from data_resilient import DataResilient
+from result_sink import ResultSink
+from reference_data import ReferenceData
+from universe import Universe, add_universe_argument
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+"""分片扫描协调器：把股票池切成工作单元，按租约分发给工作进程，超时未心跳的单元重新分发，结果汇总排序"""
+class ScanCoordinator:
+    def __init__(self, symbols, job: dict, unit_size: int = 25, lease_timeout: float = 30,
+                 max_attempts: int = 3, sink: ResultSink = None, names=None):
+        self.job = job
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.sink = sink or ResultSink(None, key='return', top_k=None)
+        self.names = names or {}
+        self.units = {}
+        for i in range(0, len(symbols), unit_size):
+            unit_id = f"u{i // unit_size:05d}"
+            self.units[unit_id] = {'symbols': symbols[i:i + unit_size], 'state': 'pending',
+                                   'worker': None, 'deadline': 0.0, 'attempts': 0}
+        self.errors = {}
+        self.workers = {}  # worker -> 最近一次请求时间
+        self._pending = deque(self.units)
+        self._lock = threading.Lock()
+
+    def lease(self, worker: str) -> dict:
+        """分配一个待处理单元；没有可分配单元时告知工作进程等待或退出"""
+        with self._lock:
+            self.workers[worker] = time.time()
+            self._expire()
+            while self._pending:
+                unit_id = self._pending.popleft()
+                unit = self.units[unit_id]
+                # 租约超时后原工作进程又提交了结果的单元已完成，队列中残留的编号直接丢弃
+                if unit['state'] != 'pending':
+                    continue
+                unit.update(state='leased', worker=worker, deadline=time.time() + self.lease_timeout)
+                unit['attempts'] += 1
+                return {'unit_id': unit_id, 'symbols': unit['symbols'], 'job': self.job,
+                        'lease_timeout': self.lease_timeout}
+            if any(unit['state'] == 'leased' for unit in self.units.values()):
+                return {'wait': True}
+            return {'done': True}
+
+    def heartbeat(self, worker: str, unit_id: str) -> bool:
+        """续租；返回False表示该单元已被收回（工作进程应放弃）"""
+        with self._lock:
+            self.workers[worker] = time.time()
+            unit = self.units.get(unit_id)
+            if unit is None or unit['state'] != 'leased' or unit['worker'] != worker:
+                return False
+            unit['deadline'] = time.time() + self.lease_timeout
+            return True
+
+    def complete(self, worker: str, unit_id: str, results: list, errors: dict) -> bool:
+        """
+        提交单元结果；单元已完成（被重新分发后的重复提交）时忽略。
+        租约超时后的迟到提交仍接受，并从待分发队列中移除，避免再次分发后结果重复写入
+        """
+        with self._lock:
+            self.workers[worker] = time.time()
+            unit = self.units.get(unit_id)
+            if unit is None or unit['state'] in ('done', 'failed'):
+                return False
+            if unit['state'] == 'pending':
+                self._pending.remove(unit_id)
+            unit['state'] = 'done'
+            for result in results:
+                result['name'] = self.names.get(result['symbol'].split('.')[0], "")
+                self.sink.add(result)
+            self.errors.update(errors)
+            return True
+
+    def _expire(self):
+        """租约到期未心跳：重新放回队列，超过重试次数则放弃该单元"""
+        now = time.time()
+        for unit_id, unit in self.units.items():
+            if unit['state'] == 'leased' and unit['deadline'] < now:
+                if unit['attempts'] >= self.max_attempts:
+                    unit['state'] = 'failed'
+                    print(f"单元 {unit_id} 重试{unit['attempts']}次仍未完成，放弃")
+                else:
+                    print(f"单元 {unit_id} 租约超时（{unit['worker']}），重新分发")
+                    unit.update(state='pending', worker=None)
+                    self._pending.append(unit_id)
+
+    def status(self) -> dict:
+        with self._lock:
+            self._expire()
+            states = {}
+            for unit in self.units.values():
+                states[unit['state']] = states.get(unit['state'], 0) + 1
+            now = time.time()
+            return {'units': states, 'results': self.sink.count, 'errors': len(self.errors),
+                    'workers': {w: round(now - t, 1) for w, t in self.workers.items()}}
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            self._expire()
+            return all(unit['state'] in ('done', 'failed') for unit in self.units.values())
+
+    def wait(self, poll: float = 0.5, progress_every: float = 10):
+        """阻塞直到所有单元完成或放弃；期间定期检查租约超时"""
+        last_report = time.time()
+        while not self.finished:
+            time.sleep(poll)
+            if time.time() - last_report >= progress_every:
+                print(f"进度: {self.status()['units']}")
+                last_report = time.time()
+
+
+def make_handler(coordinator: ScanCoordinator):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, payload, status=200):
+            body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/status':
+                return self._send({'error': f'未知接口: {self.path}'}, 404)
+            self._send(coordinator.status())
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            worker = payload.get('worker', 'unknown')
+            if self.path == '/lease':
+                return self._send(coordinator.lease(worker))
+            if self.path == '/heartbeat':
+                return self._send({'ok': coordinator.heartbeat(worker, payload['unit_id'])})
+            if self.path == '/complete':
+                accepted = coordinator.complete(worker, payload['unit_id'], payload.get('results', []),
+                                                payload.get('errors', {}))
+                return self._send({'ok': accepted})
+            self._send({'error': f'未知接口: {self.path}'}, 404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+"""扫描工作进程：向协调器租用工作单元，逐只股票取数计算，处理期间后台心跳续租"""
+class ScanWorker:
+    def __init__(self, coordinator_url: str, worker_id: str = None, compute_fn=None, fetch_fn=None):
+        self.url = coordinator_url.rstrip('/')
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+        self.compute_fn = compute_fn
+        self.fetch_fn = fetch_fn
+
+    def _post(self, path: str, payload: dict, retries: int = 5) -> dict:
+        data = json.dumps({'worker': self.worker_id, **payload}, ensure_ascii=False,
+                          default=_json_default).encode('utf-8')
+        for attempt in range(retries + 1):
+            try:
+                req = urlrequest.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+                with urlrequest.urlopen(req, timeout=30) as resp:
+                    return json.loads(resp.read())
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                time.sleep(min(2 ** attempt * 0.2, 5))
+
+    def _setup(self, job: dict):
+        """按任务参数准备取数与计算函数（默认为 stockPre 的单只股票分析）"""
+        DataResilient.set_offline(job.get('offline', False))
+        DataResilient.set_adjust(job.get('adjust', 'qfq'))
+        if self.compute_fn is None:
+            from stockPre import analyze_symbol
+            self.compute_fn = analyze_symbol
+        if self.fetch_fn is None:
+            start_date, end_date = job['start_date'], job['end_date']
+            self.fetch_fn = lambda symbol: DataResilient.fetch_stock_data(symbol.split('.')[0], start_date, end_date)
+
+    def run_unit(self, unit: dict):
+        self._setup(unit['job'])
+        lost = threading.Event()
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(unit['lease_timeout'] / 3):
+                try:
+                    if not self._post('/heartbeat', {'unit_id': unit['unit_id']}, retries=1)['ok']:
+                        lost.set()
+                        return
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        results, errors = [], {}
+        try:
+            for symbol in unit['symbols']:
+                if lost.is_set():
+                    print(f"[{self.worker_id}] 单元 {unit['unit_id']} 已被收回，放弃")
+                    return
+                try:
+                    df = self.fetch_fn(symbol)
+                    if df is None or df.empty:
+                        raise ValueError(f"获取数据为空: {symbol}")
+                    result = self.compute_fn(symbol, df)
+                    if result is not None:
+                        results.append(result)
+                except Exception as e:
+                    errors[symbol] = str(e)
+        finally:
+            finished.set()
+        self._post('/complete', {'unit_id': unit['unit_id'], 'results': results, 'errors': errors})
+
+    def run(self):
+        """循环租用单元直到协调器通知全部完成"""
+        processed = 0
+        while True:
+            try:
+                unit = self._post('/lease', {})
+            except Exception as e:
+                print(f"[{self.worker_id}] 无法连接协调器 {self.url}: {str(e)}")
+                return processed
+            if unit.get('done'):
+                return processed
+            if unit.get('wait'):
+                time.sleep(0.5)
+                continue
+            self.run_unit(unit)
+            processed += 1
+
+
+def spawn_local_workers(url: str, count: int) -> list:
+    """启动本机工作进程（与远程主机上的工作进程使用同一协议）"""
+    return [subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', '--coordinator', url])
+            for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='分片扫描：协调器 + 多进程/多主机工作进程')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='启动协调器并汇总排序结果')
+    add_universe_argument(serve)
+    serve.add_argument('--host', default='127.0.0.1', help='监听地址（多主机时使用 0.0.0.0）')
+    serve.add_argument('--port', type=int, default=8766, help='监听端口')
+    serve.add_argument('--local-workers', type=int, default=os.cpu_count() or 1, help='本机工作进程数（0为只等待远程工作进程）')
+    serve.add_argument('--unit-size', type=int, default=25, help='每个工作单元的股票数')
+    serve.add_argument('--lease-timeout', type=float, default=30, help='租约超时秒数（无心跳则重新分发）')
+    serve.add_argument('--max-attempts', type=int, default=3, help='单元最多分发次数')
+    serve.add_argument('--top', type=int, default=50, help='报告保留前N只股票（0为全部）')
+    serve.add_argument('--output', default='stock_pre_results.jsonl', help='逐条写入的结果文件（.jsonl 或 .csv）')
+    serve.add_argument('--offline', action='store_true', help='离线模式：工作进程只使用本地缓存')
+    serve.add_argument('--adjust', choices=['qfq', 'hfq', 'none'], default='qfq', help='复权方式：qfq前复权（默认）/ hfq后复权 / none不复权')
+
+    worker = commands.add_parser('worker', help='启动工作进程')
+    worker.add_argument('--coordinator', required=True, help='协调器地址，如 http://10.0.0.1:8766')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    if args.command == 'worker':
+        processed = ScanWorker(args.coordinator).run()
+        print(f"工作进程退出，共处理 {processed} 个单元")
+        sys.exit(0)
+
+    from stockPre import print_results
+    DataResilient.set_offline(args.offline)
+    symbols = Universe.resolve(args.universe)
+    if not symbols:
+        raise ValueError(f"无法获取股票池数据: {args.universe}")
+    job = {
+        'start_date': (datetime.now() - timedelta(days=365)).strftime("%Y%m%d"),
+        'end_date': datetime.now().strftime("%Y%m%d"),
+        'offline': args.offline,
+        'adjust': args.adjust,
+    }
+
+    start_time = time.time()
+    with ResultSink(args.output, key='return', top_k=args.top or None,
+                    columns=['symbol', 'name', 'return', 'latest_price', 'date', 'criteria']) as sink:
+        coordinator = ScanCoordinator(symbols, job, unit_size=args.unit_size, lease_timeout=args.lease_timeout,
+                                      max_attempts=args.max_attempts, sink=sink, names=ReferenceData.get().names)
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(coordinator))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://{args.host if args.host != '0.0.0.0' else '127.0.0.1'}:{server.server_address[1]}"
+        print(f"协调器已启动: {url}  {len(symbols)}只股票 / {len(coordinator.units)}个单元")
+
+        workers = spawn_local_workers(url, args.local_workers)
+        try:
+            coordinator.wait()
+        except KeyboardInterrupt:
+            print("\n扫描已中断")
+        finally:
+            for proc in workers:
+                proc.terminate()
+            server.shutdown()
+
+    status = coordinator.status()
+    print(f"\n扫描完成: 单元 {status['units']}, 失败股票 {status['errors']} 只, 用时 {time.time() - start_time:.1f}秒")
+    print_results(sink.top(), sink.count)
+    print(f"全部结果已逐条写入 {args.output}")
@@ -0,0 +1,96 @@
+import copy
+import hashlib
+import inspect
+import json
+import threading
+import pandas as pd
+from cache_manager import CacheManager
+from telemetry import Telemetry
+
+# 参与行情指纹的列（名称等附加列变化不影响计算结果）
+FINGERPRINT_COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """行情内容摘要：日期索引与OHLCV逐行哈希后再整体哈希（向量化，单只股票约1毫秒）"""
+    columns = [column for column in FINGERPRINT_COLUMNS if column in df.columns]
+    rows = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+    return hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest()
+
+
+def data_version(data) -> str:
+    """宏观数据等输入的版本摘要：{名称: DataFrame} 按名称排序后逐个哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(data or {}):
+        value = data[name]
+        digest.update(name.encode('utf-8'))
+        if isinstance(value, pd.DataFrame) and not value.empty:
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def code_version(*objects) -> str:
+    """策略代码版本：相关模块/函数源码的摘要，修改指标或信号代码后旧结果自动失效"""
+    digest = hashlib.blake2b(digest_size=16)
+    for obj in objects:
+        digest.update(inspect.getsource(obj).encode('utf-8'))
+    return digest.hexdigest()
+
+
+"""增量扫描：按股票记录 输入指纹（行情摘要 + 宏观数据版本 + 策略参数 + 代码版本）→ 计算结果，指纹不变时直接复用"""
+class ScanFingerprint:
+    DIR = CacheManager.CACHE_DIR / "fingerprints"
+
+    def __init__(self, name: str, params: dict = None, code: str = '', macro: str = '', save_every: int = 200):
+        """
+        name: 策略名（每个策略一个指纹文件）
+        params/code/macro: 对全部股票相同的输入，任一变化则所有股票重新计算
+        """
+        self.path = self.DIR / f"{name}.pkl"
+        self.context = json.dumps({'params': params or {}, 'code': code, 'macro': macro},
+                                  sort_keys=True, ensure_ascii=False, default=str)
+        self.save_every = save_every
+        self.entries = {}
+        if self.path.exists():
+            self.entries = CacheManager.load_file(self.path, 'fingerprint', "加载扫描指纹失败") or {}
+        self._fingerprints = {}   # 本次运行中已取数股票的指纹，计算完成后随结果保存
+        self._unsaved = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(self, df: pd.DataFrame) -> str:
+        return hashlib.blake2b((self.context + frame_digest(df)).encode('utf-8'), digest_size=16).hexdigest()
+
+    def reuse(self, symbol, df: pd.DataFrame):
+        """I/O线程中调用：指纹未变时返回上次的结果（副本），否则记下新指纹并返回 None"""
+        fingerprint = self.fingerprint(df)
+        with self._lock:
+            entry = self.entries.get(symbol)
+            if entry is not None and entry[0] == fingerprint:
+                self.hits += 1
+                Telemetry.count('fingerprint_hits')
+                return copy.deepcopy(entry[1])
+            self._fingerprints[symbol] = fingerprint
+        Telemetry.count('fingerprint_misses')
+        return None
+
+    def record(self, symbol, result):
+        """保存重新计算的结果（须在添加名称等输出字段之前调用）"""
+        with self._lock:
+            fingerprint = self._fingerprints.pop(symbol, None)
+            if fingerprint is None or result is None:
+                return
+            self.entries[symbol] = (fingerprint, copy.deepcopy(result))
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def _save(self):
+        self.DIR.mkdir(parents=True, exist_ok=True)
+        CacheManager.save_file(self.path, self.entries, 'fingerprint', "保存扫描指纹失败")
+        self._unsaved = 0
+
+    def close(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
@@ -0,0 +1,228 @@
+import os
+import queue
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from telemetry import Telemetry, current_rss_mb
+
+_SENTINEL = object()
+# 队列消息中代替共享块的标记：结果已由 reuse_fn 给出，无需计算
+_REUSED = object()
+
+
+def _release(message):
+    """释放队列消息中的共享块（结束标记与复用结果没有共享块）"""
+    if message is not _SENTINEL and message[1] is not None and message[1] is not _REUSED:
+        SharedFrame.release(message[1])
+
+
+"""共享内存行情帧：把数值型日线DataFrame放进一块共享内存，计算进程按名称读取，避免pickle整表"""
+class SharedFrame:
+    @staticmethod
+    def publish(df: pd.DataFrame):
+        """返回 (共享块, spec)；非数值列（如股票代码字符串）不参与计算，直接丢弃"""
+        numeric = df.select_dtypes(include=[np.number])
+        rows, cols = numeric.shape
+        index = pd.DatetimeIndex(numeric.index)
+        block = shared_memory.SharedMemory(create=True, size=max(rows * (cols + 1) * 8, 1))
+        np.ndarray((rows,), dtype=np.int64, buffer=block.buf)[:] = index.asi8
+        np.ndarray((rows, cols), dtype=np.float64, buffer=block.buf, offset=rows * 8)[:] = numeric.to_numpy(dtype=np.float64)
+        spec = (block.name, rows, list(numeric.columns), index.name)
+        return block, spec
+
+    @staticmethod
+    def load(spec) -> pd.DataFrame:
+        """按spec重建DataFrame（拷贝一次后立即释放映射）"""
+        name, rows, columns, index_name = spec
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            index = np.ndarray((rows,), dtype=np.int64, buffer=block.buf).copy()
+            values = np.ndarray((rows, len(columns)), dtype=np.float64, buffer=block.buf, offset=rows * 8).copy()
+        finally:
+            block.close()
+        return pd.DataFrame(values, index=pd.DatetimeIndex(index, name=index_name), columns=columns)
+
+    @staticmethod
+    def release(block):
+        block.close()
+        block.unlink()
+
+
+def _compute(compute_fn, item, df, trace_alloc=False):
+    """执行单只股票的计算；trace_alloc 时用 tracemalloc 记录计算期间的内存分配峰值（约慢一倍）"""
+    with Telemetry.symbol(str(item)):
+        if trace_alloc:
+            tracemalloc.start()
+        try:
+            with Telemetry.timer('compute'):
+                return compute_fn(item, df)
+        finally:
+            if trace_alloc:
+                Telemetry.observe_allocation('compute', tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+                tracemalloc.stop()
+
+
+def _compute_task(compute_fn, item, spec, trace_alloc=False):
+    """计算进程中执行；连同本任务产生的运行指标一起返回，由主进程合并"""
+    try:
+        result = _compute(compute_fn, item, SharedFrame.load(spec), trace_alloc)
+        return result, Telemetry.drain(), None
+    except Exception as e:
+        return None, Telemetry.drain(), e
+
+
+"""分级流水线：I/O线程池负责取数，有界队列提供背压，进程池负责CPU计算"""
+class StagedPipeline:
+    def __init__(self, fetch_fn, compute_fn, io_workers: int = 8, compute_workers: int = None,
+                 queue_size: int = 32, initializer=None, initargs=(), memory_budget_mb: float = None,
+                 trace_alloc: bool = False, reuse_fn=None, executor=None):
+        """
+        fetch_fn(item) -> DataFrame：在I/O线程中执行，可以是闭包
+        compute_fn(item, df) -> result：在计算进程中执行，必须是可pickle的模块级函数
+        reuse_fn(item, df) -> result 或 None：取数后在I/O线程中执行，返回非None时直接作为结果，跳过计算（增量扫描）
+        compute_workers=0 时在主进程内串行计算（便于调试）
+        memory_budget_mb: 主进程常驻内存超过该值且队列中仍有待计算数据时，I/O线程暂停取数
+        trace_alloc: 记录每只股票计算期间的内存分配峰值；仅在计算进程中有效（主进程内计算时 tracemalloc
+                     会把I/O线程的分配一并计入，此时忽略）
+        executor: 调用方持有的常驻进程池（如常驻服务），传入时不再每次新建，也不在结束时关闭
+        """
+        self.fetch_fn = fetch_fn
+        self.compute_fn = compute_fn
+        self.io_workers = max(1, io_workers)
+        self.compute_workers = (os.cpu_count() or 1) if compute_workers is None else compute_workers
+        self.queue_size = max(1, queue_size)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.memory_budget_mb = memory_budget_mb
+        self.trace_alloc = trace_alloc and self.compute_workers > 0
+        if trace_alloc and not self.trace_alloc:
+            print("主进程内计算时无法区分I/O线程的内存分配，忽略 --trace-alloc")
+        self.reuse_fn = reuse_fn
+        self.executor = executor
+
+    def run(self, items):
+        """逐个产出 (item, result, error)，完成顺序而非输入顺序"""
+        items = iter(items)
+        items_lock = threading.Lock()
+        ready = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        use_processes = self.compute_workers > 0
+
+        def put(message):
+            # 队列满时阻塞（背压），同时响应停止信号
+            while not stop.is_set():
+                try:
+                    ready.put(message, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            _release(message)
+
+        def io_worker():
+            while not stop.is_set():
+                with items_lock:
+                    item = next(items, _SENTINEL)
+                if item is _SENTINEL:
+                    break
+                # 超出内存预算时等待计算阶段消化队列；队列已空则继续取数，避免互相等待
+                while (self.memory_budget_mb and not stop.is_set() and ready.qsize() > 0
+                       and current_rss_mb() > self.memory_budget_mb):
+                    Telemetry.count('memory_throttle_waits')
+                    time.sleep(0.05)
+                try:
+                    with Telemetry.symbol(str(item)), Telemetry.timer('fetch'):
+                        df = self.fetch_fn(item)
+                    reused = self.reuse_fn(item, df) if self.reuse_fn and df is not None and not df.empty else None
+                    if df is None or df.empty:
+                        put((item, None, None, ValueError(f"获取数据为空: {item}")))
+                    elif reused is not None:
+                        put((item, _REUSED, reused, None))
+                    elif use_processes:
+                        block, spec = SharedFrame.publish(df)
+                        put((item, block, spec, None))
+                    else:
+                        put((item, None, df, None))
+                except Exception as e:
+                    put((item, None, None, e))
+                # 立即释放本线程对行情的引用，不把上一只股票带进下一次取数
+                df = None
+            put(_SENTINEL)
+
+        threads = [threading.Thread(target=io_worker, daemon=True) for _ in range(self.io_workers)]
+        for thread in threads:
+            thread.start()
+
+        executor = None
+        if use_processes and self.executor is not None:
+            executor = self.executor
+        elif use_processes:
+            executor = ProcessPoolExecutor(max_workers=self.compute_workers,
+                                           initializer=self.initializer, initargs=self.initargs)
+        elif self.initializer:
+            self.initializer(*self.initargs)
+
+        # 进程池内最多积压 2 × 进程数 个任务，其余停留在有界队列中
+        max_inflight = max(1, self.compute_workers * 2)
+        pending = {}
+        finished_io = 0
+        try:
+            while finished_io < len(threads) or pending:
+                while finished_io < len(threads) and len(pending) < max_inflight:
+                    try:
+                        message = ready.get(timeout=0.01 if pending else None)
+                    except queue.Empty:
+                        break
+                    if message is _SENTINEL:
+                        finished_io += 1
+                        continue
+                    item, block, payload, error = message
+                    message = None
+                    if error is not None:
+                        yield item, None, error
+                    elif block is _REUSED:
+                        yield item, payload, None
+                    elif executor is None:
+                        try:
+                            result = _compute(self.compute_fn, item, payload, self.trace_alloc)
+                        except Exception as e:
+                            result, error = None, e
+                        payload = None
+                        yield item, result, error
+                    else:
+                        future = executor.submit(_compute_task, self.compute_fn, item, payload, self.trace_alloc)
+                        pending[future] = (item, block)
+
+                if pending:
+                    done, _ = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item, block = pending.pop(future)
+                        SharedFrame.release(block)
+                        try:
+                            result, metrics, error = future.result()
+                        except Exception as e:
+                            yield item, None, e
+                            continue
+                        Telemetry.merge(metrics)
+                        yield item, result, error
+        finally:
+            stop.set()
+            if executor is not None and executor is not self.executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+            elif pending:
+                # 常驻进程池不关闭：撤销未开始的任务，等待已开始的任务结束后再释放共享块
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+            for _, block in pending.values():
+                SharedFrame.release(block)
+            # 释放已发布但未被消费的共享块
+            while True:
+                try:
+                    message = ready.get_nowait()
+                except queue.Empty:
+                    break
+                _release(message)
@@ -0,0 +1,136 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from panel import PricePanel
+from panel_indicators import IndicatorCache
+from panel_strategies import PanelStrategies, PRE_DEFAULTS, PRE_CRITERIA
+from data_resilient import DataResilient
+from cache_manager import CacheManager
+from reference_data import ReferenceData
+
+# stockPre 的回看区间：每次筛选取过去365天数据计算累计收益
+LOOKBACK_DAYS = 365
+
+
+"""历史筛选回放：一次计算全历史信号，还原每个交易日 stockPre 的买入推荐列表"""
+class ScreenReplay:
+    @staticmethod
+    def trailing_returns(strategy_returns: np.ndarray, dates: pd.DatetimeIndex, lookback_days: int = LOOKBACK_DAYS) -> np.ndarray:
+        """每个日期上的回看区间累计策略收益（同 stockPre 在该日运行时的 cum_returns 末值）"""
+        cum_returns = np.cumprod(1 + np.nan_to_num(strategy_returns), axis=0)
+        # stockPre 区间首日无持仓，累计收益从区间第二行开始计
+        window_start = dates.searchsorted(dates - pd.Timedelta(days=lookback_days))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return cum_returns / cum_returns[window_start]
+
+    @staticmethod
+    def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+        """持有horizon个交易日的远期收益（停牌日沿用前收盘价）"""
+        filled = pd.DataFrame(close).ffill().to_numpy()
+        forward = np.full_like(filled, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            forward[:-horizon] = filled[horizon:] / filled[:-horizon] - 1
+        return forward
+
+    @staticmethod
+    def replay(panel: PricePanel, start_date, params: dict = None, horizons=(1, 5, 20),
+               names: dict = None, lookback_days: int = LOOKBACK_DAYS):
+        """返回 (逐日买入推荐明细表, 逐日远期收益统计表)"""
+        params = {**PRE_DEFAULTS, **(params or {})}
+        cache = IndicatorCache(panel.fields)
+        buy_conditions, _ = PanelStrategies.pre_conditions(cache, params)
+        signal = PanelStrategies.pre_signals(cache, params)
+        strategy_returns = PanelStrategies.backtest(signal, cache.get('returns'))
+        trailing = ScreenReplay.trailing_returns(strategy_returns, panel.dates, lookback_days)
+
+        # 条件位图：第i位表示满足 PRE_CRITERIA[i]
+        criteria_bits = sum(cond.astype(np.int16) << i for i, cond in enumerate(buy_conditions))
+
+        close = panel['close']
+        in_range = (panel.dates >= pd.Timestamp(start_date))[:, None]
+        picks = (signal == 1) & ~np.isnan(close) & in_range
+        rows, cols = np.nonzero(picks)
+
+        forward = {h: ScreenReplay.forward_returns(close, h) for h in horizons}
+        names = names or {}
+        symbols = np.asarray(panel.symbols)
+        picks_df = pd.DataFrame({
+            'date': panel.dates[rows],
+            'symbol': symbols[cols],
+            'name': [names.get(s.split('.')[0], "") for s in symbols[cols]],
+            'latest_price': close[rows, cols],
+            'return': trailing[rows, cols],
+            'criteria_bits': criteria_bits[rows, cols],
+            **{f'fwd_{h}d': forward[h][rows, cols] for h in horizons},
+        })
+        picks_df['criteria'] = picks_df['criteria_bits'].map(ScreenReplay.describe_criteria)
+        picks_df['rank'] = picks_df.groupby('date')['return'].rank(method='first', ascending=False).astype(int)
+        picks_df = picks_df.sort_values(['date', 'rank']).reset_index(drop=True)
+
+        # 逐日统计：推荐组合远期收益 vs 当日全市场平均
+        dates_in_range = panel.dates[in_range[:, 0]]
+        stats = pd.DataFrame(index=dates_in_range)
+        stats['n_picks'] = picks_df.groupby('date').size().reindex(dates_in_range, fill_value=0)
+        for h in horizons:
+            column = f'fwd_{h}d'
+            grouped = picks_df.groupby('date')[column]
+            universe_mean = pd.DataFrame(np.where(np.isnan(close), np.nan, forward[h])).mean(axis=1).to_numpy()
+            stats[f'{column}_mean'] = grouped.mean().reindex(dates_in_range)
+            stats[f'{column}_hit_rate'] = grouped.apply(lambda x: (x.dropna() > 0).mean()).reindex(dates_in_range)
+            stats[f'{column}_universe'] = pd.Series(universe_mean, index=panel.dates).reindex(dates_in_range)
+            stats[f'{column}_excess'] = stats[f'{column}_mean'] - stats[f'{column}_universe']
+        stats.index.name = 'date'
+        return picks_df, stats
+
+    @staticmethod
+    def describe_criteria(bits: int) -> str:
+        return ' + '.join(name for i, name in enumerate(PRE_CRITERIA) if bits & (1 << i))
+
+    @staticmethod
+    def summarize(stats: pd.DataFrame, horizons=(1, 5, 20)) -> pd.DataFrame:
+        """按持有期汇总：平均远期收益、胜率、超额收益"""
+        rows = []
+        for h in horizons:
+            column = f'fwd_{h}d'
+            rows.append({
+                'horizon': f'{h}日',
+                'days_with_picks': int((stats['n_picks'] > 0).sum()),
+                'mean_return': stats[f'{column}_mean'].mean(),
+                'hit_rate': stats[f'{column}_hit_rate'].mean(),
+                'mean_excess': stats[f'{column}_excess'].mean(),
+            })
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='stockPre 历史筛选回放')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（默认沪深300成分股）')
+    parser.add_argument('--days', type=int, default=365, help='回放最近N天（默认365）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--horizons', type=int, nargs='+', default=[1, 5, 20], help='远期收益持有期（交易日）')
+    parser.add_argument('--output', default='screen_replay', help='输出文件前缀')
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    symbols = args.symbols or DataResilient.get_hs300_symbols(use_cache=True)
+    if not symbols:
+        raise ValueError("无法获取沪深300成分股数据")
+
+    end_date = datetime.strptime(args.end, '%Y%m%d')
+    replay_start = end_date - timedelta(days=args.days)
+    # 额外加载一个回看区间，保证回放首日的累计收益与指标预热完整
+    load_start = replay_start - timedelta(days=LOOKBACK_DAYS + 60)
+
+    start_time = time.time()
+    panel = PricePanel.load(symbols, load_start.strftime('%Y%m%d'), args.end)
+    picks, stats = ScreenReplay.replay(panel, replay_start, horizons=args.horizons, names=ReferenceData.get().names)
+    print(f"回放完成: {len(stats)}个交易日, {len(picks)}条推荐记录, 用时 {time.time() - start_time:.1f}秒")
+
+    print("\n=== 推荐组合远期收益统计 ===")
+    print(ScreenReplay.summarize(stats, args.horizons).to_string(index=False))
+
+    picks.to_csv(f"{args.output}_picks.csv", index=False, encoding='utf-8-sig')
+    stats.to_csv(f"{args.output}_stats.csv", encoding='utf-8-sig')
+    print(f"结果已保存到 {args.output}_picks.csv / {args.output}_stats.csv")
@@ -1,10 +1,26 @@
+import argparse
+import json
+import os
+import sys
+from functools import partial
 import pandas as pd
-import pandas_ta as ta
-import akshare as ak
 import numpy as np
 from datetime import datetime, timedelta
 from data_resilient import DataResilient
 from cache_manager import CacheManager
+from scan_pipeline import StagedPipeline
+from result_sink import ResultSink
+from scan_checkpoint import ScanCheckpoint
+from result_store import ResultStore
+from telemetry import Telemetry
+from reference_data import ReferenceData
+from universe import Universe, add_universe_argument
+import resample
+import panel_indicators
+from resample import Resampler, parse_confirm
+from scan_fingerprint import ScanFingerprint, code_version
+from correlation import diversify_frames
+from deadline_scan import DeadlineScan, DeadlineSkip
 
 # ========== 数据获取模块 ==========
 def fetch_stock_data(symbol, start_date, end_date):
@@ -12,42 +28,47 @@ def fetch_stock_data(symbol, start_date, end_date):
     return DataResilient.fetch_stock_data(symbol, start_date, end_date, use_cache=True)
 
 # ========== 指标计算模块（使用 pandas_ta）==========
+# pandas_ta 输出列 → 策略使用的列名（只取这些列写入原表，不再整表 concat 复制）
+PANDAS_TA_COLUMNS = {
+    'MACD_12_26_9': 'macd',
+    'MACDs_12_26_9': 'macd_signal',
+    'MACDh_12_26_9': 'macd_hist',
+    'BBL_20_2.0': 'boll_lower',
+    'BBM_20_2.0': 'boll_mid',
+    'BBU_20_2.0': 'boll_upper'
+}
+
 def calculate_indicators(df):
     """计算技术指标：均线、MACD、RSI、BOLL、成交量"""
+    import pandas_ta  # noqa: F401  首次计算时才导入，注册 df.ta 访问器
     # 均线 (5日, 20日)
     df['ma5'] = df.ta.sma(length=5)
     df['ma20'] = df.ta.sma(length=20)
     
     # MACD (默认参数：fast=12, slow=26, signal=9)
     macd = df.ta.macd(fast=12, slow=26, signal=9)
-    df = pd.concat([df, macd], axis=1)
+    for column, name in PANDAS_TA_COLUMNS.items():
+        if column in macd:
+            df[name] = macd[column]
     
     # RSI (14日)
     df['rsi'] = df.ta.rsi(length=14)
     
     # BOLL (20日)
     boll = df.ta.bbands(length=20)
-    df = pd.concat([df, boll], axis=1)
+    for column, name in PANDAS_TA_COLUMNS.items():
+        if column in boll:
+            df[name] = boll[column]
     
     # 成交量变化率（3日平均）
     df['volume_ma3'] = df['volume'].rolling(window=3).mean()
     df['volume_pct_change'] = (df['volume'] / df['volume_ma3'].shift(1)) - 1
     
-    # 清理列名
-    df.rename(columns={
-        'MACD_12_26_9': 'macd',
-        'MACDs_12_26_9': 'macd_signal',
-        'MACDh_12_26_9': 'macd_hist',
-        'BBL_20_2.0': 'boll_lower',
-        'BBM_20_2.0': 'boll_mid',
-        'BBU_20_2.0': 'boll_upper'
-    }, inplace=True)
-    
     return df
 
 # ========== 信号生成模块 ==========
-def generate_signals(df):
-    """根据策略生成买卖信号"""
+def generate_signals(df, confirm=None, symbol=None):
+    """根据策略生成买卖信号；confirm 为更高周期确认条件（如 [('W', 'ma')]），由日线重采样得到"""
     signals = pd.DataFrame(index=df.index)
     signals['signal'] = 0  # 0: 无信号, 1: 买入, -1: 卖出
     
@@ -65,6 +86,10 @@ def generate_signals(df):
     
     # 新买入条件：至少满足2个条件
     buy_condition = satisfied_counts >= 2
+
+    # 多周期确认：只使用当日收盘时已走完的周线/月线
+    if confirm:
+        buy_condition &= Resampler.confirmation(df, confirm, symbol)
     
     # 卖出条件（任一条件触发）
     sell_condition = (
@@ -92,70 +117,245 @@ def get_hs300_symbols():
     """获取沪深300成分股代码"""
     return DataResilient.get_hs300_symbols(use_cache=True)
 
-# ========== 修改主程序 ==========
-if __name__ == "__main__":
-    CacheManager.initialize()
-    
-    symbols = get_hs300_symbols()
-    if not symbols:
-        raise ValueError("无法获取沪深300成分股数据")
-    
-    end_date = datetime.now().strftime("%Y%m%d")
-    start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
+# ========== 单只股票分析（可在计算进程中执行）==========
+# 买入条件（criteria_bits 第i位对应第i个条件）
+PRE_CRITERIA = ["均线金叉", "MACD金叉", "RSI超卖", "BOLL下轨", "放量20%"]
 
-    stock_code_name_df = DataResilient.get_stock_info(use_cache=True)
-    code_name_dict = dict(zip(stock_code_name_df['code'], stock_code_name_df['name'])) if not stock_code_name_df.empty else {}
+# 信号规则或参数变化时递增，结果库按版本区分历史记录
+STRATEGY_VERSION = 'pre-v1'
 
-    results = []  # 存储所有股票结果
-    
-    for symbol in symbols:
-        # 提取纯数字代码用于名称查询
-        base_symbol = symbol.split('.')[0]
-        stock_name = code_name_dict.get(base_symbol, "")
-        
+def strategy_version(confirm=None) -> str:
+    """结果库中的策略版本：多周期确认改变了买入规则，附加在版本号后（如 pre-v1+W:ma），与普通扫描分开存储"""
+    return STRATEGY_VERSION + ''.join(f"+{rule}:{condition}" for rule, condition in confirm or [])
+
+def evaluate_symbol(symbol, df, confirm=None):
+    """计算指标、信号与回测，返回最新一天的完整评估（含信号与各买入条件是否满足）"""
+    with Telemetry.timer('indicators'):
+        df = calculate_indicators(df)
+    with Telemetry.timer('signals'):
+        signals = generate_signals(df, confirm, symbol)
+    with Telemetry.timer('backtest'):
+        df = backtest_strategy(df, signals)
+
+    # 获取最新日期满足的买入条件
+    latest = df.iloc[-1]
+    checks = [
+        latest['ma5'] > latest['ma20'],
+        latest['macd'] > latest['macd_signal'],
+        latest['rsi'] < 30,
+        latest['close'] < latest['boll_lower'],
+        latest['volume_pct_change'] > 0.2
+    ]
+    bits = sum(1 << i for i, passed in enumerate(checks) if passed)
+
+    return {
+        'symbol': symbol,
+        'signal': int(signals.iloc[-1]['signal']),
+        'return': df['cum_returns'].iloc[-1],
+        'latest_price': df['close'].iloc[-1],
+        'date': df.index[-1].strftime('%Y-%m-%d'),
+        'criteria_bits': bits,
+        'criteria': ' + '.join(name for i, name in enumerate(PRE_CRITERIA) if bits & (1 << i))
+    }
+
+def analyze_symbol(symbol, df):
+    """最新信号为买入时返回结果字典，否则返回None"""
+    result = evaluate_symbol(symbol, df)
+    return result if result['signal'] == 1 else None
+
+# ========== 分散化 ==========
+def diversify_picks(picks, start_date, end_date, max_corr, window=60):
+    """按近期收益相关性剔除与排名更靠前的推荐高度相关的股票（行情刚扫描过，只读本地缓存，不联网）"""
+    frames = {}
+    for item in picks:
         try:
-            df = fetch_stock_data(base_symbol, start_date, end_date)
-            if df is None or df.empty:
-                continue
-                
-            df = calculate_indicators(df)
-            signals = generate_signals(df)
-            df = backtest_strategy(df, signals)
-            
-            # 只记录有买入信号的
-            latest_signal = signals.iloc[-1]['signal']
-            if latest_signal == 1:
-                # 获取最新日期满足的买入条件
-                latest_date = df.index[-1]
-                satisfied_conditions = [
-                    "均线金叉" if (df.loc[latest_date, 'ma5'] > df.loc[latest_date, 'ma20']) else None,
-                    "MACD金叉" if (df.loc[latest_date, 'macd'] > df.loc[latest_date, 'macd_signal']) else None,
-                    "RSI超卖" if (df.loc[latest_date, 'rsi'] < 30) else None,
-                    "BOLL下轨" if (df.loc[latest_date, 'close'] < df.loc[latest_date, 'boll_lower']) else None,
-                    "放量20%" if (df.loc[latest_date, 'volume_pct_change'] > 0.2) else None
-                ]
-                satisfied_conditions = [x for x in satisfied_conditions if x is not None]
-                
-                results.append({
-                    'symbol': symbol,
-                    'name': stock_name,
-                    'return': df['cum_returns'].iloc[-1],
-                    'latest_price': df['close'].iloc[-1],
-                    'date': df.index[-1].strftime('%Y-%m-%d'),
-                    'criteria': ' + '.join(satisfied_conditions)
-                })
+            frames[item['symbol']] = DataResilient.load_cached_stock_data(item['symbol'].split('.')[0], start_date, end_date)
         except Exception as e:
-            print(f"处理 {symbol} 时出错: {str(e)}")
-            continue
+            print(f"获取 {item['symbol']} 行情失败，不参与相关性过滤: {str(e)}")
+    kept, dropped = diversify_frames([item['symbol'] for item in picks], frames, max_corr, window)
+    if dropped:
+        print(f"\n相关性过滤（近{window}日收益相关系数 > {max_corr}）剔除 {len(dropped)} 只:")
+        for symbol, (peer, value) in dropped.items():
+            print(f"  {symbol:<12} 与 {peer:<12} 相关系数 {value:.2f}")
+    by_symbol = {item['symbol']: item for item in picks}
+    return [by_symbol[symbol] for symbol in kept]
 
-    # 按累计收益率排序
-    sorted_results = sorted(results, key=lambda x: x['return'], reverse=True)
-    
-    # 格式化输出
-    print("\n=== 买入信号股票推荐 (按累计收益率降序) ===")
+# ========== 结果输出 ==========
+def print_results(sorted_results, total=None):
+    """按累计收益率降序打印买入推荐列表"""
+    total = len(sorted_results) if total is None else total
+    print(f"\n=== 买入信号股票推荐 (按累计收益率降序, 共{total}只) ===")
     print(f"{'名称':<20}{'代码':<15}{'最新日期':<12}{'股价':<8}{'收益率':<10}{'判定依据'}")
-
-    # 正确的输出循环
     for item in sorted_results:
         print(f"{item['name'][:18]:<20}{item['symbol']:<15}{item['date']:<12}"
-              f"{item['latest_price']:>6.2f}{item['return']:>8.2%}  {item['criteria']}")
\ No newline at end of file
+              f"{item['latest_price']:>6.2f}{item['return']:>8.2%}  {item['criteria']}")
+
+# ========== 修改主程序 ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='买入信号筛选（默认沪深300成分股）')
+    add_universe_argument(parser)
+    parser.add_argument('--io-workers', type=int, default=8, help='取数线程数（默认8）')
+    parser.add_argument('--compute-workers', type=int, default=None, help='计算进程数（默认CPU核数，0为主进程串行）')
+    parser.add_argument('--queue-size', type=int, default=32, help='取数与计算之间的队列长度（背压上限）')
+    parser.add_argument('--top', type=int, default=50, help='报告保留前N只股票（0为全部）')
+    parser.add_argument('--output', default='stock_pre_results.jsonl', help='逐条写入的结果文件（.jsonl 或 .csv）')
+    parser.add_argument('--resume', metavar='RUN_ID', help='从中断的运行继续，只处理未完成的股票')
+    parser.add_argument('--offline', action='store_true', help='离线模式：只使用本地缓存，不联网')
+    parser.add_argument('--adjust', choices=['qfq', 'hfq', 'none'], default='qfq', help='复权方式：qfq前复权（默认）/ hfq后复权 / none不复权')
+    parser.add_argument('--store', default=None, help='历史结果库路径（默认 cache/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不写入历史结果库')
+    parser.add_argument('--metrics', default=None, help='运行指标输出路径（JSON摘要，另写同名 .prom 文件）')
+    parser.add_argument('--memory-budget', type=float, default=None, help='主进程内存预算（MB），超出时暂停取数')
+    parser.add_argument('--trace-alloc', action='store_true', help='记录每只股票计算期间的内存分配峰值（计算约慢一倍；需计算进程，--compute-workers 0 时忽略）')
+    parser.add_argument('--confirm', nargs='+', metavar='周期:条件', help='更高周期确认条件，如 W:ma M:macd 3D:ma（周期 W/M/ND，条件 ma/macd）')
+    parser.add_argument('--history-days', type=int, default=365, help='行情回看天数（月线条件需约两年）')
+    parser.add_argument('--full', action='store_true', help='全量重算（不复用输入未变股票的上次结果）')
+    parser.add_argument('--max-corr', type=float, default=None, help='推荐列表两两收益相关系数上限，超过的按排名贪心剔除')
+    parser.add_argument('--corr-window', type=int, default=60, help='相关系数计算窗口（交易日）')
+    parser.add_argument('--deadline', type=float, default=None, help='总时限（秒）：到时停止并输出已有结果，超时取数改用本地旧缓存')
+    parser.add_argument('--fetch-timeout', type=float, default=20.0, help='限时扫描中单只股票联网取数的最长等待（秒）')
+    parser.add_argument('--watchlist', default=None, help='限时扫描中优先处理的自选股文件')
+    args = parser.parse_args()
+    # 时限从启动时起算，股票池与参考数据的加载也计入
+    deadline = DeadlineScan(args.deadline, args.fetch_timeout) if args.deadline else None
+
+    CacheManager.initialize()
+    DataResilient.set_offline(args.offline)
+    DataResilient.set_adjust(args.adjust)
+
+    if args.resume:
+        # 续跑沿用原运行的股票列表与日期区间，保证结果口径一致
+        checkpoint = ScanCheckpoint.resume(args.resume)
+        symbols = checkpoint.meta['symbols']
+        start_date, end_date = checkpoint.meta['start_date'], checkpoint.meta['end_date']
+        args.confirm = checkpoint.meta.get('confirm')
+        print(f"续跑 {checkpoint.run_id}: 已完成 {len(checkpoint.completed)}/{len(symbols)} 只")
+    else:
+        symbols = Universe.resolve(args.universe)
+        if not symbols:
+            raise ValueError(f"无法获取股票池数据: {args.universe}")
+        print(f"股票池 {args.universe}: {len(symbols)} 只")
+
+        end_date = datetime.now().strftime("%Y%m%d")
+        start_date = (datetime.now() - timedelta(days=args.history_days)).strftime("%Y%m%d")
+        checkpoint = ScanCheckpoint.start('stockPre', {'universe': args.universe, 'symbols': symbols,
+                                                        'start_date': start_date, 'end_date': end_date,
+                                                        'confirm': args.confirm})
+        print(f"运行ID: {checkpoint.run_id}（中断后可用 --resume {checkpoint.run_id} 继续）")
+
+    confirm = parse_confirm(args.confirm)
+    if confirm:
+        print(f"多周期确认: {Resampler.describe(confirm)}")
+
+    code_name_dict = ReferenceData.get().names
+
+    # 每只股票的完整评估（含未触发买入的）写入历史结果库，运行日期取扫描的截止日期
+    store = None if args.no_store else ResultStore(args.store)
+    if store is not None:
+        store.start_run('stockPre', strategy_version(confirm), run_id=checkpoint.run_id,
+                        run_date=datetime.strptime(end_date, "%Y%m%d").strftime('%Y-%m-%d'),
+                        universe=checkpoint.meta.get('universe'),
+                        params={'start_date': start_date, 'confirm': args.confirm})
+
+    # 增量扫描：行情、参数与策略代码都未变的股票直接复用上次结果
+    fingerprints = None if args.full else ScanFingerprint(
+        'stockPre', params={'version': STRATEGY_VERSION, 'confirm': confirm, 'adjust': args.adjust},
+        code=code_version(calculate_indicators, generate_signals, backtest_strategy, evaluate_symbol,
+                          resample, panel_indicators))
+
+    fetch_fn = lambda symbol: fetch_stock_data(symbol.split('.')[0], start_date, end_date)
+    pending = checkpoint.pending(symbols)
+    if deadline is not None:
+        # 限时扫描：无需联网的股票优先，其次自选股，再按成交额；取数超时改读本地缓存
+        fetch_fn = deadline.wrap(fetch_fn, lambda symbol: DataResilient.load_cached_stock_data(
+            symbol.split('.')[0], start_date, end_date))
+        watchlist = Universe.watchlist(args.watchlist) if args.watchlist else ()
+        pending = deadline.order(pending, watchlist, deadline.liquidity())
+        print(f"限时扫描: {args.deadline:.0f}秒，剩余 {deadline.remaining():.1f}秒")
+
+    # 取数（I/O线程）与计算（进程池）分级并发
+    pipeline = StagedPipeline(
+        fetch_fn=fetch_fn,
+        compute_fn=partial(evaluate_symbol, confirm=confirm) if confirm else evaluate_symbol,
+        io_workers=args.io_workers,
+        compute_workers=args.compute_workers,
+        queue_size=args.queue_size,
+        memory_budget_mb=args.memory_budget,
+        trace_alloc=args.trace_alloc,
+        reuse_fn=fingerprints.reuse if fingerprints else None
+    )
+    # 每只股票完成即写入结果文件，内存中只保留前N名
+    with ResultSink(args.output, key='return', top_k=args.top or None,
+                    columns=['symbol', 'name', 'return', 'latest_price', 'date', 'criteria']) as sink:
+        # 先回放已完成股票的结果，再处理剩余部分
+        for result in checkpoint.completed.values():
+            if result is not None and result.get('signal', 1) == 1:
+                sink.add(result)
+
+        stream = pipeline.run(pending)
+        processed = set()
+        try:
+            for symbol, result, error in stream:
+                processed.add(symbol)
+                if isinstance(error, DeadlineSkip):
+                    pass
+                elif error is not None:
+                    print(f"处理 {symbol} 时出错: {str(error)}")
+                    checkpoint.record_error(symbol, error)
+                else:
+                    if fingerprints is not None:
+                        fingerprints.record(symbol, result)
+                    # 提取纯数字代码用于名称查询
+                    result['name'] = code_name_dict.get(symbol.split('.')[0], "")
+                    if store is not None:
+                        store.add(checkpoint.run_id, {**result, 'symbol': symbol.split('.')[0], 'data_date': result['date']})
+                    stale = deadline is not None and symbol in deadline.stale
+                    if stale:
+                        result['stale'] = True
+                    if result['signal'] == 1:
+                        sink.add(result)
+                    # 使用旧缓存的股票不记为完成，续跑时重新取数
+                    if not stale:
+                        checkpoint.record(symbol, result)
+                # 已收到的结果先入库再检查时限
+                if deadline is not None and deadline.expired():
+                    print(f"已到时限，停止扫描（已处理 {len(processed)}/{len(pending)} 只）")
+                    break
+        except KeyboardInterrupt:
+            print(f"\n扫描已中断，已完成 {len(checkpoint.completed)}/{len(symbols)} 只，可用 --resume {checkpoint.run_id} 继续")
+            sys.exit(1)
+        finally:
+            stream.close()
+            checkpoint.close()
+            if store is not None:
+                store.close()
+            if fingerprints is not None:
+                fingerprints.close()
+    if deadline is not None:
+        deadline.finish(pending, processed)
+    if deadline is None or not (deadline.skipped or deadline.stale):
+        checkpoint.finish()
+    if fingerprints is not None:
+        print(f"增量扫描: {fingerprints.hits} 只股票输入未变，复用上次结果")
+
+    # 按累计收益率排序输出
+    picks = sink.top()
+    if args.max_corr is not None:
+        picks = diversify_picks(picks, start_date, end_date, args.max_corr, args.corr_window)
+    print_results(picks, sink.count)
+    print(f"全部结果已逐条写入 {args.output}")
+
+    if deadline is not None:
+        deadline.report()
+        report_path = f"{os.path.splitext(args.output)[0]}_deadline.json"
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'run_id': checkpoint.run_id, **deadline.summary()}, f, ensure_ascii=False, indent=2)
+        print(f"旧数据与跳过清单已写入 {report_path}")
+        if deadline.skipped or deadline.stale:
+            print(f"可用 --resume {checkpoint.run_id} 补齐跳过与使用旧缓存的股票")
+
+    Telemetry.record_memory()
+    Telemetry.report()
+    if args.metrics:
+        Telemetry.write(args.metrics)
+        print(f"运行指标已写入 {args.metrics}")
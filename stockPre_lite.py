@@ -1,9 +1,13 @@
+import argparse
 import pandas as pd
 import pandas_ta as ta
 import akshare as ak
 import numpy as np
 from datetime import datetime, timedelta
 import os
+from result_sink import ResultSink
+from reference_data import ReferenceData
+from telemetry import Telemetry
 
 
 def fetch_stock_data(symbol, start_date, end_date):
@@ -106,19 +110,17 @@ def get_hs300_symbols():
         return []
 
 
-def save_results_to_csv(results, filename='stock_pre_results.csv'):
-    """保存结果到CSV文件"""
-    if not results:
-        print("没有结果需要保存")
-        return
-    
-    df = pd.DataFrame(results)
-    df = df.sort_values('return', ascending=False)
-    df.to_csv(filename, index=False, encoding='utf-8-sig')
-    print(f"结果已保存到 {filename}")
+def open_result_sink(filename='stock_pre_results.csv', top_k=50):
+    """结果逐条写入CSV（中途中断也保留已完成部分），内存中只保留收益率前top_k名"""
+    return ResultSink(filename, key='return', top_k=top_k,
+                      columns=['symbol', 'name', 'return', 'latest_price', 'date', 'criteria'])
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='StockPre 轻量级改进版（沪深300）')
+    parser.add_argument('--metrics', default=None, help='运行指标输出路径（JSON摘要，另写同名 .prom 文件）')
+    args = parser.parse_args()
+
     print("=== StockPre 轻量级改进版 ===")
     print("特点: 进度显示 + 结果保存 + 简单统计\n")
     
@@ -130,14 +132,9 @@ if __name__ == "__main__":
     end_date = datetime.now()
     start_date = end_date - timedelta(days=365)
 
-    try:
-        stock_code_name_df = ak.stock_info_a_code_name()
-        code_name_dict = dict(zip(stock_code_name_df['code'], stock_code_name_df['name']))
-    except Exception as e:
-        print(f"获取股票名称失败: {str(e)}")
-        code_name_dict = {}
+    code_name_dict = ReferenceData.get().names
 
-    results = []
+    sink = open_result_sink()
     failed_symbols = []
     total_symbols = len(symbols)
     
@@ -154,14 +151,20 @@ if __name__ == "__main__":
             progress = idx / total_symbols * 100
             print(f"进度: {idx}/{total_symbols} ({progress:.1f}%) - 已用时: {elapsed:.1f}秒")
         
-        df, success = fetch_stock_data(base_symbol, start_date, end_date)
-        if not success or df is None or df.empty:
-            failed_symbols.append(symbol)
-            continue
-                
-        df = calculate_indicators(df)
-        signals = generate_signals(df)
-        df = backtest_strategy(df, signals)
+        with Telemetry.symbol(symbol):
+            with Telemetry.timer('fetch_network'):
+                df, success = fetch_stock_data(base_symbol, start_date, end_date)
+            if not success or df is None or df.empty:
+                Telemetry.count('fetch_failures', kind='stock')
+                failed_symbols.append(symbol)
+                continue
+
+            with Telemetry.timer('indicators'):
+                df = calculate_indicators(df)
+            with Telemetry.timer('signals'):
+                signals = generate_signals(df)
+            with Telemetry.timer('backtest'):
+                df = backtest_strategy(df, signals)
         
         latest_signal = signals.iloc[-1]['signal']
         if latest_signal == 1:
@@ -175,7 +178,7 @@ if __name__ == "__main__":
             ]
             satisfied_conditions = [x for x in satisfied_conditions if x is not None]
             
-            results.append({
+            sink.add({
                 'symbol': symbol,
                 'name': stock_name,
                 'return': df['cum_returns'].iloc[-1],
@@ -184,10 +187,11 @@ if __name__ == "__main__":
                 'criteria': ' + '.join(satisfied_conditions)
             })
     
-    sorted_results = sorted(results, key=lambda x: x['return'], reverse=True)
+    sink.close()
+    sorted_results = sink.top()
     
     total_time = (datetime.now() - start_time).total_seconds()
-    success_count = len(results)
+    success_count = sink.count
     failed_count = len(failed_symbols)
     success_rate = (success_count / total_symbols * 100) if total_symbols > 0 else 0
     
@@ -206,6 +210,10 @@ if __name__ == "__main__":
     print(f"总用时: {total_time:.1f}秒")
     print(f"平均速度: {total_symbols/total_time:.2f} 只/秒")
     print("=" * 60)
+    Telemetry.report()
+    if args.metrics:
+        Telemetry.write(args.metrics)
+        print(f"运行指标已写入 {args.metrics}")
     
     if failed_symbols:
         print(f"\n失败股票列表（前20只）:")
@@ -214,5 +222,8 @@ if __name__ == "__main__":
         if len(failed_symbols) > 20:
             print(f"  ... 还有 {len(failed_symbols) - 20} 只")
     
-    save_results_to_csv(sorted_results)
+    if sink.count:
+        print(f"结果已保存到 {sink.path}")
+    else:
+        print("没有结果需要保存")
     print("\n=== StockPre 系统结束 ===")
@@ -7,6 +7,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 import traceback
 import threading
+from reference_data import ReferenceData
+from universe import Universe
 
 # ========== 数据获取模块 ==========
 def fetch_stock_data(symbol, start_date, end_date):
@@ -249,7 +251,7 @@ from concurrent.futures import ThreadPoolExecutor
 
 if __name__ == "__main__":
     # 预先获取全局共享数据
-    DataCache.stock_names = dict(zip(ak.stock_info_a_code_name()['code'], ak.stock_info_a_code_name()['name']))
+    DataCache.stock_names = ReferenceData.get().names
     
     # 预先获取宏观数据（每日仅更新一次）
     try:
@@ -306,12 +308,14 @@ if __name__ == "__main__":
     symbols = ["600489","600938","600919","601857","600600",
                "601088","002304","002007","600905","600048",
                "601872","601012","002737","600009","000538"]
+    # 可通过命令行指定其他股票池，如 python stockRanking.py csi500 或 watchlist:my_stocks.txt
+    if len(sys.argv) > 1:
+        symbols = [s.split('.')[0] for s in Universe.resolve(sys.argv[1])]
     end_date = datetime.now().strftime("%Y%m%d")
     start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
     
-    # 获取股票名称映射
-    stock_code_name_df = ak.stock_info_a_code_name()
-    code_name_dict = dict(zip(stock_code_name_df['code'], stock_code_name_df['name']))
+    # 获取股票名称映射（复用已加载的参考数据，不再重复下载全市场列表）
+    code_name_dict = DataCache.stock_names
 
     def process_symbol(symbol):
         try:
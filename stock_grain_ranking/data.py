@@ -1,10 +1,11 @@
 import pandas as pd
 import sys
 import os
-import akshare as ak
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_resilient import DataResilient
 from cache_manager import CacheManager
+from reference_data import ReferenceData
 from datetime import datetime, timedelta
 
 class DataFetcher:
@@ -29,12 +30,15 @@ class DataCache:
         CacheManager.initialize()
         
         try:
-            DataCache.macro_data = {
-                'cpi': DataResilient.fetch_macro_data('cpi', use_cache=True),
-                'fx': DataResilient.fetch_macro_data('fx', use_cache=True),
-                'pmi': DataResilient.fetch_macro_data('pmi', use_cache=True),
-                'gdp': DataResilient.fetch_macro_data('gdp', use_cache=True)
-            }
+            # 四类宏观数据与股票名称表互不依赖，并发加载
+            with ThreadPoolExecutor(max_workers=5) as executor:
+                macro_futures = {
+                    data_type: executor.submit(DataResilient.fetch_macro_data, data_type, use_cache=True)
+                    for data_type in ('cpi', 'fx', 'pmi', 'gdp')
+                }
+                reference_future = executor.submit(ReferenceData.get)
+                DataCache.macro_data = {data_type: future.result() for data_type, future in macro_futures.items()}
+                reference = reference_future.result()
             
             if DataCache.macro_data['cpi'].empty:
                 print("警告：CPI数据获取失败，使用默认值")
@@ -62,9 +66,7 @@ class DataCache:
                 else:
                     gdp_df = pd.DataFrame({'季度日期': [pd.Timestamp.now()]})
             
-            stock_info = DataResilient.get_stock_info(use_cache=True)
-            if not stock_info.empty:
-                cls.stock_names = dict(zip(stock_info['code'], stock_info['name']))
+            cls.stock_names = reference.names
         except Exception as e:
             print(f"数据初始化失败: {e}")
             cls.stock_names = {}
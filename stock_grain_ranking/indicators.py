@@ -1,36 +1,40 @@
-import pandas as pd
-import pandas_ta as ta
+# pandas_ta 输出列 → 策略使用的列名（只取这些列写入原表，不再整表 concat 复制）
+PANDAS_TA_COLUMNS = {
+    'MACD_12_26_9': 'macd',
+    'MACDs_12_26_9': 'macd_signal',
+    'MACDh_12_26_9': 'macd_hist',
+    'BBL_20_2.0': 'boll_lower',
+    'BBM_20_2.0': 'boll_mid',
+    'BBU_20_2.0': 'boll_upper'
+}
 
 """指标计算模块"""
 class IndicatorsCalculator:
     @staticmethod
     def calculate_indicators(df):
         """计算技术指标：均线、MACD、RSI、BOLL、成交量"""
+        import pandas_ta  # noqa: F401  首次计算时才导入，注册 df.ta 访问器
         # 均线
         df['ma5'] = df.ta.sma(length=5)
         df['ma20'] = df.ta.sma(length=20)
 
         # MACD
         macd = df.ta.macd(fast=12, slow=26, signal=9)
-        df = pd.concat([df, macd], axis=1)
+        for column, name in PANDAS_TA_COLUMNS.items():
+            if column in macd:
+                df[name] = macd[column]
 
         # RSI
         df['rsi'] = df.ta.rsi(length=14)
 
         # BOLL
         boll = df.ta.bbands(length=20)
-        df = pd.concat([df, boll], axis=1)
+        for column, name in PANDAS_TA_COLUMNS.items():
+            if column in boll:
+                df[name] = boll[column]
 
         # 成交量指标
         df['volume_ma3'] = df['volume'].rolling(window=3).mean()
         df['volume_pct_change'] = (df['volume'] / df['volume_ma3'].shift(1)) - 1
 
-        # 重命名列
-        return df.rename(columns={
-            'MACD_12_26_9': 'macd',
-            'MACDs_12_26_9': 'macd_signal',
-            'MACDh_12_26_9': 'macd_hist',
-            'BBL_20_2.0': 'boll_lower',
-            'BBM_20_2.0': 'boll_mid',
-            'BBU_20_2.0': 'boll_upper'
-        }).dropna()
\ No newline at end of file
+        return df.dropna()
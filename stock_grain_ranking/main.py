@@ -1,5 +1,6 @@
 import argparse
 import re
+import sys
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
@@ -8,78 +9,157 @@ from indicators import IndicatorsCalculator
 from signals import SignalGenerator
 from backtest import BacktestStrategy
 from data import DataCache
-import akshare as ak
+from data_resilient import DataResilient
 from threading import Lock
 import numpy as np
+from scan_pipeline import StagedPipeline
+from scan_checkpoint import ScanCheckpoint
+from result_store import ResultStore, grain_record
+from telemetry import Telemetry
+from universe import Universe
+from scan_fingerprint import ScanFingerprint, code_version, data_version
 
 print_lock = Lock()
 
+# 评分权重或信号规则变化时递增，结果库按版本区分历史记录
+STRATEGY_VERSION = 'grain-v1'
+
+# 随评分结果一并返回的最新指标值
+INDICATOR_COLUMNS = ['close', 'ma5', 'ma20', 'macd', 'macd_signal', 'macd_hist', 'rsi',
+                     'boll_lower', 'boll_mid', 'boll_upper', 'volume_pct_change']
+
+
+def _init_worker(macro_data):
+    """计算进程初始化：注入主进程已加载的宏观数据，供 get_macro_score 使用"""
+    DataCache.macro_data = macro_data
+
+
 """主执行模块"""
 class MainExecutor:
     @staticmethod
-    def run(symbols, start_date, end_date):
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            for symbol in symbols:
-                executor.submit(MainExecutor.process_symbol, symbol, start_date, end_date)
+    def run(symbols, start_date, end_date, io_workers=8, compute_workers=None, queue_size=32, checkpoint=None,
+            store=None, memory_budget_mb=None, trace_alloc=False, fingerprints=None):
+        # 取数在I/O线程中进行，指标/信号/回测在计算进程中进行，互不争抢GIL
+        pipeline = StagedPipeline(
+            fetch_fn=lambda symbol: DataFetcher.fetch_stock_data(symbol, start_date, end_date),
+            compute_fn=MainExecutor.analyze,
+            io_workers=io_workers,
+            compute_workers=compute_workers,
+            queue_size=queue_size,
+            initializer=_init_worker,
+            initargs=(DataCache.macro_data,),
+            memory_budget_mb=memory_budget_mb,
+            trace_alloc=trace_alloc,
+            reuse_fn=fingerprints.reuse if fingerprints else None
+        )
+        if checkpoint is None:
+            checkpoint = ScanCheckpoint.start('grain', {
+                'symbols': list(symbols),
+                'start_date': start_date.strftime('%Y%m%d'),
+                'end_date': end_date.strftime('%Y%m%d'),
+            })
+            print(f"运行ID: {checkpoint.run_id}（中断后可用 --resume {checkpoint.run_id} 继续）")
+        if store is not None:
+            store.start_run('grain', STRATEGY_VERSION, run_id=checkpoint.run_id,
+                            run_date=end_date.strftime('%Y-%m-%d'), universe=checkpoint.meta.get('universe'),
+                            params={'start_date': start_date.strftime('%Y%m%d')})
 
-    @staticmethod
-    def process_symbol(symbol, start_date, end_date):
+        # 已完成的股票直接输出日志中的结果
+        for symbol in symbols:
+            result = checkpoint.completed.get(symbol)
+            if result is not None:
+                print(MainExecutor.format_output(symbol, DataCache.stock_names.get(symbol, ""), start_date, end_date, result))
+
+        stream = pipeline.run(checkpoint.pending(symbols))
         try:
-            stock_info = ak.stock_info_a_code_name()
-            code_name_dict = dict(zip(stock_info['code'], stock_info['name']))
-            stock_name = code_name_dict.get(symbol, "")
-            df = DataFetcher.fetch_stock_data(symbol, start_date, end_date)
+            for symbol, result, error in stream:
+                if error is not None:
+                    print(f"处理{symbol}时发生错误: {str(error)}")
+                    checkpoint.record_error(symbol, error)
+                    continue
+                if fingerprints is not None:
+                    fingerprints.record(symbol, result)
+                checkpoint.record(symbol, result)
+                stock_name = DataCache.stock_names.get(symbol, "")
+                if store is not None:
+                    store.add(checkpoint.run_id, grain_record(symbol, stock_name, result))
+                with print_lock:
+                    print(MainExecutor.format_output(symbol, stock_name, start_date, end_date, result))
+        except KeyboardInterrupt:
+            print(f"\n扫描已中断，已完成 {len(checkpoint.completed)}/{len(symbols)} 只，可用 --resume {checkpoint.run_id} 继续")
+            sys.exit(1)
+        finally:
+            stream.close()
+            checkpoint.close()
+            if store is not None:
+                store.close()
+            if fingerprints is not None:
+                fingerprints.close()
+        checkpoint.finish()
+        if fingerprints is not None:
+            print(f"增量扫描: {fingerprints.hits} 只股票输入未变，复用上次结果")
+
+    @staticmethod
+    def analyze(symbol, df):
+        """单只股票的指标、信号、回测计算，返回最新一期的评分结果"""
+        with Telemetry.timer('indicators'):
             df = IndicatorsCalculator.calculate_indicators(df)
+        with Telemetry.timer('signals'):
             signals = SignalGenerator.generate_signals(df)
+        with Telemetry.timer('backtest'):
             df = BacktestStrategy.backtest(df, signals)
-                
-            latest_signal = signals.iloc[-1]['signal']
-            latest_date = signals.index[-1].strftime('%Y-%m-%d')
-            latest_price = df['close'].iloc[-1]
-                
-            # 买卖建议
-            action = "持有"
-            if latest_signal == 1:
-                action = "★★★ 买入 ★★★"
-            elif latest_signal == -1:
-                action = "▼▼▼ 卖出 ▼▼▼"
-                
-                # 评分详情
-            latest_score = signals.iloc[-1]
-                
-                # 在生成信号后获取动态阈值
+
+        # 在生成信号后获取动态阈值
+        with Telemetry.timer('threshold'):
             buy_threshold, sell_threshold = SignalGenerator.dynamic_threshold(df)
-                
-                # 构建输出内容（原所有print语句改为列表追加）
-            output = [
-                    "\n" + "="*40,
-                    f"股票名称: {stock_name}({symbol})",
-                    f"数据期间: {start_date} 至 {end_date}",
-                    f"\n【{latest_date} 操作建议】{action}",
-                    f"当前价格: {latest_price:.2f}",
-                     "\n【多维评分系统】",
-                    f"买入评分: {latest_score['buy_score']:.2f}/1.00  (当前阈值: {buy_threshold:.2f})",
-                    f"卖出压力: {latest_score['sell_pressure']:.2f}/1.00  (当前阈值: {sell_threshold:.2f})",
-                    "\n买入评分构成：",
-                    f"MACD动量(0.3): {latest_score['macd_momentum']:.2f}",
-                    f"BOLL通道(0.2): {latest_score['boll_score']:.2f}",
-                    f"RSI背离(0.15): {latest_score['rsi_divergence']:.2f}",
-                    f"量价配合(0.2): {latest_score['volume_score']:.2f}",
-                    f"宏观因子(0.15): {latest_score['macro_score']:.2f}",
-                    "\n卖出压力构成：",
-                    f"趋势衰减(0.1): {latest_score['trend_decay']:.2f}",
-                    f"超买系数(0.1): {latest_score['overbought']:.2f}", 
-                    f"资金流出(0.1): {latest_score['capital_outflow']:.2f}",
-                    f"回撤压力(0.1): {latest_score['drawdown_pressure']:.2f}",
-                    f"\n累计收益率: {df['cum_returns'].iloc[-1]:.2%}",
-                    "="*40
-                ]
-                # 原子化输出
-            with print_lock:
-                print('\n'.join(output))
-                
-        except Exception as e:
-            print(f"处理{symbol}时发生错误: {str(e)}")
+        return {
+            'latest_signal': signals.iloc[-1]['signal'],
+            'latest_date': signals.index[-1].strftime('%Y-%m-%d'),
+            'latest_price': df['close'].iloc[-1],
+            'latest_score': signals.iloc[-1].to_dict(),
+            'buy_threshold': buy_threshold,
+            'sell_threshold': sell_threshold,
+            'cum_return': df['cum_returns'].iloc[-1],
+            'latest_indicators': df[INDICATOR_COLUMNS].iloc[-1].to_dict(),
+        }
+
+    @staticmethod
+    def format_output(symbol, stock_name, start_date, end_date, result):
+        # 买卖建议
+        action = "持有"
+        if result['latest_signal'] == 1:
+            action = "★★★ 买入 ★★★"
+        elif result['latest_signal'] == -1:
+            action = "▼▼▼ 卖出 ▼▼▼"
+
+        # 评分详情
+        latest_score = result['latest_score']
+        buy_threshold, sell_threshold = result['buy_threshold'], result['sell_threshold']
+
+        output = [
+            "\n" + "="*40,
+            f"股票名称: {stock_name}({symbol})",
+            f"数据期间: {start_date} 至 {end_date}",
+            f"\n【{result['latest_date']} 操作建议】{action}",
+            f"当前价格: {result['latest_price']:.2f}",
+             "\n【多维评分系统】",
+            f"买入评分: {latest_score['buy_score']:.2f}/1.00  (当前阈值: {buy_threshold:.2f})",
+            f"卖出压力: {latest_score['sell_pressure']:.2f}/1.00  (当前阈值: {sell_threshold:.2f})",
+            "\n买入评分构成：",
+            f"MACD动量(0.3): {latest_score['macd_momentum']:.2f}",
+            f"BOLL通道(0.2): {latest_score['boll_score']:.2f}",
+            f"RSI背离(0.15): {latest_score['rsi_divergence']:.2f}",
+            f"量价配合(0.2): {latest_score['volume_score']:.2f}",
+            f"宏观因子(0.15): {latest_score['macro_score']:.2f}",
+            "\n卖出压力构成：",
+            f"趋势衰减(0.1): {latest_score['trend_decay']:.2f}",
+            f"超买系数(0.1): {latest_score['overbought']:.2f}", 
+            f"资金流出(0.1): {latest_score['capital_outflow']:.2f}",
+            f"回撤压力(0.1): {latest_score['drawdown_pressure']:.2f}",
+            f"\n累计收益率: {result['cum_return']:.2%}",
+            "="*40
+        ]
+        return '\n'.join(output)
 
    
 
@@ -105,14 +185,54 @@ def parse_quarter(row):
     return pd.Timestamp(f'{today.year}-{(today.quarter-1)*3+1:02d}-01')
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='股票策略系统')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（多个代码用空格分隔，例如：600489 601088）')
+    parser.add_argument('-u', '--universe', help='股票池（代替 -s）：hs300/csi500/csi1000/all/watchlist:文件/sector:板块名，可用+组合')
+    parser.add_argument('-b', '--begin', help='开始日期（格式：YYYYMMDD）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--io-workers', type=int, default=8, help='取数线程数（默认8）')
+    parser.add_argument('--compute-workers', type=int, default=None, help='计算进程数（默认CPU核数，0为主进程串行）')
+    parser.add_argument('--queue-size', type=int, default=32, help='取数与计算之间的队列长度（背压上限）')
+    parser.add_argument('--resume', metavar='RUN_ID', help='从中断的运行继续，沿用原股票列表与日期区间')
+    parser.add_argument('--offline', action='store_true', help='离线模式：只使用本地缓存，不联网')
+    parser.add_argument('--adjust', choices=['qfq', 'hfq', 'none'], default='qfq', help='复权方式：qfq前复权（默认）/ hfq后复权 / none不复权')
+    parser.add_argument('--store', default=None, help='历史结果库路径（默认 cache/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不写入历史结果库')
+    parser.add_argument('--metrics', default=None, help='运行指标输出路径（JSON摘要，另写同名 .prom 文件）')
+    parser.add_argument('--memory-budget', type=float, default=None, help='主进程内存预算（MB），超出时暂停取数')
+    parser.add_argument('--trace-alloc', action='store_true', help='记录每只股票计算期间的内存分配峰值（计算约慢一倍；需计算进程，--compute-workers 0 时忽略）')
+    parser.add_argument('--full', action='store_true', help='全量重算（不复用输入未变股票的上次结果）')
+    args = parser.parse_args()
+
+    checkpoint = None
+    if args.resume:
+        checkpoint = ScanCheckpoint.resume(args.resume)
+        args.symbols = checkpoint.meta['symbols']
+        args.begin, args.end = checkpoint.meta['start_date'], checkpoint.meta['end_date']
+        print(f"续跑 {checkpoint.run_id}: 已完成 {len(checkpoint.completed)}/{len(args.symbols)} 只")
+    elif not (args.symbols or args.universe) or not args.begin:
+        parser.error("需要指定 -s/--symbols（或 -u/--universe）与 -b/--begin，或使用 --resume RUN_ID")
+
+    # 离线模式需在加载宏观数据前生效
+    DataResilient.set_offline(args.offline)
+    DataResilient.set_adjust(args.adjust)
+
     # 初始化数据缓存
     DataCache.initialize()
 
+    if args.universe and not args.resume:
+        # 本系统使用不带交易所后缀的代码
+        universe_symbols = [s.split('.')[0] for s in Universe.resolve(args.universe)]
+        args.symbols = list(dict.fromkeys((args.symbols or []) + universe_symbols))
+        print(f"股票池 {args.universe}: {len(args.symbols)} 只")
+
     # 初始化GDP数据
     gdp_df = DataCache.macro_data.get('gdp')
     if gdp_df is None or gdp_df.empty:
         try:
-            gdp_df = ak.macro_china_gdp()
+            gdp_df = DataResilient.fetch_macro_data('gdp', use_cache=False)
+            if gdp_df.empty:
+                raise ValueError("GDP数据为空")
             DataCache.macro_data['gdp'] = gdp_df
         except Exception as e:
             print(f"GDP数据加载失败: {str(e)}")
@@ -189,15 +309,22 @@ if __name__ == "__main__":
         quarter = row['季度'].replace("年第", "Q").replace("季度", "")
         # 修正单位转换（原数据单位为亿元，1万亿=10000亿）
         print(f"{quarter}: 同比{row['国内生产总值-同比增长']:.2f}% 绝对值{row['国内生产总值-绝对值']/1e4:.2f}万亿")
-
-    parser = argparse.ArgumentParser(description='股票策略系统')
-    parser.add_argument('-s', '--symbols', required=True, nargs='+', help='股票代码列表（多个代码用空格分隔，例如：600489 601088）')
-    parser.add_argument('-b', '--begin', required=True, help='开始日期（格式：YYYYMMDD）')
-    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
-    args = parser.parse_args()
     
     # 转换日期参数为datetime对象
     start_date = datetime.strptime(args.begin, '%Y%m%d')
     end_date = datetime.strptime(args.end, '%Y%m%d')
     
-    MainExecutor.run(args.symbols, start_date, end_date)
+    MainExecutor.run(args.symbols, start_date, end_date, io_workers=args.io_workers,
+                     compute_workers=args.compute_workers, queue_size=args.queue_size, checkpoint=checkpoint,
+                     store=None if args.no_store else ResultStore(args.store),
+                     memory_budget_mb=args.memory_budget, trace_alloc=args.trace_alloc,
+                     fingerprints=None if args.full else ScanFingerprint(
+                         'grain', params={'version': STRATEGY_VERSION, 'adjust': args.adjust},
+                         code=code_version(IndicatorsCalculator, SignalGenerator, BacktestStrategy, MainExecutor.analyze),
+                         macro=data_version(DataCache.macro_data)))
+
+    Telemetry.record_memory()
+    Telemetry.report()
+    if args.metrics:
+        Telemetry.write(args.metrics)
+        print(f"运行指标已写入 {args.metrics}")
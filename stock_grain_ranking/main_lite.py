@@ -8,7 +8,7 @@ from indicators import IndicatorsCalculator
 from signals import SignalGenerator
 from backtest import BacktestStrategy
 from data import DataCache
-import akshare as ak
+from data_resilient import DataResilient
 from threading import Lock
 import numpy as np
 
@@ -116,7 +116,9 @@ if __name__ == "__main__":
     gdp_df = DataCache.macro_data.get('gdp')
     if gdp_df is None or gdp_df.empty:
         try:
-            gdp_df = ak.macro_china_gdp()
+            gdp_df = DataResilient.fetch_macro_data('gdp', use_cache=False)
+            if gdp_df.empty:
+                raise ValueError("GDP数据为空")
             DataCache.macro_data['gdp'] = gdp_df
         except Exception as e:
             print(f"GDP数据加载失败: {str(e)}")
@@ -0,0 +1,312 @@
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+from data import DataFetcher, DataCache
+from data_resilient import DataResilient
+from main import MainExecutor, _init_worker
+from price_store import PriceStore
+from scan_fingerprint import data_version
+from scan_pipeline import StagedPipeline
+
+# 判定休市所需的样本数：连续这么多只股票取数成功且都没有新K线才认为当天未开市（个别停牌不影响）
+CLOSED_PROBES = 5
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _sanitize(value):
+    """NaN/inf 不是合法JSON，转为 null"""
+    if isinstance(value, dict):
+        return {key: _sanitize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_sanitize(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+"""常驻评分服务：行情、指标结果与宏观数据常驻内存，收盘后增量更新，单只查询直接命中内存"""
+class ScoringService:
+    def __init__(self, lookback_days: int = 365, refresh_time: str = '15:30',
+                 io_workers: int = 8, compute_workers: int = None):
+        self.lookback_days = lookback_days
+        self.refresh_time = refresh_time
+        self.io_workers = io_workers
+        self.compute_workers = compute_workers
+        self.bars = {}       # symbol -> 日线DataFrame
+        self.results = {}    # symbol -> (计算所用最后一根K线日期, 评分结果)
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pool = None            # 常驻计算进程池，宏观数据变化时重建
+        self._pool_version = None
+        self._pool_lock = threading.Lock()
+
+    def start_date(self):
+        return datetime.now() - timedelta(days=self.lookback_days)
+
+    def load(self):
+        """加载宏观数据与参考数据（每个服务进程只做一次）"""
+        DataCache.initialize()
+
+    # ========== 查询 ==========
+    def score(self, symbols) -> dict:
+        """返回各股票最新评分；未缓存或K线有更新的股票批量计算"""
+        stale = [s for s in symbols if not self._is_fresh(s)]
+        if stale:
+            self._compute(stale)
+        output = {}
+        for symbol in symbols:
+            entry = self.results.get(symbol)
+            if entry is None:
+                output[symbol] = {'error': '无可用数据'}
+                continue
+            result = dict(entry[1])
+            result['name'] = DataCache.stock_names.get(symbol, "")
+            result.pop('latest_indicators', None)
+            output[symbol] = result
+        return output
+
+    def indicators(self, symbol) -> dict:
+        """最新一根K线的技术指标值"""
+        if not self._is_fresh(symbol):
+            self._compute([symbol])
+        entry = self.results.get(symbol)
+        if entry is None:
+            return {'error': '无可用数据'}
+        return {'symbol': symbol, 'date': entry[1]['latest_date'], **entry[1]['latest_indicators']}
+
+    def screen(self, symbols, signal: int = 1, top: int = 20) -> list:
+        """对股票池评分，按信号过滤后按买入评分降序返回前top只"""
+        scores = self.score(symbols)
+        rows = [
+            {'symbol': symbol, 'name': result['name'], 'latest_signal': result['latest_signal'],
+             'buy_score': result['latest_score']['buy_score'], 'sell_pressure': result['latest_score']['sell_pressure'],
+             'latest_price': result['latest_price'], 'cum_return': result['cum_return']}
+            for symbol, result in scores.items()
+            if 'error' not in result and (signal is None or result['latest_signal'] == signal)
+        ]
+        rows.sort(key=lambda row: row['buy_score'], reverse=True)
+        return rows[:top] if top else rows
+
+    def status(self) -> dict:
+        return {
+            'resident_symbols': len(self.bars),
+            'scored_symbols': len(self.results),
+            'last_refresh': self.last_refresh,
+            'macro_loaded': sorted(k for k, v in DataCache.macro_data.items() if v is not None and not v.empty),
+            'offline': DataResilient.OFFLINE,
+        }
+
+    # ========== 计算 ==========
+    def _is_fresh(self, symbol) -> bool:
+        entry, bars = self.results.get(symbol), self.bars.get(symbol)
+        return entry is not None and bars is not None and entry[0] == bars.index[-1]
+
+    def _fetch(self, symbol):
+        """I/O线程中执行：已常驻的行情直接复用，否则读缓存/联网并常驻"""
+        bars = self.bars.get(symbol)
+        if bars is None:
+            bars = DataFetcher.fetch_stock_data(symbol, self.start_date(), datetime.now())
+            if bars is not None and not bars.empty:
+                with self._lock:
+                    self.bars[symbol] = bars
+        return bars.copy() if bars is not None else None
+
+    def _executor(self):
+        """服务生命周期内共用一个进程池；宏观数据更新后子进程中的副本已过期，关闭旧池重建"""
+        version = data_version(DataCache.macro_data)
+        with self._pool_lock:
+            if self._pool is None or self._pool_version != version:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                workers = self.compute_workers or os.cpu_count() or 1
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(DataCache.macro_data,))
+                self._pool_version = version
+            return self._pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    def _compute(self, symbols):
+        """复用分级流水线：取数在I/O线程，指标/信号/回测在常驻进程池（少量股票时在本进程内计算）"""
+        use_pool = len(symbols) > 4 and self.compute_workers != 0
+        pipeline = StagedPipeline(
+            fetch_fn=self._fetch,
+            compute_fn=MainExecutor.analyze,
+            io_workers=self.io_workers,
+            compute_workers=(self.compute_workers or os.cpu_count() or 1) if use_pool else 0,
+            initializer=_init_worker,
+            initargs=(DataCache.macro_data,),
+            executor=self._executor() if use_pool else None
+        )
+        for symbol, result, error in pipeline.run(symbols):
+            if error is not None:
+                print(f"处理{symbol}时发生错误: {str(error)}")
+                continue
+            with self._lock:
+                self.results[symbol] = (self.bars[symbol].index[-1], result)
+
+    # ========== 收盘后增量更新 ==========
+    def refresh(self):
+        """常驻股票经原始行情库增量拉取新K线；出现除权除息时复权价格整体重算，因此整段替换常驻行情"""
+        if DataResilient.OFFLINE or not self.bars:
+            return 0
+        with self._refresh_lock:
+            start_date = self.start_date().strftime('%Y%m%d')
+            end_date = datetime.now().strftime('%Y%m%d')
+            updated, unchanged, failed = [], 0, 0
+            closed = False
+            for symbol, bars in list(self.bars.items()):
+                if (bars.index[-1] + timedelta(days=1)).strftime('%Y%m%d') > end_date:
+                    continue
+                try:
+                    new_bars = PriceStore.load(symbol, start_date, end_date, DataResilient.ADJUST, max_retries=0)
+                except Exception as e:
+                    print(f"增量更新 {symbol} 失败: {str(e)}")
+                    failed += 1
+                    continue
+                if new_bars is None or new_bars.empty or new_bars.index[-1] <= bars.index[-1]:
+                    # 取数成功的前几只股票都没有新K线才判定当天未开市（单只停牌不足以判断），其余股票无需再查
+                    unchanged += 1
+                    if not updated and unchanged >= CLOSED_PROBES:
+                        closed = True
+                        break
+                    continue
+                with self._lock:
+                    self.bars[symbol] = new_bars
+                updated.append(symbol)
+
+            # 宏观数据按缓存有效期自动判断是否重新下载
+            DataCache.initialize()
+            if updated:
+                self._compute(updated)
+            now = datetime.now().isoformat(timespec='seconds')
+            # 有取数失败时不记录完成时间，调度线程稍后重试（已更新的股票不会重复下载）
+            if closed or not failed:
+                self.last_refresh = now
+            print(f"[{now}] 增量更新 {len(updated)}/{len(self.bars)} 只股票"
+                  f"{'（判定当天未开市）' if closed else ''}{f'，{failed} 只取数失败，稍后重试' if failed else ''}")
+            return len(updated)
+
+    def run_scheduler(self, interval: int = 60):
+        """后台线程：交易日收盘后（refresh_time之后）每天增量更新一次"""
+        def loop():
+            while True:
+                now = datetime.now()
+                done_today = self.last_refresh is not None and self.last_refresh[:10] == now.strftime('%Y-%m-%d')
+                if now.weekday() < 5 and now.strftime('%H:%M') >= self.refresh_time and not done_today:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        print(f"增量更新失败: {str(e)}")
+                time.sleep(interval)
+        threading.Thread(target=loop, daemon=True).start()
+
+
+def make_handler(service: ScoringService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, payload, status=200):
+            body = json.dumps(_sanitize(payload), ensure_ascii=False, default=_json_default,
+                              allow_nan=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _symbols(self, query):
+            values = query.get('symbols') or query.get('symbol') or []
+            return [s.split('.')[0] for value in values for s in value.split(',') if s]
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            start = time.perf_counter()
+            try:
+                if url.path == '/score':
+                    payload = service.score(self._symbols(query))
+                elif url.path == '/indicators':
+                    payload = {s: service.indicators(s) for s in self._symbols(query)}
+                elif url.path == '/screen':
+                    universe = query.get('universe', ['hs300'])[0]
+                    symbols = ([s.split('.')[0] for s in DataFetcher.get_hs300_symbols()]
+                               if universe == 'hs300' else self._symbols({'symbols': [universe]}))
+                    signal = query.get('signal', ['1'])[0]
+                    payload = service.screen(symbols, signal=None if signal == 'all' else int(signal),
+                                             top=int(query.get('top', ['20'])[0]))
+                elif url.path == '/health':
+                    payload = service.status()
+                else:
+                    return self._send({'error': f'未知接口: {url.path}'}, 404)
+            except Exception as e:
+                return self._send({'error': str(e)}, 500)
+            self._send({'data': payload, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/refresh':
+                return self._send({'error': f'未知接口: {self.path}'}, 404)
+            self._send({'data': {'updated': service.refresh()}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='多维评分常驻服务（HTTP/JSON）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认仅本机）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--lookback', type=int, default=365, help='常驻行情的回看天数')
+    parser.add_argument('--refresh-time', default='15:30', help='交易日增量更新时间（HH:MM）')
+    parser.add_argument('--warm', nargs='*', help='启动时预热的股票（hs300 或代码列表）')
+    parser.add_argument('--io-workers', type=int, default=8, help='取数线程数（默认8）')
+    parser.add_argument('--compute-workers', type=int, default=None, help='批量计算进程数（默认CPU核数）')
+    parser.add_argument('--offline', action='store_true', help='离线模式：只使用本地缓存，不联网')
+    parser.add_argument('--adjust', choices=['qfq', 'hfq', 'none'], default='qfq', help='复权方式：qfq前复权（默认）/ hfq后复权 / none不复权')
+    args = parser.parse_args()
+
+    DataResilient.set_offline(args.offline)
+    DataResilient.set_adjust(args.adjust)
+    service = ScoringService(lookback_days=args.lookback, refresh_time=args.refresh_time,
+                             io_workers=args.io_workers, compute_workers=args.compute_workers)
+    service.load()
+
+    if args.warm:
+        warm = ([s.split('.')[0] for s in DataFetcher.get_hs300_symbols()]
+                if args.warm == ['hs300'] else args.warm)
+        start = time.time()
+        service.score(warm)
+        print(f"预热 {len(service.results)}/{len(warm)} 只股票, 用时 {time.time() - start:.1f}秒")
+
+    service.run_scheduler()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"评分服务已启动: http://{args.host}:{args.port}  (/score /indicators /screen /health, POST /refresh)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+        server.server_close()
+        service.close()
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from data import DataCache
+from telemetry import Telemetry
 
 """信号生成模块"""
 class SignalGenerator:
@@ -47,8 +48,11 @@ class SignalGenerator:
         signals['rsi_divergence'] = (df['rsi'] < 30).astype(int) * 0.15
         signals['volume_score'] = (df['volume_pct_change'] > 0.2).astype(int) * 0.2
         
-        # 修改宏观评分计算
-        signals['macro_score'] = df.index.map(lambda x: SignalGenerator.get_macro_score(x))
+        # 宏观评分只与日期有关：每个交易日计算一次再展开（分钟线每天240行共用一个值）
+        with Telemetry.timer('macro_score'):
+            codes, dates = pd.factorize(df.index.normalize())
+            scores = np.array([SignalGenerator.get_macro_score(date) for date in dates], dtype=float)
+            signals['macro_score'] = scores[codes]
         
         # 总买入评分
         signals['buy_score'] = signals[['macd_momentum','boll_score','rsi_divergence','volume_score','macro_score']].sum(axis=1)
@@ -5,7 +5,10 @@ from backtest import Backtest
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import akshare as ak
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reference_data import ReferenceData
 
 if __name__ == "__main__":
     symbols = DataFetcher.get_hs300_symbols()
@@ -15,8 +18,7 @@ if __name__ == "__main__":
     end_date = datetime.now().strftime("%Y%m%d")
     start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")
 
-    stock_code_name_df = ak.stock_info_a_code_name()
-    code_name_dict = dict(zip(stock_code_name_df['code'], stock_code_name_df['name']))
+    code_name_dict = ReferenceData.get().names
 
     results = []
     
@@ -0,0 +1,337 @@
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 延迟直方图的桶上界（秒），覆盖缓存读取（毫秒级）到联网重试（数十秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 单只股票计算期间内存分配峰值直方图的桶上界（MB）
+ALLOC_BUCKETS_MB = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 250.0, 500.0)
+
+# 每个阶段保留的最慢股票数
+SLOWEST_KEEP = 10
+
+PROMETHEUS_PREFIX = 'stockscience'
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存（Linux 读 /proc，其他平台退化为历史峰值）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """进程（或已结束子进程中最大者）的常驻内存峰值；macOS 的 ru_maxrss 单位为字节，Linux 为KB"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+"""单个阶段的直方图（累计桶计数 + 总数/总和/最大值），默认为延迟（秒）"""
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.bounds):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, data: dict):
+        self.buckets = [a + b for a, b in zip(self.buckets, data['buckets'])]
+        self.count += data['count']
+        self.sum += data['sum']
+        self.max = max(self.max, data['max'])
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.buckets):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {'buckets': list(self.buckets), 'count': self.count, 'sum': self.sum, 'max': self.max}
+
+
+"""进程内运行指标：各阶段耗时直方图、计数器（缓存命中/未命中/字节数、重试次数等）、各阶段最慢股票，
+以及单只股票的内存分配峰值与进程内存水位"""
+class Telemetry:
+    _lock = threading.Lock()
+    _local = threading.local()
+    histograms = {}   # stage -> Histogram
+    counters = {}     # (name, ((label, value), ...)) -> 数值
+    slowest = {}      # stage -> 最小堆 [(seconds, symbol)]
+    allocations = {}  # stage -> Histogram(ALLOC_BUCKETS_MB)
+    largest = {}      # stage -> 最小堆 [(MB, symbol)]
+    gauges = {}       # name -> 数值（内存水位等，合并时取最大值）
+    started = time.time()
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._clear()
+            cls.started = time.time()
+
+    @classmethod
+    def _after_fork(cls):
+        # fork出的计算进程可能继承到被I/O线程持有的锁，重建锁并清空从父进程复制来的指标
+        cls._lock = threading.Lock()
+        cls._clear()
+
+    @classmethod
+    def _clear(cls):
+        cls.histograms, cls.counters, cls.slowest = {}, {}, {}
+        cls.allocations, cls.largest, cls.gauges = {}, {}, {}
+
+    # ========== 记录 ==========
+    @classmethod
+    @contextmanager
+    def symbol(cls, symbol: str):
+        """标记当前线程正在处理的股票，期间的阶段耗时会计入该股票"""
+        previous = getattr(cls._local, 'symbol', None)
+        cls._local.symbol = symbol
+        try:
+            yield
+        finally:
+            cls._local.symbol = previous
+
+    @classmethod
+    @contextmanager
+    def timer(cls, stage: str, symbol: str = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(stage, time.perf_counter() - start, symbol)
+
+    @classmethod
+    def observe(cls, stage: str, seconds: float, symbol: str = None):
+        symbol = symbol or getattr(cls._local, 'symbol', None)
+        with cls._lock:
+            histogram = cls.histograms.get(stage)
+            if histogram is None:
+                histogram = cls.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            if symbol is not None:
+                cls._push_top(cls.slowest, stage, seconds, symbol)
+
+    @classmethod
+    def observe_allocation(cls, stage: str, megabytes: float, symbol: str = None):
+        """记录一次计算期间的内存分配峰值（tracemalloc 测得）"""
+        symbol = symbol or getattr(cls._local, 'symbol', None)
+        with cls._lock:
+            histogram = cls.allocations.get(stage)
+            if histogram is None:
+                histogram = cls.allocations[stage] = Histogram(ALLOC_BUCKETS_MB)
+            histogram.observe(megabytes)
+            if symbol is not None:
+                cls._push_top(cls.largest, stage, megabytes, symbol)
+
+    @classmethod
+    def gauge(cls, name: str, value: float):
+        """记录水位类指标，保留最大值"""
+        with cls._lock:
+            cls.gauges[name] = max(cls.gauges.get(name, value), value)
+
+    @classmethod
+    def count(cls, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with cls._lock:
+            cls.counters[key] = cls.counters.get(key, 0) + value
+
+    @staticmethod
+    def _push_top(heaps, stage, value, symbol):
+        heap = heaps.setdefault(stage, [])
+        if len(heap) < SLOWEST_KEEP:
+            heapq.heappush(heap, (value, symbol))
+        elif value > heap[0][0]:
+            heapq.heapreplace(heap, (value, symbol))
+
+    @classmethod
+    def record_memory(cls):
+        """记录主进程与计算进程（已结束者）的常驻内存峰值"""
+        cls.gauge('peak_rss_mb', peak_rss_mb())
+        cls.gauge('children_peak_rss_mb', peak_rss_mb(children=True))
+
+    # ========== 跨进程合并 ==========
+    @classmethod
+    def drain(cls) -> dict:
+        """取出并清空本进程的原始指标（计算进程每个任务结束后回传给主进程）"""
+        with cls._lock:
+            data = {
+                'histograms': {stage: h.to_dict() for stage, h in cls.histograms.items()},
+                'counters': [[name, list(labels), value] for (name, labels), value in cls.counters.items()],
+                'slowest': {stage: list(heap) for stage, heap in cls.slowest.items()},
+                'allocations': {stage: h.to_dict() for stage, h in cls.allocations.items()},
+                'largest': {stage: list(heap) for stage, heap in cls.largest.items()},
+                'gauges': dict(cls.gauges),
+            }
+            cls._clear()
+        return data
+
+    @classmethod
+    def merge(cls, data: dict):
+        with cls._lock:
+            for stage, values in data['histograms'].items():
+                cls.histograms.setdefault(stage, Histogram()).merge(values)
+            for name, labels, value in data['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                cls.counters[key] = cls.counters.get(key, 0) + value
+            for stage, entries in data['slowest'].items():
+                for seconds, symbol in entries:
+                    cls._push_top(cls.slowest, stage, seconds, symbol)
+            for stage, values in data.get('allocations', {}).items():
+                cls.allocations.setdefault(stage, Histogram(ALLOC_BUCKETS_MB)).merge(values)
+            for stage, entries in data.get('largest', {}).items():
+                for megabytes, symbol in entries:
+                    cls._push_top(cls.largest, stage, megabytes, symbol)
+            for name, value in data.get('gauges', {}).items():
+                cls.gauges[name] = max(cls.gauges.get(name, value), value)
+
+    # ========== 导出 ==========
+    @classmethod
+    def summary(cls) -> dict:
+        """JSON运行摘要：各阶段次数/总耗时/均值/P50/P95/最大值与最慢股票，以及全部计数器"""
+        with cls._lock:
+            stages = {}
+            for stage, h in sorted(cls.histograms.items()):
+                stages[stage] = {
+                    'count': h.count,
+                    'total_s': round(h.sum, 4),
+                    'mean_ms': round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                    'p50_ms': round(h.quantile(0.5) * 1000, 3),
+                    'p95_ms': round(h.quantile(0.95) * 1000, 3),
+                    'max_ms': round(h.max * 1000, 3),
+                    'slowest': [{'symbol': symbol, 'ms': round(seconds * 1000, 3)}
+                                for seconds, symbol in sorted(cls.slowest.get(stage, []), reverse=True)],
+                }
+            allocations = {}
+            for stage, h in sorted(cls.allocations.items()):
+                allocations[stage] = {
+                    'count': h.count,
+                    'mean_mb': round(h.sum / h.count, 3) if h.count else 0.0,
+                    'p95_mb': round(h.quantile(0.95), 3),
+                    'max_mb': round(h.max, 3),
+                    'largest': [{'symbol': symbol, 'mb': round(mb, 3)}
+                                for mb, symbol in sorted(cls.largest.get(stage, []), reverse=True)],
+                }
+            gauges = {name: round(value, 3) for name, value in sorted(cls.gauges.items())}
+            counters = {}
+            for (name, labels), value in sorted(cls.counters.items()):
+                label_text = ','.join(f'{k}={v}' for k, v in labels)
+                counters[f'{name}{{{label_text}}}' if label_text else name] = value
+        return {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'wall_s': round(time.time() - cls.started, 3),
+            'stages': stages,
+            'allocations': allocations,
+            'counters': counters,
+            'gauges': gauges,
+        }
+
+    @classmethod
+    def to_prometheus(cls) -> str:
+        """Prometheus 文本格式（可交给 node_exporter 的 textfile collector 采集）"""
+        lines = [f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds histogram']
+        with cls._lock:
+            for stage, h in sorted(cls.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.buckets):
+                    cumulative += n
+                    lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            if cls.allocations:
+                lines.append(f'# TYPE {PROMETHEUS_PREFIX}_symbol_alloc_megabytes histogram')
+            for stage, h in sorted(cls.allocations.items()):
+                cumulative = 0
+                for bound, n in zip(ALLOC_BUCKETS_MB, h.buckets):
+                    cumulative += n
+                    lines.append(f'{PROMETHEUS_PREFIX}_symbol_alloc_megabytes_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PROMETHEUS_PREFIX}_symbol_alloc_megabytes_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{PROMETHEUS_PREFIX}_symbol_alloc_megabytes_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{PROMETHEUS_PREFIX}_symbol_alloc_megabytes_count{{stage="{stage}"}} {h.count}')
+
+            for name, value in sorted(cls.gauges.items()):
+                lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} gauge')
+                lines.append(f'{PROMETHEUS_PREFIX}_{name} {value:.3f}')
+
+            typed = set()
+            for (name, labels), value in sorted(cls.counters.items()):
+                metric = f'{PROMETHEUS_PREFIX}_{name}_total'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}')
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_run_wall_seconds gauge')
+        lines.append(f'{PROMETHEUS_PREFIX}_run_wall_seconds {time.time() - cls.started:.3f}')
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def write(cls, path: str):
+        """写出 JSON 摘要（path）与同名 .prom 文件，均先写临时文件再原子替换"""
+        base = os.path.splitext(path)[0]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        for target, content in ((path, json.dumps(cls.summary(), ensure_ascii=False, indent=2)),
+                                (base + '.prom', cls.to_prometheus())):
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, target)
+
+    @classmethod
+    def report(cls, top: int = 3):
+        """控制台输出各阶段耗时、缓存命中率与最慢股票"""
+        summary = cls.summary()
+        print(f"\n=== 阶段耗时 (墙钟 {summary['wall_s']:.1f}秒) ===")
+        print(f"{'阶段':<16}{'次数':>8}{'总耗时(秒)':>12}{'均值(ms)':>10}{'P95(ms)':>10}{'最大(ms)':>10}  最慢股票")
+        for stage, s in summary['stages'].items():
+            slowest = ', '.join(f"{item['symbol']}({item['ms']:.0f}ms)" for item in s['slowest'][:top])
+            print(f"{stage:<16}{s['count']:>8}{s['total_s']:>12.2f}{s['mean_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                  f"{s['max_ms']:>10.2f}  {slowest}")
+        hits = sum(v for (name, _), v in cls.counters.items() if name == 'cache_hits')
+        misses = sum(v for (name, _), v in cls.counters.items() if name == 'cache_misses')
+        if hits or misses:
+            print(f"缓存命中率: {hits / (hits + misses):.1%} (命中{hits:.0f} / 未命中{misses:.0f})")
+        for name, value in summary['counters'].items():
+            print(f"  {name}: {value:g}")
+        for stage, a in summary['allocations'].items():
+            largest = ', '.join(f"{item['symbol']}({item['mb']:.1f}MB)" for item in a['largest'][:top])
+            print(f"单只股票内存分配[{stage}]: 均值{a['mean_mb']:.2f}MB  P95 {a['p95_mb']:.2f}MB  "
+                  f"最大{a['max_mb']:.2f}MB  {largest}")
+        for name, value in summary['gauges'].items():
+            print(f"  {name}: {value:g}")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Telemetry._after_fork)
@@ -0,0 +1,111 @@
+import os
+from cache_manager import CacheManager
+from data_resilient import DataResilient, _akshare
+from reference_data import ReferenceData
+
+# 指数股票池 → 指数代码
+INDEX_UNIVERSES = {
+    'hs300': '000300',
+    'csi300': '000300',
+    'csi500': '000905',
+    'csi1000': '000852',
+}
+
+
+"""股票池选择：指数成分股、全A股、自选股文件、行业板块、代码列表，可用 + 取并集"""
+class Universe:
+    @staticmethod
+    def resolve(spec: str) -> list:
+        """
+        spec 示例：
+          hs300 / csi500 / csi1000      指数成分股
+          all                           全部上市A股（剔除已退市）
+          watchlist:my_stocks.txt       自选股文件（每行一个代码，# 开头为注释）
+          sector:半导体                  东方财富行业板块成分股
+          600489,601088                 代码列表
+          csi500+watchlist:my.txt       多个股票池取并集（保持首次出现顺序）
+        返回带交易所后缀的代码列表（如 600489.SH），与 get_hs300_symbols 格式一致
+        """
+        symbols = []
+        for part in spec.split('+'):
+            symbols.extend(Universe._resolve_one(part.strip()))
+        return list(dict.fromkeys(symbols))
+
+    @staticmethod
+    def _resolve_one(spec: str) -> list:
+        kind, _, value = spec.partition(':')
+        kind = kind.lower()
+        if kind in INDEX_UNIVERSES:
+            index = INDEX_UNIVERSES[kind]
+            symbols = ReferenceData.get(indices=(index,)).index_symbols(index)
+            if not symbols and index == '000300':
+                # 参考数据快照中没有该指数成分股（如离线且无快照）：退回沪深300成分股缓存
+                symbols = DataResilient.get_hs300_symbols(use_cache=True)
+            return symbols
+        if kind == 'all':
+            return Universe.all_a_shares()
+        if kind == 'watchlist':
+            return Universe.watchlist(value)
+        if kind == 'sector':
+            return Universe.sector(value)
+        if os.path.isfile(spec):
+            return Universe.watchlist(spec)
+        reference = ReferenceData.get()
+        return [reference.symbol(code.strip()) for code in spec.split(',') if code.strip()]
+
+    @staticmethod
+    def all_a_shares() -> list:
+        """全部当前上市的A股（代码升序）"""
+        reference = ReferenceData.get()
+        return [reference.symbol(code) for code in sorted(reference.names) if reference.is_listed(code)]
+
+    @staticmethod
+    def watchlist(path: str) -> list:
+        reference = ReferenceData.get()
+        symbols = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                code = line.split('#')[0].strip()
+                if code:
+                    symbols.append(reference.symbol(code))
+        return symbols
+
+    @staticmethod
+    def sector(name: str) -> list:
+        """行业板块成分股（结果按天缓存）"""
+        cache_key = f'sector_{name}'
+        codes = CacheManager.load_macro_cache(cache_key, ignore_expiry=DataResilient.OFFLINE)
+        if codes is None:
+            try:
+                df = _akshare().stock_board_industry_cons_em(symbol=name)
+                codes = df['代码'].astype(str).str.zfill(6).tolist()
+                CacheManager.save_macro_cache(cache_key, codes)
+            except Exception as e:
+                print(f"获取行业板块 {name} 成分股失败: {str(e)}")
+                return []
+        reference = ReferenceData.get()
+        return [reference.symbol(code) for code in codes]
+
+    @staticmethod
+    def industry_map() -> dict:
+        """代码（不带后缀）→ 东方财富行业板块名，遍历全部行业板块成分股生成（结果按天缓存）"""
+        cache_key = 'industry_map'
+        mapping = CacheManager.load_macro_cache(cache_key, ignore_expiry=DataResilient.OFFLINE)
+        if mapping is not None:
+            return mapping
+        try:
+            boards = _akshare().stock_board_industry_name_em()['板块名称'].tolist()
+        except Exception as e:
+            print(f"获取行业板块列表失败: {str(e)}")
+            return {}
+        mapping = {}
+        for board in boards:
+            for symbol in Universe.sector(board):
+                mapping.setdefault(symbol.split('.')[0], board)
+        CacheManager.save_macro_cache(cache_key, mapping)
+        return mapping
+
+
+def add_universe_argument(parser, default='hs300'):
+    parser.add_argument('-u', '--universe', default=default,
+                        help='股票池：hs300/csi500/csi1000/all/watchlist:文件/sector:板块名/代码列表，可用+组合')
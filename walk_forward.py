@@ -0,0 +1,174 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from panel import PricePanel, SharedPanel, panel_arrays
+from panel_indicators import IndicatorCache
+from panel_strategies import INDICATOR_KEYS
+from param_sweep import ParamSweep, add_grid_arguments, parse_grid
+from data_resilient import DataResilient
+from cache_manager import CacheManager
+
+# 切片时向前多保留的行数：保证窗口首日的持仓（前一日信号）与3日滚动条件可用
+WINDOW_CONTEXT = 5
+
+# 子进程状态：全历史价格与指标面板通过共享内存挂载，所有窗口复用
+_worker_state = {}
+
+
+def _init_worker(spec, strategy, combos, objective, macro_score):
+    arrays = SharedPanel.attach(spec)
+    fields = {name: arrays.pop(name) for name in list(arrays) if not name.startswith('(')}
+    cache = IndicatorCache(fields, max_entries=None)
+    cache.preload(arrays)
+    _worker_state.update(cache=cache, strategy=strategy, combos=combos,
+                         objective=objective, macro_score=macro_score)
+
+
+def _run_window(window):
+    return WalkForward.run_window(_worker_state['cache'], _worker_state['strategy'], _worker_state['combos'],
+                                  window, _worker_state['objective'], _worker_state['macro_score'])
+
+
+"""滚动窗口样本外评估"""
+class WalkForward:
+    @staticmethod
+    def make_windows(n_dates: int, train_days: int, test_days: int, step_days: int = None) -> list:
+        """生成 (train_start, train_end, test_end) 行号三元组，测试窗口首尾相接"""
+        step_days = step_days or test_days
+        windows = []
+        train_start = 0
+        while train_start + train_days < n_dates:
+            train_end = train_start + train_days
+            test_end = min(train_end + test_days, n_dates)
+            windows.append((train_start, train_end, test_end))
+            train_start += step_days
+        return windows
+
+    @staticmethod
+    def precompute(panel: PricePanel, strategy: str, combos: list, macro_score=None) -> IndicatorCache:
+        """在全历史上一次性计算所有组合用到的指标面板，各窗口只做切片"""
+        cache = IndicatorCache(panel.fields, max_entries=None)
+        seen = set()
+        for params in combos:
+            key = tuple(params[k] for k in INDICATOR_KEYS)
+            if key in seen:
+                continue
+            seen.add(key)
+            ParamSweep.strategy_returns(cache, strategy, params, macro_score)
+        return cache
+
+    @staticmethod
+    def run_window(cache: IndicatorCache, strategy: str, combos: list, window: tuple,
+                   objective: str = 'mean_sharpe', macro_score=None) -> dict:
+        """训练窗口内选出目标最优的参数组合，并在紧随其后的测试窗口评估"""
+        train_start, train_end, test_end = window
+        context_start = max(train_start - WINDOW_CONTEXT, 0)
+        offset = train_start - context_start
+        window_cache = cache.sliced(slice(context_start, test_end))
+        window_macro = None if macro_score is None else np.asarray(macro_score)[context_start:test_end]
+        train_rows = slice(offset, offset + train_end - train_start)
+        test_rows = slice(offset + train_end - train_start, None)
+
+        best = None
+        for params in combos:
+            strategy_returns = ParamSweep.strategy_returns(window_cache, strategy, params, window_macro)
+            train_summary = ParamSweep.summarize(strategy_returns[train_rows])
+            score = train_summary[objective]
+            if best is None or (not np.isnan(score) and (np.isnan(best[0]) or score > best[0])):
+                best = (score, params, train_summary, strategy_returns[test_rows])
+
+        score, params, train_summary, test_returns = best
+        test_summary = ParamSweep.summarize(test_returns)
+        return {
+            'window': window,
+            'params': params,
+            'train': train_summary,
+            'test': test_summary,
+            'test_returns': test_returns,
+        }
+
+    @staticmethod
+    def run(panel: PricePanel, grid: dict, strategy: str = 'pre', train_days: int = 504, test_days: int = 126,
+            objective: str = 'mean_sharpe', workers: int = None, macro_score=None):
+        """并行运行所有窗口，返回 (窗口明细表, 样本外逐日策略收益面板)"""
+        combos = ParamSweep.expand_grid(grid, strategy)
+        windows = WalkForward.make_windows(len(panel.dates), train_days, test_days)
+        if not windows:
+            raise ValueError(f"历史数据不足：{len(panel.dates)}个交易日，训练窗口需要{train_days}个交易日")
+        workers = min(workers or os.cpu_count() or 1, len(windows))
+        print(f"窗口数: {len(windows)}  参数组合数: {len(combos)}  股票数: {len(panel.symbols)}  进程数: {workers}")
+
+        cache = WalkForward.precompute(panel, strategy, combos, macro_score)
+        if workers <= 1:
+            results = [WalkForward.run_window(cache, strategy, combos, w, objective, macro_score) for w in windows]
+        else:
+            arrays = panel_arrays(panel, cache.export())
+            with SharedPanel(arrays) as shared:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(shared.spec, strategy, combos, objective, macro_score)) as executor:
+                    results = list(executor.map(_run_window, windows))
+
+        rows = []
+        for result in results:
+            train_start, train_end, test_end = result['window']
+            rows.append({
+                'train_start': panel.dates[train_start].strftime('%Y-%m-%d'),
+                'test_start': panel.dates[train_end].strftime('%Y-%m-%d'),
+                'test_end': panel.dates[test_end - 1].strftime('%Y-%m-%d'),
+                **{k: result['params'][k] for k in grid},
+                f'train_{objective}': result['train'][objective],
+                **{f'test_{k}': v for k, v in result['test'].items()},
+            })
+
+        oos_dates = panel.dates[windows[0][1]:windows[-1][2]]
+        oos_returns = pd.DataFrame(np.vstack([r['test_returns'] for r in results]),
+                                   index=oos_dates, columns=panel.symbols)
+        return pd.DataFrame(rows), oos_returns
+
+    @staticmethod
+    def equity_curve(oos_returns: pd.DataFrame) -> pd.DataFrame:
+        """拼接样本外净值：逐股票净值与等权组合净值"""
+        curves = (1 + oos_returns.fillna(0)).cumprod()
+        curves['portfolio'] = (1 + oos_returns.mean(axis=1).fillna(0)).cumprod()
+        return curves
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='滚动窗口参数优化与样本外评估')
+    parser.add_argument('-s', '--symbols', nargs='+', help='股票代码列表（默认沪深300成分股）')
+    parser.add_argument('-b', '--begin', default=(datetime.now() - timedelta(days=365 * 10)).strftime('%Y%m%d'), help='开始日期（格式：YYYYMMDD，默认10年前）')
+    parser.add_argument('-e', '--end', default=datetime.now().strftime('%Y%m%d'), help='结束日期（默认当天）')
+    parser.add_argument('--train-days', type=int, default=504, help='训练窗口交易日数（默认504≈2年）')
+    parser.add_argument('--test-days', type=int, default=126, help='测试窗口交易日数（默认126≈半年）')
+    parser.add_argument('--objective', default='mean_sharpe', help='训练窗口优化目标')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认CPU核数）')
+    parser.add_argument('--output', default='walk_forward', help='输出文件前缀')
+    add_grid_arguments(parser)
+    args = parser.parse_args()
+
+    CacheManager.initialize()
+    symbols = args.symbols or DataResilient.get_hs300_symbols(use_cache=True)
+    if not symbols:
+        raise ValueError("无法获取沪深300成分股数据")
+
+    start_time = time.time()
+    panel = PricePanel.load(symbols, args.begin, args.end)
+    print(f"数据加载完成: {time.time() - start_time:.1f}秒")
+
+    windows, oos_returns = WalkForward.run(panel, parse_grid(args), strategy=args.strategy,
+                                           train_days=args.train_days, test_days=args.test_days,
+                                           objective=args.objective, workers=args.workers)
+    curves = WalkForward.equity_curve(oos_returns)
+    print(f"总用时: {time.time() - start_time:.1f}秒")
+
+    print("\n=== 各窗口最优参数与样本外表现 ===")
+    print(windows.to_string(index=False))
+    print(f"\n样本外等权组合累计收益: {curves['portfolio'].iloc[-1] - 1:.2%}")
+
+    windows.to_csv(f"{args.output}_windows.csv", index=False, encoding='utf-8-sig')
+    curves.to_csv(f"{args.output}_equity.csv", encoding='utf-8-sig')
+    print(f"结果已保存到 {args.output}_windows.csv / {args.output}_equity.csv")